@@ -0,0 +1,363 @@
+"""
+Streaming alert ingestion: channel messages -> prefilter -> burst coalescing -> incident analysis.
+
+    source ──▶ prefilter (regex, no AOAI) ──▶ coalescer (fingerprint, window) ──▶ [queue] ──▶ N workers
+                                                                                             │
+                                                        generate_incident_response ◀─────────┘ ──▶ handler
+
+- Sources are async iterables of Alert: QueueSource (in-process), FileSource (tails a JSONL file,
+  the local stand-in for a Teams channel) and TeamsSource (Microsoft Graph channel messages, polled).
+- The prefilter keeps messages that look like anomalies ('에러', '장애', '지연', 5xx, ...) and drops
+  recovery / chatter before anything costs a model call (a failed recovery, '복구 실패', is kept).
+- A bad source line or a failing Graph poll is logged and skipped; if the source still fails, what
+  is already grouped or queued is analysed before run() re-raises.
+- Alerts with the same fingerprint (service + message with numbers/ids masked) are merged: the first
+  one opens a group that is analysed ALERT_COALESCE_WINDOW seconds later as one incident, and repeats
+  for ALERT_SUPPRESS_TTL seconds after that only bump the incident's count.
+- Backpressure: the incident queue holds at most ALERT_QUEUE_SIZE incidents for ALERT_WORKERS analysis
+  workers; when it is full, groups wait, and with ALERT_MAX_PENDING open groups reading from the source pauses.
+"""
+from __future__ import annotations
+import asyncio, datetime, hashlib, html, json, logging, os, re, time
+from dataclasses import dataclass, field
+from typing import Any, AsyncIterator, Awaitable, Callable, Dict, List, Optional, Union
+
+from app import telemetry
+
+log = logging.getLogger(__name__)
+
+@dataclass
+class Alert:
+    text: str
+    service: str = ""
+    channel: str = ""
+    sender: str = ""
+    ts: float = field(default_factory=time.time)
+    id: str = ""
+
+@dataclass
+class Incident:
+    fingerprint: str
+    service: str
+    alerts: List[Alert]
+    count: int = 1
+    first_ts: float = 0.0
+    last_ts: float = 0.0
+
+    MAX_SAMPLES = 5
+
+    def add(self, alert: Alert) -> None:
+        self.count += 1
+        self.last_ts = max(self.last_ts, alert.ts)
+        if len(self.alerts) < self.MAX_SAMPLES:
+            self.alerts.append(alert)
+
+    def to_event(self) -> Dict[str, str]:
+        """symptom / service / extra for generate_incident_response."""
+        first = self.alerts[0].text.strip()
+        span = f"{_fmt(self.first_ts)} ~ {_fmt(self.last_ts)}"
+        samples = "\n".join(f"- {a.text.strip()[:200]}" for a in self.alerts[1:])
+        extra = f"알림 {self.count}건 ({span}, 채널: {self.alerts[0].channel or '-'})"
+        return {"symptom": first[:500], "service": self.service, "extra": extra + (f"\n유사 알림:\n{samples}" if samples else "")}
+
+def _fmt(ts: float) -> str:
+    return datetime.datetime.fromtimestamp(ts).strftime("%H:%M:%S")
+
+# ---------- Prefilter ----------
+# English words are matched whole: "failover", "cooldown" and "scale down" are routine operations
+ANOMALY_PATTERN = (r"에러|오류|장애|지연|실패|타임아웃|다운|급증|error|exception|\bfail(?:s|ed|ure|ures|ing)?\b|timeout|timed out"
+                   r"|(?<!scale )\bdown\b|\b5\d\d\b|5xx")
+IGNORE_PATTERN = r"복구|해소|정상화|resolved|recovered|테스트 메시지"
+# outranks IGNORE_PATTERN: "복구 실패", "failed to recover", "not resolved" are still anomalies
+FAILED_RECOVERY_PATTERN = (r"실패|불가|안\s*됨|미해소|\bfail(?:s|ed|ure|ures|ing)?\b|\bunable\b"
+                           r"|\bnot (?:yet )?(?:resolved|recovered)\b")
+_SERVICE = re.compile(r"서비스\s*[:：]\s*([^\n,|/]+?)\s*(?:[,|/\n]|$)|^\s*\[([^\]]+)\]")
+
+class AlertFilter:
+    def __init__(self, pattern: str = ANOMALY_PATTERN, ignore: str = IGNORE_PATTERN,
+                 failed_recovery: str = FAILED_RECOVERY_PATTERN):
+        self.pattern = re.compile(pattern, re.IGNORECASE)
+        self.ignore = re.compile(ignore, re.IGNORECASE) if ignore else None
+        self.failed_recovery = re.compile(failed_recovery, re.IGNORECASE)
+
+    def __call__(self, alert: Alert) -> bool:
+        if not self.pattern.search(alert.text):
+            return False
+        if self.ignore is not None and self.ignore.search(alert.text):
+            return bool(self.failed_recovery.search(alert.text))
+        return True
+
+def extract_service(text: str) -> str:
+    # "서비스: 결제" anywhere, or a leading "[결제]" tag
+    m = _SERVICE.search(text)
+    return (m.group(1) or m.group(2) or "").strip() if m else ""
+
+_VOLATILE = re.compile(r"[0-9a-f]{8}-[0-9a-f]{4}-[0-9a-f]{4}-[0-9a-f]{4}-[0-9a-f]{12}|0x[0-9a-f]+|\d+(?:[.:]\d+)*", re.IGNORECASE)
+
+def fingerprint(service: str, text: str) -> str:
+    """Same service + same message shape (numbers, ids, timestamps masked) -> same fingerprint."""
+    shape = re.sub(r"\s+", " ", _VOLATILE.sub("#", text.lower())).strip()[:200]
+    return hashlib.sha1(f"{service.strip().lower()}|{shape}".encode("utf-8")).hexdigest()[:16]
+
+# ---------- Sources ----------
+class QueueSource:
+    """In-process source: put Alerts (or None to stop) on `queue`."""
+    def __init__(self, queue: Optional["asyncio.Queue[Optional[Alert]]"] = None):
+        self.queue = queue or asyncio.Queue()
+
+    async def __aiter__(self) -> AsyncIterator[Alert]:
+        while (alert := await self.queue.get()) is not None:
+            yield alert
+
+def _alert_from_json(obj: Dict[str, Any]) -> Alert:
+    return Alert(text=obj.get("text", ""), service=obj.get("service", ""), channel=obj.get("channel", ""),
+                 sender=obj.get("sender", ""), ts=float(obj.get("ts") or time.time()), id=str(obj.get("id", "")))
+
+class FileSource:
+    """Tails a JSONL file of {"text", "service"?, "channel"?, "sender"?, "ts"?} lines (local Teams stand-in)."""
+    def __init__(self, path: str, follow: bool = True, from_start: bool = True, poll: float = 0.5):
+        self.path, self.follow, self.from_start, self.poll = path, follow, from_start, poll
+        self.skipped = 0  # malformed lines
+
+    async def __aiter__(self) -> AsyncIterator[Alert]:
+        with open(self.path, encoding="utf-8") as f:
+            if not self.from_start:
+                f.seek(0, os.SEEK_END)
+            buf = ""
+            while True:
+                line = f.readline()
+                if not line:
+                    if not self.follow:
+                        return
+                    await asyncio.sleep(self.poll)
+                    continue
+                buf += line
+                if not buf.endswith("\n"):
+                    continue  # partial line still being written
+                line, buf = buf.strip(), ""
+                if not line:
+                    continue
+                try:
+                    alert = _alert_from_json(json.loads(line))
+                except (ValueError, TypeError, AttributeError) as e:
+                    self.skipped += 1
+                    log.warning("skipping malformed alert line in %s: %s", self.path, e)
+                    continue
+                yield alert
+
+TokenSource = Callable[[], Awaitable[str]]
+
+def graph_app_token(tenant_id: str, client_id: str, client_secret: str, settings) -> TokenSource:
+    """Client-credentials Graph token for TeamsSource, fetched at start and again after a 401."""
+    url = f"https://login.microsoftonline.com/{tenant_id}/oauth2/v2.0/token"
+    form = {"grant_type": "client_credentials", "client_id": client_id, "client_secret": client_secret,
+            "scope": "https://graph.microsoft.com/.default"}
+
+    async def fetch() -> str:
+        from app.http_clients import get_client
+        from app.retry_policy import asend_with_retry
+        client = get_client(url, settings)
+        resp = await asend_with_retry(url, lambda: client.post(url, data=form, timeout=30.0))
+        resp.raise_for_status()
+        return resp.json()["access_token"]
+    return fetch
+
+class TeamsSource:
+    """
+    Polls Microsoft Graph channel messages (ChannelMessage.Read.All) through the delta endpoint.
+    `token` is a bearer token, or a TokenSource (graph_app_token) that is asked again after a 401.
+    """
+    GRAPH = "https://graph.microsoft.com/v1.0"
+
+    def __init__(self, team_id: str, channel_id: str, token: Union[str, TokenSource], settings, poll: float = 10.0,
+                 channel: str = ""):
+        self.url = f"{self.GRAPH}/teams/{team_id}/channels/{channel_id}/messages/delta"
+        self.token, self.settings, self.poll, self.channel = token, settings, poll, channel or channel_id
+
+    async def __aiter__(self) -> AsyncIterator[Alert]:
+        import httpx
+        from app.http_clients import get_client
+        from app.retry_policy import RETRYABLE_STATUS, CircuitOpenError, asend_with_retry
+        client = get_client(self.GRAPH, self.settings)
+        refresh = self.token if callable(self.token) else None
+        token = await refresh() if refresh else self.token
+        url, first = self.url, True
+
+        def send():
+            return client.get(url, headers={"Authorization": f"Bearer {token}"}, timeout=30.0)
+
+        while True:
+            try:
+                # 429 / 5xx / timeouts: shared policy (Retry-After aware)
+                resp = await asend_with_retry(url, send)
+                if resp.status_code == 401 and refresh is not None:
+                    token = await refresh()
+                    resp = await asend_with_retry(url, send)
+            except (httpx.TransportError, CircuitOpenError) as e:
+                log.warning("Graph poll failed, retrying in %.0fs: %s", self.poll, e)
+                await asyncio.sleep(self.poll)
+                continue
+            if resp.status_code in RETRYABLE_STATUS:
+                # still throttled / unavailable after the retries: keep the cursor, poll again later
+                log.warning("Graph poll returned %s, retrying in %.0fs", resp.status_code, self.poll)
+                await asyncio.sleep(self.poll)
+                continue
+            resp.raise_for_status()  # 401 with a fixed token, 403, 404: configuration errors
+            data = resp.json()
+            if not first:  # the initial delta round only establishes the cursor
+                for msg in data.get("value", []):
+                    text = html.unescape(re.sub(r"<[^>]+>", " ", (msg.get("body") or {}).get("content") or ""))
+                    created = msg.get("createdDateTime")
+                    ts = datetime.datetime.fromisoformat(created.replace("Z", "+00:00")).timestamp() if created else time.time()
+                    sender = (((msg.get("from") or {}).get("user") or {}).get("displayName")) or ""
+                    yield Alert(text=text.strip(), channel=self.channel, sender=sender, ts=ts, id=msg.get("id", ""))
+            if "@odata.nextLink" in data:
+                url = data["@odata.nextLink"]
+                continue
+            url, first = data.get("@odata.deltaLink", url), False
+            await asyncio.sleep(self.poll)
+
+# ---------- Service ----------
+Handler = Callable[[Incident, Dict[str, Any]], Awaitable[None]]
+
+class AlertIngestService:
+    def __init__(self, source, handler: Optional[Handler] = None, settings=None, *,
+                 alert_filter: Optional[AlertFilter] = None,
+                 analyse: Optional[Callable[[str, str, str], Awaitable[Dict[str, Any]]]] = None):
+        from app.azure_clients import get_settings
+        from app.rag_pipeline import generate_incident_response
+        self.source = source
+        self.handler = handler
+        self.settings = settings or get_settings()
+        ignore = self.settings.ALERT_IGNORE_PATTERN
+        self.filter = alert_filter or AlertFilter(self.settings.ALERT_PATTERN or ANOMALY_PATTERN,
+                                                  IGNORE_PATTERN if ignore is None else ignore)
+        self.analyse = analyse or generate_incident_response
+        self.window = self.settings.ALERT_COALESCE_WINDOW
+        self.suppress_ttl = self.settings.ALERT_SUPPRESS_TTL
+        self.pending: Dict[str, Incident] = {}   # fingerprint -> group still collecting
+        self._due: Dict[str, float] = {}         # fingerprint -> monotonic flush time
+        self.active: Dict[str, tuple] = {}       # fingerprint -> (Incident, monotonic expiry) after analysis
+        self.queue: "asyncio.Queue[Optional[Incident]]" = asyncio.Queue(maxsize=self.settings.ALERT_QUEUE_SIZE)
+        self._room = asyncio.Event()
+        self._room.set()
+        self._stopping = asyncio.Event()
+        self.stats = {"received": 0, "filtered": 0, "coalesced": 0, "suppressed": 0, "incidents": 0, "analysed": 0, "errors": 0}
+
+    def _count(self, result: str, n: int = 1) -> None:
+        self.stats[result] += n
+        telemetry.record_alert(result, n)
+
+    def offer(self, alert: Alert) -> Optional[str]:
+        """Prefilter and coalesce one alert; returns the fingerprint it joined (None when dropped)."""
+        self._count("received")
+        if not self.filter(alert):
+            self._count("filtered")
+            return None
+        service = alert.service or extract_service(alert.text)
+        fp = fingerprint(service, alert.text)
+        now = time.monotonic()
+        active = self.active.get(fp)
+        if active is not None and active[1] > now:
+            active[0].add(alert)
+            self._count("suppressed")
+            return fp
+        group = self.pending.get(fp)
+        if group is not None:
+            group.add(alert)
+            self._count("coalesced")
+            return fp
+        self.pending[fp] = Incident(fp, service, [alert], first_ts=alert.ts, last_ts=alert.ts)
+        self._due[fp] = now + self.window
+        if len(self.pending) >= self.settings.ALERT_MAX_PENDING:
+            self._room.clear()
+        return fp
+
+    async def _read(self) -> None:
+        async for alert in self.source:
+            await self._room.wait()
+            self.offer(alert)
+
+    async def _flush(self, final: bool = False) -> None:
+        now = time.monotonic()
+        for fp in [fp for fp, due in self._due.items() if final or due <= now]:
+            incident = self.pending.pop(fp)
+            del self._due[fp]
+            if len(self.pending) < self.settings.ALERT_MAX_PENDING:
+                self._room.set()
+            self.active[fp] = (incident, now + self.suppress_ttl)
+            self._count("incidents")
+            await self.queue.put(incident)  # blocks while the workers are behind
+        for fp in [fp for fp, (_, exp) in self.active.items() if exp <= now]:
+            del self.active[fp]
+
+    async def _flusher(self) -> None:
+        # stopped through _stopping, never cancelled: a group popped by _flush is always queued
+        interval = min(1.0, max(0.05, self.window / 4))
+        while not self._stopping.is_set():
+            await self._flush()
+            try:
+                await asyncio.wait_for(self._stopping.wait(), interval)
+            except asyncio.TimeoutError:
+                pass
+
+    async def _worker(self) -> None:
+        while (incident := await self.queue.get()) is not None:
+            ev = incident.to_event()
+            try:
+                result = await self.analyse(ev["symptom"], ev["service"], ev["extra"])
+                self._count("analysed")
+            except Exception as e:
+                result = {"reason": "error", "error": str(e), "answer": ""}
+                self._count("errors")
+            if self.handler is not None:
+                try:
+                    await self.handler(incident, result)
+                except Exception:
+                    self._count("errors")
+
+    async def _drain(self, flusher: "asyncio.Task", workers: List["asyncio.Task"]) -> None:
+        self._stopping.set()
+        await flusher
+        await self._flush(final=True)
+        for _ in workers:
+            await self.queue.put(None)
+        await asyncio.gather(*workers)
+
+    async def run(self) -> Dict[str, int]:
+        """Consume the source until it ends, then analyse what is still pending; returns the counters."""
+        workers = [asyncio.create_task(self._worker()) for _ in range(self.settings.ALERT_WORKERS)]
+        flusher = asyncio.create_task(self._flusher())
+        try:
+            try:
+                await self._read()
+            except Exception:
+                # a source that gives up still gets its grouped and queued incidents analysed
+                await self._drain(flusher, workers)
+                raise
+            await self._drain(flusher, workers)
+        finally:
+            flusher.cancel()
+            for w in workers:
+                w.cancel()
+        return dict(self.stats)
+
+# ---------- Handlers ----------
+def jsonl_handler(path: str) -> Handler:
+    async def handle(incident: Incident, result: Dict[str, Any]) -> None:
+        row = {"fingerprint": incident.fingerprint, "service": incident.service, "alerts": incident.count,
+               **incident.to_event(), "reason": result.get("reason"), "answer": result.get("answer"),
+               "notices": result.get("notices"), "trace": result.get("trace")}
+        with open(path, "a", encoding="utf-8") as f:
+            f.write(json.dumps(row, ensure_ascii=False) + "\n")
+    return handle
+
+def teams_webhook_handler(url: str, settings) -> Handler:
+    """Post the analysis back to a Teams channel through an Incoming Webhook."""
+    async def handle(incident: Incident, result: Dict[str, Any]) -> None:
+        from app.http_clients import get_client
+        ev = incident.to_event()
+        text = f"**[Incident IQ] {ev['service'] or '서비스 미상'} · 알림 {incident.count}건**\n\n{ev['symptom']}\n\n{result.get('answer') or ''}"
+        resp = await get_client(url, settings).post(url, json={"text": text}, timeout=30.0)
+        resp.raise_for_status()
+    return handle
@@ -0,0 +1,101 @@
+"""
+Semantic answer cache for near-duplicate incidents.
+
+An answer is reused when a new incident
+  - targets the same (normalised) service,
+  - retrieved the same set of runbook ids, and
+  - has a query embedding within ANSWER_CACHE_THRESHOLD cosine similarity of a cached one.
+Entries are bucketed by (service, hit ids) so only a handful of vectors are compared per lookup.
+"""
+from __future__ import annotations
+import math, threading, time
+from array import array
+from collections import OrderedDict
+from dataclasses import dataclass
+from functools import lru_cache
+from typing import Any, Dict, FrozenSet, Iterable, List, Optional, Tuple
+
+from app.embedding_cache import normalize_text
+
+@dataclass
+class CachedAnswer:
+    vector: array
+    answer: str
+    web_refs: List[Dict[str, str]]
+    created: float
+
+def _unit(vec: Iterable[float]) -> array:
+    a = array("f", vec)
+    norm = math.sqrt(sum(x * x for x in a)) or 1.0
+    return array("f", (x / norm for x in a))
+
+def _dot(a: array, b: array) -> float:
+    return sum(x * y for x, y in zip(a, b))
+
+class AnswerCache:
+    def __init__(self, threshold: float = 0.97, max_items: int = 512, ttl: float = 1800.0):
+        self.threshold = threshold
+        self.max_items = max_items
+        self.ttl = ttl
+        # (service, hit ids) -> entries; bucket order doubles as LRU order
+        self._buckets: "OrderedDict[Tuple[str, FrozenSet[str]], List[CachedAnswer]]" = OrderedDict()
+        self._size = 0
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    @staticmethod
+    def _bucket_key(service: str, hit_ids: Iterable[Any]) -> Tuple[str, FrozenSet[str]]:
+        return normalize_text(service), frozenset(str(i) for i in hit_ids if i is not None)
+
+    def lookup(self, vector: List[float], service: str, hit_ids: Iterable[Any]) -> Optional[CachedAnswer]:
+        key = self._bucket_key(service, hit_ids)
+        q = _unit(vector)
+        now = time.time()
+        with self._lock:
+            entries = self._buckets.get(key)
+            if entries:
+                live = [e for e in entries if not (self.ttl > 0 and now - e.created > self.ttl)]
+                self._size -= len(entries) - len(live)
+                if live:
+                    self._buckets[key] = live
+                    self._buckets.move_to_end(key)
+                    best = max(live, key=lambda e: _dot(q, e.vector))
+                    if _dot(q, best.vector) >= self.threshold:
+                        self.hits += 1
+                        return best
+                else:
+                    del self._buckets[key]
+            self.misses += 1
+            return None
+
+    def store(self, vector: List[float], service: str, hit_ids: Iterable[Any], answer: str,
+              web_refs: Optional[List[Dict[str, str]]] = None) -> None:
+        if self.max_items <= 0:
+            return
+        key = self._bucket_key(service, hit_ids)
+        entry = CachedAnswer(vector=_unit(vector), answer=answer, web_refs=list(web_refs or []), created=time.time())
+        with self._lock:
+            self._buckets.setdefault(key, []).append(entry)
+            self._buckets.move_to_end(key)
+            self._size += 1
+            while self._size > self.max_items and self._buckets:
+                old_key, old = next(iter(self._buckets.items()))
+                old.pop(0)
+                self._size -= 1
+                if not old:
+                    del self._buckets[old_key]
+
+    def stats(self) -> Dict[str, float]:
+        lookups = self.hits + self.misses
+        return {"hits": self.hits, "misses": self.misses, "hit_rate": self.hits / lookups if lookups else 0.0, "size": self._size}
+
+def get_answer_cache(settings) -> AnswerCache:
+    # keyed on the models and size of the query vectors; entries already carry the hit ids they were built from
+    return _answer_cache(settings.AZURE_OPENAI_DEPLOYMENT, settings.AZURE_OPENAI_CHAT_DEPLOYMENT, settings.vector_dim,
+                         settings.ANSWER_CACHE_THRESHOLD, settings.ANSWER_CACHE_SIZE, settings.ANSWER_CACHE_TTL)
+
+@lru_cache(maxsize=None)
+def _answer_cache(deployment: str, chat_deployment: str, dim: int, threshold: float, max_items: int,
+                  ttl: float) -> AnswerCache:
+    return AnswerCache(threshold=threshold, max_items=max_items, ttl=ttl)
@@ -0,0 +1,263 @@
+"""
+Routing of AOAI calls over a pool of endpoint / deployment pairs.
+
+The pool is the configured AZURE_OPENAI_ENDPOINT ("primary") plus the entries of AOAI_BACKENDS,
+a JSON list such as
+
+    [{"name": "japaneast", "endpoint": "https://aoai-jpe.openai.azure.com", "api_key": "...",
+      "deployment": "text-embedding-3-small", "chat_deployment": "gpt-4o", "rpm": 300, "tpm": 150000}]
+
+(api_key / deployment / chat_deployment default to the primary's; every backend must serve the
+same embedding model, cached vectors are shared). For each backend the router keeps an EWMA of the
+latency per call kind, the recent chat latencies (p95), the x-ratelimit-remaining-* quota reported
+by the service, in-flight calls and a cooldown after 429 / 5xx / transport errors.
+
+- route: the backend with the lowest EWMA x (1 + in-flight) goes first; backends cooling down or
+  short of quota go last
+- fail over: a 429 / 5xx / transport error moves on to the next backend at once; only when every
+  backend failed does the shared retry policy (Retry-After, backoff, breaker) take over on the best one
+- hedge (AOAI_HEDGE_CHAT): a chat call not answered within the backend's p95 (at least
+  AOAI_HEDGE_MIN_DELAY seconds) is duplicated on the next backend; the first response wins and the
+  other is cancelled. Streams are hedged on time to the response headers.
+With a single backend calls behave exactly as before (asend_with_retry on one URL).
+"""
+from __future__ import annotations
+import asyncio, json, threading, time
+from collections import deque
+from functools import lru_cache
+from types import SimpleNamespace
+from typing import Any, Awaitable, Callable, Deque, Dict, List, Optional, Tuple
+from urllib.parse import urlsplit
+import httpx
+
+from app import telemetry
+from app.rate_limit import TokenBucketLimiter, get_rate_limiter
+from app.retry_policy import CircuitOpenError, RETRYABLE_STATUS, asend_with_retry, get_breaker, retry_after_seconds
+
+CHAT_API_VERSION = "2025-01-01-preview"
+
+class Backend:
+    def __init__(self, name: str, endpoint: str, api_key: str, deployment: str, chat_deployment: str,
+                 limiter: TokenBucketLimiter, alpha: float = 0.3):
+        self.name = name
+        self.endpoint = endpoint.rstrip("/")
+        self.api_key = api_key
+        self.deployment = deployment
+        self.chat_deployment = chat_deployment
+        self.limiter = limiter
+        self.alpha = alpha
+        self.ewma: Dict[str, float] = {}
+        self.samples: Dict[str, Deque[float]] = {}
+        self.inflight = 0
+        self.cooldown_until = 0.0
+        self.remaining_requests: Optional[float] = None
+        self.remaining_tokens: Optional[float] = None
+        self._lock = threading.Lock()
+
+    def chat_url(self) -> str:
+        return f"{self.endpoint}/openai/deployments/{self.chat_deployment}/chat/completions?api-version={CHAT_API_VERSION}"
+
+    def embed_url(self, api_version: str) -> str:
+        return f"{self.endpoint}/openai/deployments/{self.deployment}/embeddings?api-version={api_version}"
+
+    @property
+    def headers(self) -> Dict[str, str]:
+        return {"api-key": self.api_key, "Content-Type": "application/json"}
+
+    def observe(self, headers: httpx.Headers) -> None:
+        self.limiter.observe(headers)
+        with self._lock:
+            for header, attr in (("x-ratelimit-remaining-requests", "remaining_requests"),
+                                 ("x-ratelimit-remaining-tokens", "remaining_tokens")):
+                if header in headers:
+                    try:
+                        setattr(self, attr, float(headers[header]))
+                    except ValueError:
+                        pass
+
+    def record(self, kind: str, seconds: float) -> None:
+        with self._lock:
+            prev = self.ewma.get(kind)
+            self.ewma[kind] = seconds if prev is None else self.alpha * seconds + (1 - self.alpha) * prev
+            self.samples.setdefault(kind, deque(maxlen=200)).append(seconds)
+
+    def cool_down(self, seconds: float) -> None:
+        with self._lock:
+            self.cooldown_until = max(self.cooldown_until, time.monotonic() + seconds)
+
+    def p95(self, kind: str, min_samples: int = 20) -> Optional[float]:
+        with self._lock:
+            xs = sorted(self.samples.get(kind, ()))
+        if len(xs) < min_samples:
+            return None
+        return xs[min(len(xs) - 1, int(round(0.95 * (len(xs) - 1))))]
+
+    def score(self, kind: str, tokens: int) -> Tuple[int, float]:
+        """(tier, cost): tier 0 = available, 1 = short of reported quota, 2 = cooling down."""
+        now = time.monotonic()
+        with self._lock:
+            if self.cooldown_until > now:
+                return 2, self.cooldown_until - now
+            short = (self.remaining_requests is not None and self.remaining_requests < 1) or \
+                    (self.remaining_tokens is not None and self.remaining_tokens < tokens)
+            # untried backends get a small prior, so each one is explored while in-flight calls still count
+            return (1 if short else 0), self.ewma.get(kind, 0.05) * (1 + self.inflight)
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return {"name": self.name, "ewma_ms": {k: round(v * 1000, 1) for k, v in self.ewma.items()},
+                    "inflight": self.inflight, "remaining_requests": self.remaining_requests,
+                    "remaining_tokens": self.remaining_tokens,
+                    "cooling_s": round(max(0.0, self.cooldown_until - time.monotonic()), 1)}
+
+# performs the HTTP call only: the router charges the backend's limiter first, so the latency
+# recorded for routing is the service's, not the client-side quota wait
+Send = Callable[[Backend], Awaitable[httpx.Response]]
+
+def _limited(backend: Backend, send: Send, tokens: int) -> Callable[[], Awaitable[httpx.Response]]:
+    async def call() -> httpx.Response:
+        await backend.limiter.acquire(tokens)
+        return await send(backend)
+    return call
+
+class AOAIRouter:
+    def __init__(self, backends: List[Backend], hedge_chat: bool = False, hedge_min_delay: float = 2.0):
+        self.backends = backends
+        self.hedge_chat = hedge_chat
+        self.hedge_min_delay = hedge_min_delay
+
+    def ranked(self, kind: str, tokens: int = 0) -> List[Backend]:
+        return sorted(self.backends, key=lambda b: b.score(kind, tokens))
+
+    async def _attempt(self, backend: Backend, kind: str, send: Send, tokens: int) -> httpx.Response:
+        """One call on one backend; raises on 429 / 5xx / transport errors after recording them."""
+        breaker = get_breaker(backend.endpoint)
+        breaker.check(backend.endpoint)
+        await backend.limiter.acquire(tokens)
+        with backend._lock:
+            backend.inflight += 1
+        t = time.perf_counter()
+        try:
+            resp = await send(backend)
+        except httpx.TransportError:
+            breaker.record_failure()
+            backend.cool_down(5.0)
+            telemetry.record_backend(backend.name, kind, "error")
+            raise
+        finally:
+            with backend._lock:
+                backend.inflight -= 1
+        backend.observe(resp.headers)
+        if resp.status_code in RETRYABLE_STATUS:
+            await resp.aread()  # releases the connection of streamed responses
+            await resp.aclose()
+            throttled = resp.status_code == 429
+            if resp.status_code >= 500:
+                breaker.record_failure()
+            backend.cool_down(retry_after_seconds(resp.headers) or (1.0 if throttled else 5.0))
+            telemetry.record_backend(backend.name, kind, "throttled" if throttled else "error")
+            raise _Failover(resp)
+        breaker.record_success()
+        backend.record(kind, time.perf_counter() - t)
+        telemetry.record_backend(backend.name, kind, "ok")
+        return resp
+
+    async def _failover(self, order: List[Backend], kind: str, send: Send, tokens: int) -> Tuple[httpx.Response, Backend]:
+        for backend in order:
+            try:
+                return await self._attempt(backend, kind, send, tokens), backend
+            except (_Failover, CircuitOpenError, httpx.TransportError):
+                continue
+        # every backend failed once: fall back to the retry policy on the best-ranked one
+        best = self.ranked(kind)[0]
+        url = best.chat_url() if kind.startswith("chat") else best.endpoint
+        return await asend_with_retry(url, _limited(best, send, tokens), best.observe), best
+
+    async def send(self, kind: str, send: Send, tokens: int = 0) -> Tuple[httpx.Response, Backend]:
+        """Route one call ("chat", "chat_stream" or "embed"); returns the response and the backend that served it."""
+        order = self.ranked(kind, tokens)
+        if len(order) == 1:
+            backend = order[0]
+            url = backend.chat_url() if kind.startswith("chat") else backend.endpoint
+            return await asend_with_retry(url, _limited(backend, send, tokens), backend.observe), backend
+        if not (self.hedge_chat and kind.startswith("chat")):
+            return await self._failover(order, kind, send, tokens)
+        return await self._hedged(order, kind, send, tokens)
+
+    async def _hedged(self, order: List[Backend], kind: str, send: Send, tokens: int) -> Tuple[httpx.Response, Backend]:
+        primary, rest = order[0], order[1:]
+        delay = max(self.hedge_min_delay, primary.p95(kind) or 0.0)
+        first = asyncio.create_task(self._failover(order, kind, send, tokens))
+        done, _ = await asyncio.wait({first}, timeout=delay)
+        if done:
+            return first.result()
+        # slow primary: race a duplicate on the next backend, keep whichever answers first
+        telemetry.record_backend(rest[0].name, kind, "hedged")
+        second = asyncio.create_task(self._failover(rest + [primary], kind, send, tokens))
+        pending = {first, second}
+        error: Optional[BaseException] = None
+        try:
+            while pending:
+                done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+                for task in done:
+                    if task.exception() is None:
+                        return task.result()
+                    error = task.exception()
+            raise error
+        finally:
+            for task in pending:
+                task.cancel()
+            await _discard(pending)
+
+    def stats(self) -> List[Dict[str, Any]]:
+        return [b.stats() for b in self.backends]
+
+class _Failover(RuntimeError):
+    def __init__(self, response: httpx.Response):
+        self.response = response
+        super().__init__(f"HTTP {response.status_code}")
+
+async def _discard(tasks) -> None:
+    # close the loser's response if it arrived while the winner was being returned
+    for task in tasks:
+        try:
+            resp, _ = await task
+            await resp.aclose()
+        except BaseException:
+            pass
+
+def _backend_specs(settings) -> List[Dict[str, Any]]:
+    if not settings.AOAI_BACKENDS.strip():
+        return []
+    try:
+        specs = json.loads(settings.AOAI_BACKENDS)
+    except json.JSONDecodeError as e:
+        raise RuntimeError(f"AOAI_BACKENDS must be a JSON list of backends: {e}") from e
+    if not isinstance(specs, list) or not all(isinstance(s, dict) and s.get("endpoint") for s in specs):
+        raise RuntimeError("AOAI_BACKENDS must be a JSON list of objects with an 'endpoint'.")
+    return specs
+
+_ROUTER_FIELDS = ("AZURE_OPENAI_ENDPOINT", "AZURE_OPENAI_API_KEY", "AZURE_OPENAI_DEPLOYMENT",
+                  "AZURE_OPENAI_CHAT_DEPLOYMENT", "AOAI_RPM", "AOAI_TPM", "AOAI_BACKENDS", "AOAI_EWMA_ALPHA",
+                  "AOAI_HEDGE_CHAT", "AOAI_HEDGE_MIN_DELAY")
+
+def get_router(settings) -> AOAIRouter:
+    # keyed on the AOAI fields only: settings derived for another search index (index pointer
+    # switch) keep the latency history, cooldowns and limiters
+    return _router(tuple(getattr(settings, f) for f in _ROUTER_FIELDS))
+
+@lru_cache(maxsize=None)
+def _router(key: Tuple[Any, ...]) -> AOAIRouter:
+    cfg = SimpleNamespace(**dict(zip(_ROUTER_FIELDS, key)))
+    backends = [Backend("primary", cfg.AZURE_OPENAI_ENDPOINT, cfg.AZURE_OPENAI_API_KEY,
+                        cfg.AZURE_OPENAI_DEPLOYMENT, cfg.AZURE_OPENAI_CHAT_DEPLOYMENT,
+                        get_rate_limiter(cfg), cfg.AOAI_EWMA_ALPHA)]
+    for spec in _backend_specs(cfg):
+        backends.append(Backend(
+            spec.get("name") or urlsplit(spec["endpoint"]).netloc.split(".")[0],
+            spec["endpoint"], spec.get("api_key") or cfg.AZURE_OPENAI_API_KEY,
+            spec.get("deployment") or cfg.AZURE_OPENAI_DEPLOYMENT,
+            spec.get("chat_deployment") or cfg.AZURE_OPENAI_CHAT_DEPLOYMENT,
+            TokenBucketLimiter(rpm=int(spec.get("rpm") or 0), tpm=int(spec.get("tpm") or 0)),
+            cfg.AOAI_EWMA_ALPHA))
+    return AOAIRouter(backends, cfg.AOAI_HEDGE_CHAT, cfg.AOAI_HEDGE_MIN_DELAY)
@@ -1,37 +1,138 @@
-import os, base64, hashlib, json
-from typing import List, Dict, Any, Optional
-from tenacity import retry, stop_after_attempt, wait_exponential
-from azure.core.credentials import AzureKeyCredential
-from azure.search.documents import SearchClient
-from azure.search.documents.indexes import SearchIndexClient
-from azure.search.documents.models import VectorizedQuery
-from pydantic import BaseModel
-from dotenv import load_dotenv, find_dotenv
+import os
+from functools import lru_cache
+from typing import TYPE_CHECKING, List, Dict, Any, Optional, Tuple
+from pydantic import BaseModel, ConfigDict
+from app.bootstrap import load_env
+from app.index_pointer import apply_pointer
 
-# Load project .env and override any existing env vars (prevents placeholder shell vars)
-env_path = find_dotenv()
-if env_path:
-    load_dotenv(env_path, override=True)
-else:
-    # still call load_dotenv without path to allow default behavior
-    load_dotenv()
+if TYPE_CHECKING:
+    from azure.search.documents import SearchClient
+    from azure.search.documents.aio import SearchClient as AsyncSearchClient
+    from azure.search.documents.indexes import SearchIndexClient
+
+# Load project .env (once per process) and override any existing env vars (prevents placeholder shell vars)
+load_env()
+
+SEARCH_MODES = ("hybrid", "keyword", "vector", "semantic")
 
 class Settings(BaseModel):
-    AZURE_SEARCH_ENDPOINT: str
-    AZURE_SEARCH_API_KEY: str
-    AZURE_SEARCH_INDEX: str
+    # frozen -> hashable, so per-process clients can be cached per settings instance
+    model_config = ConfigDict(frozen=True)
+
+    # Azure AI Search settings are only required when SEARCH_BACKEND=azure
+    AZURE_SEARCH_ENDPOINT: str = ""
+    AZURE_SEARCH_API_KEY: str = ""
+    AZURE_SEARCH_INDEX: str = ""
     AZURE_OPENAI_ENDPOINT: str
     AZURE_OPENAI_API_KEY: str
     AZURE_OPENAI_DEPLOYMENT: str  # text-embedding and chat model names reused via suffixes
     AZURE_OPENAI_CHAT_DEPLOYMENT: str
     BING_SEARCH_ENDPOINT: str | None = None
     BING_SEARCH_API_KEY: str | None = None
+    # shared HTTP client pool (see app/http_clients.py)
+    HTTP2: bool = True
+    HTTP_MAX_CONNECTIONS: int = 100
+    HTTP_MAX_KEEPALIVE: int = 20
+    HTTP_KEEPALIVE_EXPIRY: float = 30.0
+    HTTP_TIMEOUT: float = 120.0
+    # native vector size of the embedding deployment; never changed by the index pointer
+    EMBEDDING_DIM: int = 1536
+    # >0: sent as `dimensions` (text-embedding-3 only) by both embedding paths; 0 = native size
+    EMBEDDING_DIMENSIONS: int = 0
+    EMBED_CACHE_SIZE: int = 2048
+    EMBED_CACHE_TTL: float = 86400.0
+    EMBED_CACHE_PATH: str | None = None
+    EMBED_CACHE_DISK_MAX: int = 100_000
+    # semantic answer cache (see app/answer_cache.py); ANSWER_CACHE_SIZE=0 disables it
+    ANSWER_CACHE_THRESHOLD: float = 0.97
+    ANSWER_CACHE_SIZE: int = 512
+    ANSWER_CACHE_TTL: float = 1800.0
+    # client-side AOAI quota (0 = unlimited) and batch concurrency (see app/rate_limit.py)
+    AOAI_RPM: int = 0
+    AOAI_TPM: int = 0
+    AOAI_COMPLETION_TOKENS: int = 800  # expected completion size charged against TPM per chat call
+    # extra AOAI endpoint/deployment pairs (JSON list) and routing over them (see app/aoai_router.py)
+    AOAI_BACKENDS: str = ""
+    AOAI_EWMA_ALPHA: float = 0.3
+    AOAI_HEDGE_CHAT: bool = False
+    AOAI_HEDGE_MIN_DELAY: float = 2.0  # hedge delay floor; the backend's chat p95 once it has samples
+    BATCH_SEARCH_CONCURRENCY: int = 16
+    BATCH_CHAT_CONCURRENCY: int = 4
+    # push the requested service down to the index as a filter (falls back to unfiltered on no hits)
+    SEARCH_SERVICE_FILTER: bool = True
+    # retrieval backend: "azure" (Azure AI Search) or "local" (in-process index, see app/local_search.py)
+    SEARCH_BACKEND: str = "azure"
+    LOCAL_INDEX_DIR: str = ".local_index"
+    LOCAL_INDEX_QUANT: str = "float32"  # or "int8"
+    LOCAL_HNSW_MIN_ROWS: int = 50_000
+    LOCAL_HNSW_EF: int = 64
+    # retrieval parameters (compare configurations with scripts/eval_retrieval.py)
+    SEARCH_MODE: str = "hybrid"  # hybrid | keyword | vector | semantic
+    SEARCH_TOP: int = 8
+    SEARCH_KNN: int = 8
+    SEARCH_EXHAUSTIVE: bool = False  # exact kNN instead of HNSW
+    SEARCH_SEMANTIC_CONFIG: str = "default-semantic-config"
+    # two-phase retrieval: rank on ids/titles/scores, then fetch content for the final k only
+    SEARCH_TWO_PHASE: bool = False
+    SEARCH_FINAL_K: int = 5
+    SEARCH_PER_PARENT: int = 1  # chunks kept per runbook in the final k
+    # prompt context packing (see app/context_builder.py)
+    CONTEXT_TOKEN_BUDGET: int = 3000
+    CONTEXT_MAX_HITS: int = 5
+    CONTEXT_DEDUP_THRESHOLD: float = 0.8
+    CHAT_TOKENIZER_MODEL: str = "gpt-4o"  # tiktoken model name of the chat deployment
+    # "prefix": static system prompt first, context in the user turn (prompt-cache friendly); "inline": legacy
+    PROMPT_LAYOUT: str = "prefix"
+    SESSION_MAX_TURNS: int = 10  # follow-up turns kept per incident session (see app/session.py)
+    # web backup search: "fallback" runs Bing after retrieval misses, "hedged" starts it alongside retrieval
+    WEB_SEARCH_MODE: str = "fallback"
+    WEB_MIN_SCORE: float = 0.0  # top hit score below this also counts as a miss
+    WEB_CACHE_SIZE: int = 256
+    WEB_CACHE_TTL: float = 3600.0
+    # Prometheus /metrics port (0 = disabled, see app/telemetry.py)
+    METRICS_PORT: int = 0
+    # Streamlit background worker (see app/worker.py): concurrent jobs, how long finished jobs are kept
+    WORKER_CONCURRENCY: int = 8
+    WORKER_JOB_TTL: float = 3600.0
+    # headless HTTP API (see app/http_api.py); empty API_KEY = no authentication
+    API_HOST: str = "0.0.0.0"
+    API_PORT: int = 8080
+    API_REQUEST_TIMEOUT: float = 60.0
+    API_MAX_BATCH: int = 100  # events per /v1/incidents/batch request
+    API_KEY: str = ""
+    # alert ingestion (see app/alert_ingest.py); empty ALERT_PATTERN / unset ALERT_IGNORE_PATTERN = built-in
+    ALERT_COALESCE_WINDOW: float = 30.0
+    ALERT_SUPPRESS_TTL: float = 900.0
+    ALERT_QUEUE_SIZE: int = 16
+    ALERT_WORKERS: int = 4
+    ALERT_MAX_PENDING: int = 1000
+    ALERT_PATTERN: str = ""
+    ALERT_IGNORE_PATTERN: str | None = None
+    # blue/green reindexing: live index name read from this pointer file (see app/index_pointer.py)
+    INDEX_POINTER_PATH: str = ""
+    INDEX_POINTER_TTL: float = 5.0
+
+    @property
+    def vector_dim(self) -> int:
+        # size of the query and index vectors: the requested `dimensions`, else the native size
+        return self.EMBEDDING_DIMENSIONS or self.EMBEDDING_DIM
 
 def load_settings() -> Settings:
+    backend = os.getenv("SEARCH_BACKEND", "azure").lower()
+    if backend not in ("azure", "local"):
+        raise RuntimeError(f"SEARCH_BACKEND 값이 올바르지 않습니다: {backend} (azure | local)")
+    mode = os.getenv("SEARCH_MODE", "hybrid").lower()
+    if mode not in SEARCH_MODES:
+        raise RuntimeError(f"SEARCH_MODE 값이 올바르지 않습니다: {mode} ({' | '.join(SEARCH_MODES)})")
+    dimensions = int(os.getenv("EMBEDDING_DIMENSIONS", "0") or 0)
     required = [
         "AZURE_SEARCH_ENDPOINT",
         "AZURE_SEARCH_API_KEY",
-        "AZURE_SEARCH_INDEX",
+    ] if backend == "azure" else []
+    if backend == "azure" and not os.getenv("INDEX_POINTER_PATH"):
+        # with a pointer the live index name comes from the pointer file
+        required.append("AZURE_SEARCH_INDEX")
+    required += [
         "AZURE_OPENAI_ENDPOINT",
         "AZURE_OPENAI_API_KEY",
         "AZURE_OPENAI_DEPLOYMENT",
@@ -42,31 +143,141 @@ def load_settings() -> Settings:
             raise RuntimeError(f"환경변수 {k} 가 설정되지 않았습니다.")
     # Basic placeholder detection: reject common placeholder patterns
     endpoint = os.environ.get("AZURE_SEARCH_ENDPOINT", "")
-    if any(token in endpoint for token in ("<your-search-name>", "%3cyour-search-name%3e", "your-search-name", "<your", "%3c")):
+    if backend == "azure" and any(token in endpoint for token in ("<your-search-name>", "%3cyour-search-name%3e", "your-search-name", "<your", "%3c")):
         raise RuntimeError(
             "AZURE_SEARCH_ENDPOINT looks like a placeholder (e.g. '<your-search-name>.search.windows.net').\n"
             "Please set a real endpoint in the environment or in the project's .env file."
         )
     return Settings(
-        AZURE_SEARCH_ENDPOINT=os.environ["AZURE_SEARCH_ENDPOINT"],
-        AZURE_SEARCH_API_KEY=os.environ["AZURE_SEARCH_API_KEY"],
-        AZURE_SEARCH_INDEX=os.environ["AZURE_SEARCH_INDEX"],
+        AZURE_SEARCH_ENDPOINT=os.getenv("AZURE_SEARCH_ENDPOINT", ""),
+        AZURE_SEARCH_API_KEY=os.getenv("AZURE_SEARCH_API_KEY", ""),
+        AZURE_SEARCH_INDEX=os.getenv("AZURE_SEARCH_INDEX", ""),
         AZURE_OPENAI_ENDPOINT=os.environ["AZURE_OPENAI_ENDPOINT"],
         AZURE_OPENAI_API_KEY=os.environ["AZURE_OPENAI_API_KEY"],
         AZURE_OPENAI_DEPLOYMENT=os.environ["AZURE_OPENAI_DEPLOYMENT"],
         AZURE_OPENAI_CHAT_DEPLOYMENT=os.environ["AZURE_OPENAI_CHAT_DEPLOYMENT"],
         BING_SEARCH_ENDPOINT=os.getenv("BING_SEARCH_ENDPOINT"),
         BING_SEARCH_API_KEY=os.getenv("BING_SEARCH_API_KEY"),
+        HTTP2=os.getenv("HTTP2", "true").lower() in ("1", "true", "yes"),
+        HTTP_MAX_CONNECTIONS=os.getenv("HTTP_MAX_CONNECTIONS", "100"),
+        HTTP_MAX_KEEPALIVE=os.getenv("HTTP_MAX_KEEPALIVE", "20"),
+        HTTP_KEEPALIVE_EXPIRY=os.getenv("HTTP_KEEPALIVE_EXPIRY", "30"),
+        HTTP_TIMEOUT=os.getenv("HTTP_TIMEOUT", "120"),
+        EMBEDDING_DIM=os.getenv("EMBEDDING_DIM", os.getenv("AZURE_OPENAI_EMBEDDING_DIM", "1536")),
+        EMBEDDING_DIMENSIONS=dimensions,
+        EMBED_CACHE_SIZE=os.getenv("EMBED_CACHE_SIZE", "2048"),
+        EMBED_CACHE_TTL=os.getenv("EMBED_CACHE_TTL", "86400"),
+        EMBED_CACHE_PATH=os.getenv("EMBED_CACHE_PATH") or None,
+        EMBED_CACHE_DISK_MAX=os.getenv("EMBED_CACHE_DISK_MAX", "100000"),
+        ANSWER_CACHE_THRESHOLD=os.getenv("ANSWER_CACHE_THRESHOLD", "0.97"),
+        ANSWER_CACHE_SIZE=os.getenv("ANSWER_CACHE_SIZE", "512"),
+        ANSWER_CACHE_TTL=os.getenv("ANSWER_CACHE_TTL", "1800"),
+        AOAI_RPM=os.getenv("AOAI_RPM", "0"),
+        AOAI_TPM=os.getenv("AOAI_TPM", "0"),
+        AOAI_COMPLETION_TOKENS=os.getenv("AOAI_COMPLETION_TOKENS", "800"),
+        AOAI_BACKENDS=os.getenv("AOAI_BACKENDS", ""),
+        AOAI_EWMA_ALPHA=os.getenv("AOAI_EWMA_ALPHA", "0.3"),
+        AOAI_HEDGE_CHAT=os.getenv("AOAI_HEDGE_CHAT", "false").lower() in ("1", "true", "yes"),
+        AOAI_HEDGE_MIN_DELAY=os.getenv("AOAI_HEDGE_MIN_DELAY", "2"),
+        BATCH_SEARCH_CONCURRENCY=os.getenv("BATCH_SEARCH_CONCURRENCY", "16"),
+        BATCH_CHAT_CONCURRENCY=os.getenv("BATCH_CHAT_CONCURRENCY", "4"),
+        SEARCH_SERVICE_FILTER=os.getenv("SEARCH_SERVICE_FILTER", "true").lower() in ("1", "true", "yes"),
+        SEARCH_BACKEND=backend,
+        LOCAL_INDEX_DIR=os.getenv("LOCAL_INDEX_DIR", ".local_index"),
+        LOCAL_INDEX_QUANT=os.getenv("LOCAL_INDEX_QUANT", "float32").lower(),
+        LOCAL_HNSW_MIN_ROWS=os.getenv("LOCAL_HNSW_MIN_ROWS", "50000"),
+        LOCAL_HNSW_EF=os.getenv("LOCAL_HNSW_EF", "64"),
+        SEARCH_MODE=mode,
+        SEARCH_TOP=os.getenv("SEARCH_TOP", "8"),
+        SEARCH_KNN=os.getenv("SEARCH_KNN", "8"),
+        SEARCH_EXHAUSTIVE=os.getenv("SEARCH_EXHAUSTIVE", "false").lower() in ("1", "true", "yes"),
+        SEARCH_SEMANTIC_CONFIG=os.getenv("SEARCH_SEMANTIC_CONFIG", "default-semantic-config"),
+        SEARCH_TWO_PHASE=os.getenv("SEARCH_TWO_PHASE", "false").lower() in ("1", "true", "yes"),
+        SEARCH_FINAL_K=os.getenv("SEARCH_FINAL_K", "5"),
+        SEARCH_PER_PARENT=os.getenv("SEARCH_PER_PARENT", "1"),
+        CONTEXT_TOKEN_BUDGET=os.getenv("CONTEXT_TOKEN_BUDGET", "3000"),
+        CONTEXT_MAX_HITS=os.getenv("CONTEXT_MAX_HITS", "5"),
+        CONTEXT_DEDUP_THRESHOLD=os.getenv("CONTEXT_DEDUP_THRESHOLD", "0.8"),
+        CHAT_TOKENIZER_MODEL=os.getenv("CHAT_TOKENIZER_MODEL", "gpt-4o"),
+        PROMPT_LAYOUT=os.getenv("PROMPT_LAYOUT", "prefix").lower(),
+        SESSION_MAX_TURNS=os.getenv("SESSION_MAX_TURNS", "10"),
+        WEB_SEARCH_MODE=os.getenv("WEB_SEARCH_MODE", "fallback").lower(),
+        WEB_MIN_SCORE=os.getenv("WEB_MIN_SCORE", "0"),
+        WEB_CACHE_SIZE=os.getenv("WEB_CACHE_SIZE", "256"),
+        WEB_CACHE_TTL=os.getenv("WEB_CACHE_TTL", "3600"),
+        METRICS_PORT=os.getenv("METRICS_PORT", "0"),
+        WORKER_CONCURRENCY=os.getenv("WORKER_CONCURRENCY", "8"),
+        WORKER_JOB_TTL=os.getenv("WORKER_JOB_TTL", "3600"),
+        API_HOST=os.getenv("API_HOST", "0.0.0.0"),
+        API_PORT=os.getenv("API_PORT", "8080"),
+        API_REQUEST_TIMEOUT=os.getenv("API_REQUEST_TIMEOUT", "60"),
+        API_MAX_BATCH=os.getenv("API_MAX_BATCH", "100"),
+        API_KEY=os.getenv("API_KEY", ""),
+        ALERT_COALESCE_WINDOW=os.getenv("ALERT_COALESCE_WINDOW", "30"),
+        ALERT_SUPPRESS_TTL=os.getenv("ALERT_SUPPRESS_TTL", "900"),
+        ALERT_QUEUE_SIZE=os.getenv("ALERT_QUEUE_SIZE", "16"),
+        ALERT_WORKERS=os.getenv("ALERT_WORKERS", "4"),
+        ALERT_MAX_PENDING=os.getenv("ALERT_MAX_PENDING", "1000"),
+        ALERT_PATTERN=os.getenv("ALERT_PATTERN", ""),
+        ALERT_IGNORE_PATTERN=os.getenv("ALERT_IGNORE_PATTERN"),
+        INDEX_POINTER_PATH=os.getenv("INDEX_POINTER_PATH", ""),
+        INDEX_POINTER_TTL=os.getenv("INDEX_POINTER_TTL", "5"),
     )
 
-def search_client(settings: Settings) -> SearchClient:
+def embedding_request(texts: List[str], dimensions: int = 0) -> Tuple[str, Dict[str, Any]]:
+    """api-version and JSON body for an embeddings call (shared by the app and scripts/upload_runbooks.py)."""
+    if dimensions:
+        # `dimensions` needs api-version 2024-02-01 or later
+        return "2024-06-01", {"input": texts, "dimensions": dimensions}
+    return "2023-05-15", {"input": texts}
+
+@lru_cache(maxsize=1)
+def env_settings() -> Settings:
+    # as configured in the environment, without the index pointer (scripts that manage indexes)
+    return load_settings()
+
+def get_settings() -> Settings:
+    # validated once per process; call reset_settings() to re-read the environment.
+    # The live index (blue/green pointer) is re-checked on every call, cheaply (INDEX_POINTER_TTL).
+    return apply_pointer(env_settings())
+
+def reset_settings() -> None:
+    # the next get_settings() / env_settings() re-reads and re-validates the environment
+    env_settings.cache_clear()
+
+# the Azure SDK is imported on first use (see app/bootstrap.py)
+@lru_cache(maxsize=None)
+def search_client(settings: Settings) -> "SearchClient":
+    from azure.core.credentials import AzureKeyCredential
+    from azure.search.documents import SearchClient
     return SearchClient(
         endpoint=settings.AZURE_SEARCH_ENDPOINT,
         index_name=settings.AZURE_SEARCH_INDEX,
         credential=AzureKeyCredential(settings.AZURE_SEARCH_API_KEY),
     )
 
-def index_client(settings: Settings) -> SearchIndexClient:
+def async_search_client(settings: Settings) -> "AsyncSearchClient":
+    if settings.SEARCH_BACKEND == "local":
+        # same search() coroutine API, answered in-process from the memory-mapped local index
+        from app.local_search import get_local_index
+        return get_local_index(settings.LOCAL_INDEX_DIR, settings.LOCAL_INDEX_QUANT, settings.LOCAL_HNSW_MIN_ROWS,
+                               settings.LOCAL_HNSW_EF)
+    # aio clients own an aiohttp session bound to the running loop, so they are pooled per loop
+    from azure.core.credentials import AzureKeyCredential
+    from azure.search.documents.aio import SearchClient as AsyncSearchClient
+    from app.http_clients import loop_scoped
+    return loop_scoped(
+        f"search:{settings.AZURE_SEARCH_ENDPOINT}/{settings.AZURE_SEARCH_INDEX}",
+        lambda: AsyncSearchClient(
+            endpoint=settings.AZURE_SEARCH_ENDPOINT,
+            index_name=settings.AZURE_SEARCH_INDEX,
+            credential=AzureKeyCredential(settings.AZURE_SEARCH_API_KEY),
+        ),
+    )
+
+def index_client(settings: Settings) -> "SearchIndexClient":
+    from azure.core.credentials import AzureKeyCredential
+    from azure.search.documents.indexes import SearchIndexClient
     return SearchIndexClient(
         endpoint=settings.AZURE_SEARCH_ENDPOINT,
         credential=AzureKeyCredential(settings.AZURE_SEARCH_API_KEY),
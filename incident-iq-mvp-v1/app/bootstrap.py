@@ -0,0 +1,117 @@
+"""
+Process bootstrap: environment, settings and warm connections, once per process.
+
+- load_env(): find_dotenv / load_dotenv run once per process; Streamlit reruns and repeated
+  imports are no-ops
+- settings are validated once by get_settings() (the blue/green pointer is still followed)
+- prewarm(settings): on the loop that will serve requests, imports the request-path modules
+  (Azure Search SDK, httpx, tenacity), loads the tokenizer and opens the pooled connections
+  (DNS + TLS) to every AOAI backend, the search service and Bing, so the first incident does not
+  pay for them. The UI / API start serving while this runs.
+
+The heavy SDK modules are imported on first use by the modules that need them, so importing the
+app entry points stays cheap. `python -m app.bootstrap` prints an import-time report
+(python -X importtime) per entry point and what is deferred until first use.
+"""
+from __future__ import annotations
+import asyncio, os, threading, time
+from typing import Any, Dict, Optional
+
+_env_lock = threading.Lock()
+_env_loaded: Optional[str] = None
+
+def load_env() -> str:
+    """Load the project .env (override=True) once; returns its path ('' when there is none)."""
+    global _env_loaded
+    with _env_lock:
+        if _env_loaded is None:
+            from dotenv import find_dotenv, load_dotenv
+            # override=True: .env values replace placeholder shell variables
+            _env_loaded = find_dotenv()
+            load_dotenv(_env_loaded or None, override=True)
+        return _env_loaded
+
+# request-path modules kept off the import path of the entry points
+DEFERRED_MODULES = ("httpx", "tenacity", "azure.search.documents.aio", "azure.search.documents.models",
+                    "app.aoai_router", "app.http_clients")
+
+async def _timed(results: Dict[str, Any], name: str, coro) -> None:
+    t = time.perf_counter()
+    try:
+        await coro
+        results[name] = round((time.perf_counter() - t) * 1000, 1)
+    except Exception as e:
+        results[name] = f"error: {type(e).__name__}"
+
+async def _touch(url: str, settings) -> None:
+    from app.http_clients import get_client
+    # any response will do: the point is a pooled, already-negotiated connection
+    await get_client(url, settings).get(url, timeout=10.0)
+
+async def prewarm(settings, timeout: float = 15.0) -> Dict[str, Any]:
+    """Warm imports, tokenizer and connections on the running loop; returns ms (or error) per step."""
+    import importlib
+    from app import telemetry
+    from app.context_builder import count_tokens
+    results: Dict[str, Any] = {}
+    # prometheus_client is optional: telemetry imports it (and creates the metrics) if it is installed
+    await _timed(results, "imports", asyncio.to_thread(
+        lambda: ([importlib.import_module(m) for m in DEFERRED_MODULES], telemetry.metrics_enabled())))
+
+    from app.aoai_router import get_router
+    from app.azure_clients import async_search_client
+    steps = [_timed(results, "tokenizer", asyncio.to_thread(count_tokens, "warm-up", settings.CHAT_TOKENIZER_MODEL))]
+    for b in get_router(settings).backends:
+        steps.append(_timed(results, f"aoai:{b.name}", _touch(b.endpoint + "/", settings)))
+    if settings.SEARCH_BACKEND == "local":
+        # loads (memory-maps) the local index
+        steps.append(_timed(results, "search", asyncio.to_thread(async_search_client, settings)))
+    else:
+        steps.append(_timed(results, "search", async_search_client(settings).get_document_count()))
+    if settings.BING_SEARCH_ENDPOINT and settings.BING_SEARCH_API_KEY:
+        steps.append(_timed(results, "bing", _touch(settings.BING_SEARCH_ENDPOINT, settings)))
+    try:
+        await asyncio.wait_for(asyncio.gather(*steps), timeout)
+    except asyncio.TimeoutError:
+        results["timeout"] = timeout
+    return results
+
+def start_prewarm(settings, loop: asyncio.AbstractEventLoop):
+    """Schedule prewarm on `loop` (owned by another thread); returns a concurrent.futures.Future."""
+    return asyncio.run_coroutine_threadsafe(prewarm(settings), loop)
+
+# ---------- Import-time report ----------
+ENTRY_POINTS = ("app.rag_pipeline", "app.session", "app.worker", "app.http_api")
+
+def _importtime(code: str) -> Dict[str, int]:
+    """Cumulative microseconds per top-level import of `code`, from python -X importtime."""
+    import subprocess, sys
+    root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+    proc = subprocess.run([sys.executable, "-X", "importtime", "-c", code], cwd=root,
+                          capture_output=True, text=True, check=True)
+    top: Dict[str, int] = {}
+    for line in proc.stderr.splitlines():
+        if not line.startswith("import time:") or line.count("|") != 2:
+            continue
+        _, cum, name = line[len("import time:"):].split("|")
+        if cum.strip().isdigit() and not name[1:].startswith(" "):
+            top[name.strip()] = int(cum)
+    return top
+
+def import_report() -> None:
+    startup = set(_importtime("pass"))  # interpreter start-up (site, encodings, ...)
+
+    def total(code: str) -> float:
+        return sum(us for name, us in _importtime(code).items() if name not in startup) / 1000
+
+    eager = "; ".join(f"import {m}" for m in DEFERRED_MODULES)
+    print(f"{'entry point':<22}{'import ms':>10}{'eager ms':>10}")
+    for mod in ENTRY_POINTS:
+        print(f"{mod:<22}{total(f'import {mod}'):>10.1f}{total(f'{eager}; import {mod}'):>10.1f}")
+    print("\ndeferred until first use (ms, cumulative):")
+    for name, us in sorted(_importtime(eager).items(), key=lambda kv: -kv[1]):
+        if name not in startup:
+            print(f"  {name:<40}{us / 1000:>8.1f}")
+
+if __name__ == "__main__":
+    import_report()
@@ -0,0 +1,113 @@
+"""
+Section-aware runbook parsing and chunking.
+
+Runbooks follow a fixed layout:
+
+    # RUNBOOK-01 <title>
+    서비스: <service>
+    심각도: <P1..P3>
+
+    ## 상황 / ## 대응방안 / ## 서비스 영향도 / ## Postmortem(요약)
+
+The header lines fill the filterable `service` / `severity` fields, `서비스 영향도` and
+`대응방안` fill `impact` / `actions`, and every section becomes its own chunk (long
+sections are split on paragraph boundaries) tied to its runbook through `parentId`.
+"""
+from __future__ import annotations
+import re
+from dataclasses import dataclass, field
+from typing import Dict, List, Optional
+
+SECTION_SITUATION = "상황"
+SECTION_ACTIONS = "대응방안"
+SECTION_IMPACT = "서비스 영향도"
+SECTION_POSTMORTEM = "Postmortem"
+
+_HEADER = re.compile(r"^\s*(서비스|심각도)\s*[:：]\s*(.+?)\s*$")
+_H1 = re.compile(r"^#\s+(.+?)\s*$")
+_H2 = re.compile(r"^##\s+(.+?)\s*$")
+
+@dataclass
+class Runbook:
+    title: str
+    service: str = "N/A"
+    severity: str = "P3"
+    preamble: str = ""
+    sections: Dict[str, str] = field(default_factory=dict)
+
+    @property
+    def actions(self) -> str:
+        return self.sections.get(SECTION_ACTIONS, "")
+
+    @property
+    def impact(self) -> str:
+        return self.sections.get(SECTION_IMPACT, "") or "N/A"
+
+def section_name(heading: str) -> str:
+    # "Postmortem(요약)" -> "Postmortem"; other headings are kept as written
+    return SECTION_POSTMORTEM if heading.lower().startswith("postmortem") else heading
+
+def parse_runbook(md: str, fallback_title: str) -> Runbook:
+    rb = Runbook(title=fallback_title)
+    current: Optional[str] = None
+    buf: List[str] = []
+    preamble: List[str] = []
+
+    def flush() -> None:
+        if current is not None:
+            rb.sections[current] = "\n".join(buf).strip()
+
+    for line in md.splitlines():
+        m = _H2.match(line)
+        if m:
+            flush()
+            current, buf = section_name(m.group(1)), []
+            continue
+        if current is None:
+            h1 = _H1.match(line)
+            header = _HEADER.match(line)
+            if h1:
+                rb.title = h1.group(1)
+            elif header:
+                if header.group(1) == "서비스":
+                    rb.service = header.group(2)
+                else:
+                    rb.severity = header.group(2).upper()
+            elif line.strip():
+                preamble.append(line)
+            continue
+        buf.append(line)
+    flush()
+    rb.preamble = "\n".join(preamble).strip()
+    return rb
+
+def _split_long(text: str, max_chars: int) -> List[str]:
+    if len(text) <= max_chars:
+        return [text]
+    parts: List[str] = []
+    cur = ""
+    for para in re.split(r"\n\s*\n", text):
+        if cur and len(cur) + len(para) + 2 > max_chars:
+            parts.append(cur)
+            cur = ""
+        # a single oversized paragraph is hard-wrapped
+        while len(para) > max_chars:
+            parts.append(para[:max_chars])
+            para = para[max_chars:]
+        cur = f"{cur}\n\n{para}" if cur else para
+    if cur:
+        parts.append(cur)
+    return parts
+
+def chunk_runbook(rb: Runbook, max_chars: int = 1500) -> List[Dict[str, str]]:
+    """Return one dict per chunk: section, content (title/section prefixed for embedding)."""
+    sections = dict(rb.sections)
+    if rb.preamble:
+        sections = {"개요": rb.preamble, **sections}
+    if not sections:
+        sections = {"본문": ""}
+    chunks = []
+    for name, body in sections.items():
+        for piece in _split_long(body, max_chars):
+            chunks.append({"section": name, "content": f"{rb.title}\n[{name}]\n{piece}".strip()})
+    return chunks
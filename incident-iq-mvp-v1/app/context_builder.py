@@ -0,0 +1,187 @@
+"""
+Token-budgeted prompt context.
+
+Hits arrive in relevance order. Each one becomes a block (title header + chunk content,
+plus the runbook's actions once per parentId) and blocks are packed until CONTEXT_TOKEN_BUDGET
+is spent, counted with the chat model's tokenizer:
+
+- exact and near-duplicate passages (character-shingle Jaccard >= CONTEXT_DEDUP_THRESHOLD) are dropped
+- a block that does not fit is trimmed to its paragraphs that overlap the query most
+- web references go last and only while budget remains
+"""
+from __future__ import annotations
+import re
+from dataclasses import dataclass, field
+from functools import lru_cache
+from typing import Dict, FrozenSet, List
+
+from app.chunking import SECTION_ACTIONS
+from app.embedding_cache import normalize_text
+from app.rate_limit import estimate_tokens
+
+# ---------- Tokenizer ----------
+@lru_cache(maxsize=None)
+def _encoding(model: str):
+    try:
+        import tiktoken
+    except ImportError:
+        return None
+    try:
+        try:
+            return tiktoken.encoding_for_model(model)
+        except KeyError:
+            # deployment names are free-form; unknown ones get the GPT-4 family encoding
+            return tiktoken.get_encoding("cl100k_base")
+    except Exception:
+        # the BPE file is downloaded on first use; offline hosts fall back to the byte estimate
+        return None
+
+def count_tokens(text: str, model: str = "gpt-4o") -> int:
+    enc = _encoding(model)
+    if enc is None:
+        return estimate_tokens(text)
+    return len(enc.encode(text, disallowed_special=()))
+
+def count_message_tokens(messages: List[Dict[str, str]], model: str = "gpt-4o") -> int:
+    # ~4 tokens of per-message framing plus 3 priming the reply (OpenAI cookbook accounting)
+    return sum(count_tokens(m.get("content") or "", model) + 4 for m in messages) + 3
+
+def truncate_tokens(text: str, limit: int, model: str = "gpt-4o") -> str:
+    if limit <= 0:
+        return ""
+    enc = _encoding(model)
+    if enc is None:
+        # byte estimate: ~4 UTF-8 bytes per token
+        return text.encode("utf-8")[: limit * 4].decode("utf-8", "ignore")
+    ids = enc.encode(text, disallowed_special=())
+    return text if len(ids) <= limit else enc.decode(ids[:limit])
+
+# ---------- Near-duplicate detection ----------
+def shingles(text: str, n: int = 3) -> FrozenSet[str]:
+    # character n-grams work for Korean without a morphological analyser
+    s = normalize_text(text)
+    if len(s) <= n:
+        return frozenset([s]) if s else frozenset()
+    return frozenset(s[i:i + n] for i in range(len(s) - n + 1))
+
+def jaccard(a: FrozenSet[str], b: FrozenSet[str]) -> float:
+    if not a or not b:
+        return 0.0
+    return len(a & b) / len(a | b)
+
+# ---------- Trimming ----------
+_TERM = re.compile(r"\w+")
+
+def _terms(text: str) -> set:
+    return {t for t in _TERM.findall(normalize_text(text)) if len(t) > 1}
+
+def trim_to_budget(text: str, query: str, limit: int, model: str = "gpt-4o") -> str:
+    """Keep the paragraphs/lines sharing the most terms with the query, in original order, within `limit` tokens."""
+    if count_tokens(text, model) <= limit:
+        return text
+    parts = [p for p in re.split(r"\n\s*\n|\n", text) if p.strip()]
+    q = _terms(query)
+    # highest overlap first; earlier paragraphs win ties (headers and summaries lead)
+    order = sorted(range(len(parts)), key=lambda i: (-len(q & _terms(parts[i])), i))
+    keep: List[int] = []
+    used = 0
+    for i in order:
+        cost = count_tokens(parts[i], model) + 1
+        if used + cost <= limit:
+            keep.append(i)
+            used += cost
+    if not keep:
+        return truncate_tokens(parts[order[0]], limit, model)
+    return "\n".join(parts[i] for i in sorted(keep))
+
+# ---------- Packing ----------
+@dataclass
+class PackedContext:
+    text: str
+    tokens: int
+    budget: int
+    hit_ids: List[str] = field(default_factory=list)
+    duplicates: int = 0
+    trimmed: int = 0
+    skipped: int = 0
+
+    def stats(self) -> Dict[str, int]:
+        return {"context_tokens": self.tokens, "budget": self.budget, "hits_used": len(self.hit_ids),
+                "duplicates_dropped": self.duplicates, "trimmed": self.trimmed, "skipped": self.skipped}
+
+def build_context(hits: List[dict], web_refs: List[Dict[str, str]], query: str, *,
+                  budget: int, max_hits: int = 5, dedup_threshold: float = 0.8,
+                  model: str = "gpt-4o") -> PackedContext:
+    packed = PackedContext(text="", tokens=0, budget=budget)
+    seen: List[FrozenSet[str]] = []
+    # actions are included once per runbook; a packed 대응방안 chunk already shows them
+    actions_shown: set = set()
+    blocks: List[str] = []
+
+    def duplicate(sh: FrozenSet[str]) -> bool:
+        if any(jaccard(sh, s) >= dedup_threshold for s in seen):
+            packed.duplicates += 1
+            return True
+        return False
+
+    for h in hits:
+        if len(packed.hit_ids) >= max_hits:
+            break
+        remaining = budget - packed.tokens
+        header = f"\n### {h.get('title')} (sev:{h.get('severity') or 'N/A'})\n"
+        header_cost = count_tokens(header, model)
+        if remaining <= header_cost:
+            packed.skipped += 1
+            continue
+        content = h.get("content") or ""
+        content_sh = shingles(content)
+        if duplicate(content_sh):
+            continue
+        # shingles and shown actions are recorded only once the block is accepted
+        accepted = [content_sh]
+        body = content
+        parent = h.get("parentId")
+        actions = h.get("actions") or ""
+        is_actions_chunk = h.get("section") == SECTION_ACTIONS
+        show_actions = bool(actions) and not is_actions_chunk and (parent is None or parent not in actions_shown)
+        if show_actions:
+            actions_sh = shingles(actions)
+            if not duplicate(actions_sh):
+                body += f"\n대응:{actions}"
+                accepted.append(actions_sh)
+        fitted = trim_to_budget(body, query, remaining - header_cost, model)
+        if not fitted.strip():
+            packed.skipped += 1
+            continue
+        block = header + fitted + "\n"
+        cost = count_tokens(block, model)
+        if packed.tokens + cost > budget:
+            packed.skipped += 1
+            continue
+        if fitted != body:
+            packed.trimmed += 1
+        seen.extend(accepted)
+        if (show_actions or is_actions_chunk) and parent is not None:
+            actions_shown.add(parent)
+        blocks.append(block)
+        packed.tokens += cost
+        packed.hit_ids.append(h.get("id"))
+
+    if web_refs:
+        head = "\n[인터넷 참고자료]\n"
+        lines: List[str] = []
+        used = count_tokens(head, model)
+        for w in web_refs:
+            line = f"- {w['name']} ({w['url']})\n"
+            cost = count_tokens(line, model)
+            if packed.tokens + used + cost > budget:
+                packed.skipped += 1
+                continue
+            lines.append(line)
+            used += cost
+        if lines:
+            blocks.append(head + "".join(lines))
+            packed.tokens += used
+
+    packed.text = "".join(blocks)
+    return packed
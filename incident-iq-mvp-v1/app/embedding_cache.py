@@ -0,0 +1,199 @@
+"""
+Two-tier query-embedding cache in front of aembed.
+
+- memory tier: LRU (OrderedDict) of float32 arrays with TTL
+- disk tier (optional, EMBED_CACHE_PATH): sqlite table of float32 blobs, shared across restarts.
+  Writes go through a write-behind thread in batches; aget_many reads it off the event loop. The
+  table is trimmed (TTL, then oldest rows) every TRIM_EVERY writes or once the row count passes
+  disk_max_items by HIGH_WATER, not on every put.
+
+Keys are "deployment:dimension:sha256(embedding_text(text))", so repeated alert texts skip the
+embedding round-trip entirely. aembed sends embedding_text() itself to the model, so a cached
+vector is exactly the one the model returns for that text (case is kept; only Unicode forms and
+whitespace are folded).
+"""
+from __future__ import annotations
+import asyncio, atexit, hashlib, queue, re, sqlite3, threading, time, unicodedata
+from array import array
+from collections import OrderedDict
+from functools import lru_cache
+from typing import Dict, List, Optional, Tuple
+
+_WS = re.compile(r"\s+")
+
+def embedding_text(text: str) -> str:
+    # NFKC folds full-width/compatibility forms, whitespace runs collapse to one space
+    return _WS.sub(" ", unicodedata.normalize("NFKC", text or "")).strip()
+
+def normalize_text(text: str) -> str:
+    # for exact matching (single-flight, answer/web cache keys, shingles); never sent to the model
+    return embedding_text(text).lower()
+
+def cache_key(deployment: str, dim: int, text: str) -> str:
+    digest = hashlib.sha256(embedding_text(text).encode("utf-8")).hexdigest()
+    return f"{deployment}:{dim}:{digest}"
+
+class EmbeddingCache:
+    TRIM_EVERY = 512
+    HIGH_WATER = 1.1
+
+    def __init__(self, max_items: int = 2048, ttl: float = 86400.0,
+                 disk_path: Optional[str] = None, disk_max_items: int = 100_000):
+        self.max_items = max_items
+        self.ttl = ttl
+        self.disk_max_items = disk_max_items
+        self._mem: "OrderedDict[str, Tuple[float, array]]" = OrderedDict()
+        self._lock = threading.Lock()
+        self._db: Optional[sqlite3.Connection] = None
+        self._db_lock = threading.Lock()
+        self._writes: "queue.Queue[Tuple[str, float, bytes]]" = queue.Queue()
+        self._disk_rows = 0
+        self._since_trim = 0
+        self.hits = 0
+        self.disk_hits = 0
+        self.misses = 0
+        if disk_path:
+            self._db = sqlite3.connect(disk_path, check_same_thread=False, isolation_level=None)
+            self._db.execute("PRAGMA journal_mode=WAL")
+            self._db.execute("CREATE TABLE IF NOT EXISTS emb (key TEXT PRIMARY KEY, created REAL NOT NULL, vec BLOB NOT NULL)")
+            self._db.execute("CREATE INDEX IF NOT EXISTS emb_created ON emb(created)")
+            (self._disk_rows,) = self._db.execute("SELECT COUNT(*) FROM emb").fetchone()
+            threading.Thread(target=self._writer, name="embedding-cache-writer", daemon=True).start()
+            atexit.register(self.flush)
+
+    def _expired(self, created: float, now: float) -> bool:
+        return self.ttl > 0 and now - created > self.ttl
+
+    def _remember(self, key: str, created: float, vec: array) -> None:
+        self._mem[key] = (created, vec)
+        self._mem.move_to_end(key)
+        while len(self._mem) > self.max_items:
+            self._mem.popitem(last=False)
+
+    def _mem_get(self, key: str, now: float) -> Optional[List[float]]:
+        # caller holds self._lock
+        item = self._mem.get(key)
+        if item is None:
+            return None
+        if self._expired(item[0], now):
+            del self._mem[key]
+            return None
+        self._mem.move_to_end(key)
+        return item[1].tolist()
+
+    def _disk_get(self, keys: List[str], now: float) -> Dict[str, Tuple[float, array]]:
+        found: Dict[str, Tuple[float, array]] = {}
+        rows = []
+        with self._db_lock:
+            for i in range(0, len(keys), 500):  # below SQLITE_MAX_VARIABLE_NUMBER on old builds
+                part = keys[i:i + 500]
+                rows += self._db.execute(
+                    f"SELECT key, created, vec FROM emb WHERE key IN ({','.join('?' * len(part))})", part).fetchall()
+        for key, created, blob in rows:
+            if not self._expired(created, now):
+                vec = array("f")
+                vec.frombytes(blob)
+                found[key] = (created, vec)
+        return found
+
+    def _resolve(self, keys: List[str], vectors: List[Optional[List[float]]],
+                 disk: Dict[str, Tuple[float, array]]) -> List[Optional[List[float]]]:
+        with self._lock:
+            for i, key in enumerate(keys):
+                if vectors[i] is not None:
+                    self.hits += 1
+                elif key in disk:
+                    self._remember(key, *disk[key])
+                    vectors[i] = disk[key][1].tolist()
+                    self.disk_hits += 1
+                else:
+                    self.misses += 1
+        return vectors
+
+    def _lookup(self, keys: List[str], now: float) -> Tuple[List[Optional[List[float]]], List[str]]:
+        with self._lock:
+            vectors = [self._mem_get(k, now) for k in keys]
+        missing = [k for k, v in zip(keys, vectors) if v is None] if self._db is not None else []
+        return vectors, missing
+
+    def get(self, key: str) -> Optional[List[float]]:
+        now = time.time()
+        vectors, missing = self._lookup([key], now)
+        return self._resolve([key], vectors, self._disk_get(missing, now) if missing else {})[0]
+
+    async def aget_many(self, keys: List[str]) -> List[Optional[List[float]]]:
+        """Like get() per key; the disk tier is read in one query on a worker thread."""
+        now = time.time()
+        vectors, missing = self._lookup(keys, now)
+        disk = await asyncio.to_thread(self._disk_get, missing, now) if missing else {}
+        return self._resolve(keys, vectors, disk)
+
+    def put(self, key: str, vector: List[float]) -> None:
+        now = time.time()
+        vec = array("f", vector)
+        with self._lock:
+            self._remember(key, now, vec)
+        if self._db is not None:
+            self._writes.put((key, now, vec.tobytes()))
+
+    def flush(self) -> None:
+        """Block until queued disk writes are committed."""
+        if self._db is not None:
+            self._writes.join()
+
+    def _writer(self) -> None:
+        while True:
+            batch = [self._writes.get()]
+            while True:
+                try:
+                    batch.append(self._writes.get_nowait())
+                except queue.Empty:
+                    break
+            try:
+                with self._db_lock:
+                    self._db.executemany("INSERT OR REPLACE INTO emb (key, created, vec) VALUES (?, ?, ?)", batch)
+                    # replaced keys are counted too: the counter is an upper bound until the next trim
+                    self._disk_rows += len(batch)
+                    self._since_trim += len(batch)
+                    if self._since_trim >= self.TRIM_EVERY or self._disk_rows > self.disk_max_items * self.HIGH_WATER:
+                        self._trim_disk(time.time())
+            except sqlite3.Error:
+                pass  # the disk tier is best-effort; the memory tier already has the vectors
+            finally:
+                for _ in batch:
+                    self._writes.task_done()
+
+    def _trim_disk(self, now: float) -> None:
+        # caller holds self._db_lock
+        if self.ttl > 0:
+            self._db.execute("DELETE FROM emb WHERE created < ?", (now - self.ttl,))
+        (count,) = self._db.execute("SELECT COUNT(*) FROM emb").fetchone()
+        if count > self.disk_max_items:
+            self._db.execute(
+                "DELETE FROM emb WHERE key IN (SELECT key FROM emb ORDER BY created ASC LIMIT ?)",
+                (count - self.disk_max_items,),
+            )
+            count = self.disk_max_items
+        self._disk_rows = count
+        self._since_trim = 0
+
+    def stats(self) -> Dict[str, float]:
+        lookups = self.hits + self.disk_hits + self.misses
+        return {
+            "hits": self.hits,
+            "disk_hits": self.disk_hits,
+            "misses": self.misses,
+            "hit_rate": (self.hits + self.disk_hits) / lookups if lookups else 0.0,
+            "size": len(self._mem),
+        }
+
+def get_embedding_cache(settings) -> EmbeddingCache:
+    # keyed on the embedding deployment and effective vector size, not the whole Settings: an index
+    # pointer switch to an index with the same embeddings keeps the cache
+    return _embedding_cache(settings.AZURE_OPENAI_DEPLOYMENT, settings.vector_dim, settings.EMBED_CACHE_SIZE,
+                            settings.EMBED_CACHE_TTL, settings.EMBED_CACHE_PATH, settings.EMBED_CACHE_DISK_MAX)
+
+@lru_cache(maxsize=None)
+def _embedding_cache(deployment: str, dim: int, max_items: int, ttl: float, disk_path: Optional[str],
+                     disk_max_items: int) -> EmbeddingCache:
+    return EmbeddingCache(max_items=max_items, ttl=ttl, disk_path=disk_path, disk_max_items=disk_max_items)
@@ -0,0 +1,243 @@
+"""
+Headless HTTP API around the incident orchestrator (aiohttp), for ITSM webhooks, chat bots and scripts.
+
+    python -m app.http_api            # API_HOST:API_PORT (default 0.0.0.0:8080)
+
+    POST /v1/incidents          {"symptom", "service", "extra"}  -> result JSON (same shape as generate_incident_response)
+    POST /v1/incidents/stream   same body -> text/event-stream: context, token..., reset?, result (see stream_incident_response)
+    POST /v1/incidents/batch    {"events": [...]}                -> {"results": [...]} (generate_incident_responses,
+                                                                      at most API_MAX_BATCH events, else 413)
+    GET  /healthz, GET /metrics (Prometheus)
+
+One event loop serves every request, so settings, search clients, HTTP pools and caches are shared.
+Identical requests (after normalize_text) that arrive while one is being analysed join that
+analysis (single-flight): a single retrieval + chat runs and every waiter, streaming or not,
+gets its events and result. Each analysis is bounded by API_REQUEST_TIMEOUT seconds (504).
+With API_KEY set, requests must send it as "Authorization: Bearer <key>" or "X-API-Key".
+"""
+from __future__ import annotations
+import asyncio, hmac, json, time
+from typing import Any, AsyncIterator, Dict, List, Optional, Tuple
+
+from aiohttp import web
+
+from app import telemetry
+from app.embedding_cache import normalize_text
+
+Key = Tuple[str, str, str]
+
+class Flight:
+    """One in-progress analysis; events are kept so late joiners replay the stream from the start."""
+    def __init__(self, key: Key):
+        self.key = key
+        self.events: List[Dict[str, Any]] = []
+        self.done = asyncio.get_running_loop().create_future()
+        self.task: Optional[asyncio.Task] = None
+        self._changed = asyncio.Condition()
+
+    async def publish(self, event: Dict[str, Any]) -> None:
+        async with self._changed:
+            self.events.append(event)
+            self._changed.notify_all()
+
+    async def finish(self, result: Optional[Dict[str, Any]], error: Optional[Exception] = None) -> None:
+        async with self._changed:
+            if error is not None:
+                self.done.set_exception(error)
+                self.done.exception()  # retrieved here: waiters may all be gone
+            else:
+                self.done.set_result(result)
+            self._changed.notify_all()
+
+    async def replay(self) -> AsyncIterator[Dict[str, Any]]:
+        i = 0
+        while True:
+            async with self._changed:
+                await self._changed.wait_for(lambda: i < len(self.events) or self.done.done())
+                batch = self.events[i:]
+            for ev in batch:
+                yield ev
+            i += len(batch)
+            if not batch and self.done.done():
+                return
+
+class SingleFlight:
+    """Deduplicates concurrent analyses of the same (normalised) incident."""
+    def __init__(self, timeout: float):
+        self.timeout = timeout
+        self.flights: Dict[Key, Flight] = {}
+        self.stats = {"started": 0, "joined": 0}
+
+    @staticmethod
+    def key(symptom: str, service: str, extra: str) -> Key:
+        return normalize_text(symptom), normalize_text(service), normalize_text(extra)
+
+    def join(self, symptom: str, service: str, extra: str) -> Flight:
+        key = self.key(symptom, service, extra)
+        flight = self.flights.get(key)
+        if flight is None:
+            flight = self.flights[key] = Flight(key)
+            self.stats["started"] += 1
+            # the analysis belongs to no single request: a disconnecting client does not cancel it
+            flight.task = asyncio.get_running_loop().create_task(self._run(flight, symptom, service, extra))
+        else:
+            self.stats["joined"] += 1
+        return flight
+
+    async def _run(self, flight: Flight, symptom: str, service: str, extra: str) -> None:
+        from app.rag_pipeline import stream_incident_response
+        result: Optional[Dict[str, Any]] = None
+        try:
+            async with asyncio.timeout(self.timeout):
+                async for ev in stream_incident_response(symptom, service, extra):
+                    await flight.publish(ev)
+                    if ev["type"] == "result":
+                        result = ev["result"]
+            await flight.finish(result)
+        except Exception as e:
+            await flight.finish(None, e)
+        finally:
+            self.flights.pop(flight.key, None)
+            if not flight.done.done():  # server shutdown
+                flight.done.cancel()
+
+# ---------- Handlers ----------
+def _fields(body: Dict[str, Any]) -> Tuple[str, str, str]:
+    return str(body.get("symptom") or ""), str(body.get("service") or ""), str(body.get("extra") or "")
+
+def _error(status: int, message: str) -> web.Response:
+    return web.json_response({"error": message}, status=status)
+
+async def _incident(request: web.Request) -> Optional[Tuple[str, str, str]]:
+    try:
+        body = await request.json()
+    except (json.JSONDecodeError, UnicodeDecodeError):
+        return None
+    fields = _fields(body) if isinstance(body, dict) else ("", "", "")
+    return fields if fields[0].strip() else None
+
+def _failure(e: BaseException, timeout: float) -> Tuple[int, str]:
+    if isinstance(e, TimeoutError):
+        return 504, f"analysis exceeded API_REQUEST_TIMEOUT ({timeout:g}s)"
+    return 502, str(e) or type(e).__name__
+
+async def analyse(request: web.Request) -> web.Response:
+    fields = await _incident(request)
+    if fields is None:
+        return _error(400, "JSON body with a non-empty 'symptom' is required")
+    sf: SingleFlight = request.app["singleflight"]
+    flight = sf.join(*fields)
+    try:
+        result = await asyncio.shield(flight.done)
+    except Exception as e:
+        return _error(*_failure(e, sf.timeout))
+    return web.json_response(result, dumps=lambda o: json.dumps(o, ensure_ascii=False, default=str))
+
+async def analyse_stream(request: web.Request) -> web.StreamResponse:
+    fields = await _incident(request)
+    if fields is None:
+        return _error(400, "JSON body with a non-empty 'symptom' is required")
+    sf: SingleFlight = request.app["singleflight"]
+    flight = sf.join(*fields)
+    resp = web.StreamResponse(headers={"Content-Type": "text/event-stream", "Cache-Control": "no-cache",
+                                       "X-Accel-Buffering": "no"})
+    await resp.prepare(request)
+
+    async def send(event: str, data: Any) -> None:
+        await resp.write(f"event: {event}\ndata: {json.dumps(data, ensure_ascii=False, default=str)}\n\n".encode("utf-8"))
+
+    try:
+        async for ev in flight.replay():
+            await send(ev["type"], {k: v for k, v in ev.items() if k != "type"})
+        if flight.done.cancelled():  # server shutdown
+            await send("error", {"status": 503, "error": "analysis cancelled"})
+        elif flight.done.exception() is not None:
+            status, message = _failure(flight.done.exception(), sf.timeout)
+            await send("error", {"status": status, "error": message})
+        await resp.write_eof()
+    except ConnectionResetError:
+        # the client went away; the shared analysis carries on for the other waiters
+        pass
+    # CancelledError (disconnect noticed by aiohttp, server shutdown) propagates: nothing to undo here,
+    # the flight is owned by SingleFlight, not by this request
+    return resp
+
+async def analyse_batch(request: web.Request) -> web.Response:
+    from app.rag_pipeline import generate_incident_responses
+    try:
+        body = await request.json()
+    except (json.JSONDecodeError, UnicodeDecodeError):
+        body = None
+    events = body.get("events") if isinstance(body, dict) else None
+    if not isinstance(events, list) or not all(isinstance(ev, dict) for ev in events):
+        return _error(400, "JSON body with an 'events' list is required")
+    max_batch = request.app["max_batch"]
+    if len(events) > max_batch:
+        return _error(413, f"at most API_MAX_BATCH ({max_batch}) events per batch")
+    timeout = request.app["singleflight"].timeout
+    try:
+        async with asyncio.timeout(timeout):
+            results = await generate_incident_responses(events)
+    except TimeoutError as e:
+        return _error(*_failure(e, timeout))
+    return web.json_response({"results": results}, dumps=lambda o: json.dumps(o, ensure_ascii=False, default=str))
+
+async def healthz(request: web.Request) -> web.Response:
+    sf: SingleFlight = request.app["singleflight"]
+    warm = request.app.get("prewarm")
+    prewarm = (warm.result() if not warm.cancelled() and not warm.exception() else "failed") if warm and warm.done() else "running"
+    return web.json_response({"status": "ok", "in_flight": len(sf.flights), **sf.stats, "prewarm": prewarm,
+                              "uptime_s": round(time.monotonic() - request.app["started"], 1)})
+
+async def metrics(request: web.Request) -> web.Response:
+    body, content_type = telemetry.metrics_payload()
+    resp = web.Response(body=body)
+    resp.headers["Content-Type"] = content_type
+    return resp
+
+# ---------- App ----------
+@web.middleware
+async def _auth(request: web.Request, handler):
+    key = request.app["api_key"]
+    if key and request.path.startswith("/v1/"):
+        given = request.headers.get("X-API-Key") or request.headers.get("Authorization", "").removeprefix("Bearer ").strip()
+        if not hmac.compare_digest(given.encode("utf-8"), key.encode("utf-8")):
+            return _error(401, "missing or invalid API key")
+    return await handler(request)
+
+async def _prewarm(app: web.Application) -> None:
+    from app.bootstrap import prewarm
+    # in the background: the server accepts requests while imports and connections warm up
+    app["prewarm"] = asyncio.create_task(prewarm(app["settings"]))
+
+async def _close_clients(app: web.Application) -> None:
+    from app.http_clients import aclose_clients
+    await aclose_clients()
+
+def create_app(settings=None) -> web.Application:
+    from app.azure_clients import get_settings
+    settings = settings or get_settings()
+    app = web.Application(middlewares=[_auth], client_max_size=1024 ** 2)
+    app["settings"] = settings
+    app["singleflight"] = SingleFlight(settings.API_REQUEST_TIMEOUT)
+    app["api_key"] = settings.API_KEY
+    app["max_batch"] = settings.API_MAX_BATCH
+    app["started"] = time.monotonic()
+    app.router.add_post("/v1/incidents", analyse)
+    app.router.add_post("/v1/incidents/stream", analyse_stream)
+    app.router.add_post("/v1/incidents/batch", analyse_batch)
+    app.router.add_get("/healthz", healthz)
+    app.router.add_get("/metrics", metrics)
+    app.on_startup.append(_prewarm)
+    app.on_cleanup.append(_close_clients)
+    return app
+
+def main() -> None:
+    from app.bootstrap import load_env
+    load_env()
+    from app.azure_clients import get_settings
+    settings = get_settings()
+    web.run_app(create_app(settings), host=settings.API_HOST, port=settings.API_PORT)
+
+if __name__ == "__main__":
+    main()
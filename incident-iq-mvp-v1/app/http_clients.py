@@ -0,0 +1,70 @@
+"""
+Process-wide pooled async HTTP clients (one per endpoint origin).
+
+httpx.AsyncClient connections are bound to the event loop that opened them, so
+clients are kept per running loop: a long-lived loop reuses the same pooled
+client (HTTP/2 + keep-alive) for every aembed / achat / bing_search hop.
+"""
+from __future__ import annotations
+import asyncio, weakref
+from typing import Any, Callable, Dict, Optional
+from urllib.parse import urlsplit
+import httpx
+
+# loop -> {origin: client}; other loop-bound SDK clients (e.g. aio SearchClient) live here too
+_clients: "weakref.WeakKeyDictionary[asyncio.AbstractEventLoop, Dict[str, Any]]" = weakref.WeakKeyDictionary()
+
+def _origin(url: str) -> str:
+    parts = urlsplit(url)
+    return f"{parts.scheme}://{parts.netloc}".lower()
+
+def _limits(settings) -> httpx.Limits:
+    return httpx.Limits(
+        max_connections=settings.HTTP_MAX_CONNECTIONS,
+        max_keepalive_connections=settings.HTTP_MAX_KEEPALIVE,
+        keepalive_expiry=settings.HTTP_KEEPALIVE_EXPIRY,
+    )
+
+def _http2_available() -> bool:
+    try:
+        import h2  # noqa: F401
+    except ImportError:
+        return False
+    return True
+
+def get_client(url: str, settings) -> httpx.AsyncClient:
+    """Return the shared client for the origin of `url` on the running loop."""
+    loop = asyncio.get_running_loop()
+    pool = _clients.setdefault(loop, {})
+    key = _origin(url)
+    client = pool.get(key)
+    if client is None or client.is_closed:
+        client = httpx.AsyncClient(
+            base_url=key,
+            http2=settings.HTTP2 and _http2_available(),
+            limits=_limits(settings),
+            timeout=httpx.Timeout(settings.HTTP_TIMEOUT, connect=10.0),
+        )
+        pool[key] = client
+    return client
+
+def loop_scoped(key: str, factory: Callable[[], Any]) -> Any:
+    """Return a loop-bound resource registered under `key`, creating it on first use."""
+    pool = _clients.setdefault(asyncio.get_running_loop(), {})
+    res = pool.get(key)
+    if res is None:
+        res = pool[key] = factory()
+    return res
+
+async def aclose_clients(loop: Optional[asyncio.AbstractEventLoop] = None) -> None:
+    """Close every pooled client owned by `loop` (defaults to the running loop)."""
+    loop = loop or asyncio.get_running_loop()
+    pool = _clients.pop(loop, {})
+    for client in pool.values():
+        try:
+            if isinstance(client, httpx.AsyncClient):
+                await client.aclose()
+            else:
+                await client.close()
+        except Exception:
+            pass
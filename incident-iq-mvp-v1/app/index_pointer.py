@@ -0,0 +1,92 @@
+"""
+Pointer to the live search index, for blue/green reindexing (scripts/reindex.py).
+
+The pointer is a small JSON file (INDEX_POINTER_PATH):
+
+    {"index": "incident-runbooks-v1536-20261017-101500", "dimensions": 0,
+     "previous": [{"index": "incident-runbooks-v1536-20261010-090000", "dimensions": 0}],
+     "switched_at": "..."}
+
+It is replaced atomically (write + os.replace), and get_settings() re-reads it at most every
+INDEX_POINTER_TTL seconds, so a cutover reaches running app processes without a restart.
+In-flight requests finish on the index they started with. `dimensions` travels with the index,
+so an embedding-size change switches together with the index built for it.
+"""
+from __future__ import annotations
+import datetime, json, os, tempfile, threading, time
+from functools import lru_cache
+from typing import Any, Dict, List, Optional
+
+class IndexPointer:
+    def __init__(self, path: str, ttl: float = 5.0):
+        self.path = path
+        self.ttl = ttl
+        self._lock = threading.Lock()
+        self._checked = 0.0
+        self._stamp: Optional[tuple] = None
+        self._state: Optional[Dict[str, Any]] = None
+
+    def _file_stamp(self) -> Optional[tuple]:
+        try:
+            st = os.stat(self.path)
+        except FileNotFoundError:
+            return None
+        return st.st_mtime_ns, st.st_size
+
+    def read(self) -> Optional[Dict[str, Any]]:
+        """Current pointer state (None when no pointer has been written yet)."""
+        with self._lock:
+            now = time.monotonic()
+            if now - self._checked < self.ttl and self._checked:
+                return self._state
+            self._checked = now
+            stamp = self._file_stamp()
+            if stamp != self._stamp:
+                self._stamp = stamp
+                if stamp is None:
+                    self._state = None
+                else:
+                    with open(self.path, encoding="utf-8") as f:
+                        self._state = json.load(f)
+            return self._state
+
+    def switch(self, index: str, dimensions: int = 0, keep: int = 5) -> Dict[str, Any]:
+        """Point at `index`; the replaced index moves to the front of `previous` (rollback / GC history)."""
+        with self._lock:
+            self._checked = 0.0
+        old = self.read() or {}
+        previous: List[Dict[str, Any]] = []
+        if old.get("index") and old["index"] != index:
+            previous.append({"index": old["index"], "dimensions": old.get("dimensions") or 0})
+        seen = {index, *(p["index"] for p in previous)}
+        previous += [p for p in old.get("previous", []) if p["index"] not in seen]
+        state = {"index": index, "dimensions": dimensions, "previous": previous[:keep],
+                 "switched_at": datetime.datetime.utcnow().isoformat() + "Z"}
+        folder = os.path.dirname(os.path.abspath(self.path))
+        os.makedirs(folder, exist_ok=True)
+        fd, tmp = tempfile.mkstemp(dir=folder, prefix=".pointer-")
+        with os.fdopen(fd, "w", encoding="utf-8") as f:
+            json.dump(state, f, ensure_ascii=False, indent=2)
+        os.replace(tmp, self.path)
+        with self._lock:
+            self._checked = 0.0
+        return state
+
+@lru_cache(maxsize=None)
+def get_index_pointer(path: str, ttl: float = 5.0) -> IndexPointer:
+    return IndexPointer(path, ttl)
+
+def apply_pointer(settings):
+    """`settings` with AZURE_SEARCH_INDEX / embedding size taken from the pointer, if one is configured."""
+    if not settings.INDEX_POINTER_PATH:
+        return settings
+    state = get_index_pointer(settings.INDEX_POINTER_PATH, settings.INDEX_POINTER_TTL).read()
+    if not state:
+        return settings
+    return _pointed(settings, state["index"], int(state.get("dimensions") or 0))
+
+@lru_cache(maxsize=8)
+def _pointed(settings, index: str, dimensions: int):
+    # one derived Settings object per (settings, pointer) so per-settings caches and clients are reused;
+    # dimensions 0 = no `dimensions` parameter, the native EMBEDDING_DIM (left as configured)
+    return settings.model_copy(update={"AZURE_SEARCH_INDEX": index, "EMBEDDING_DIMENSIONS": dimensions})
@@ -0,0 +1,161 @@
+"""
+Streaming ingestion pipeline: lazy documents -> packed embedding requests -> batched uploads.
+
+    documents ──pack_batches──▶ [in_q] ──N embed workers──▶ [out_q] ──M uploaders (buffer)──▶ index
+
+Both queues are bounded, so memory stays flat regardless of corpus size: at most
+`workers * 2` embedding batches and one upload buffer per uploader are held at any time.
+"""
+from __future__ import annotations
+import asyncio, glob, hashlib, json, os
+from typing import Any, Awaitable, Callable, Dict, Iterable, Iterator, List, Optional
+
+from app.rate_limit import estimate_tokens
+
+EmbedFn = Callable[[List[str]], Awaitable[List[List[float]]]]
+UploadFn = Callable[[List[Dict[str, Any]]], Awaitable[None]]
+
+def iter_files(data_dir: str, pattern: str = "*.md") -> Iterator[str]:
+    # glob.iglob walks lazily instead of materialising the whole listing
+    yield from glob.iglob(os.path.join(data_dir, pattern))
+
+def pack_batches(docs: Iterable[Dict[str, Any]], token_budget: int, max_inputs: int,
+                 text_field: str = "content") -> Iterator[List[Dict[str, Any]]]:
+    """Group documents into multi-input embedding requests under a token budget."""
+    batch: List[Dict[str, Any]] = []
+    used = 0
+    for doc in docs:
+        cost = estimate_tokens(doc[text_field])
+        if batch and (used + cost > token_budget or len(batch) >= max_inputs):
+            yield batch
+            batch, used = [], 0
+        batch.append(doc)
+        used += cost
+    if batch:
+        yield batch
+
+async def run_pipeline(docs: Iterable[Dict[str, Any]], embed: EmbedFn, upload: UploadFn, *,
+                       workers: int = 4, token_budget: int = 8000, max_inputs: int = 16,
+                       upload_batch: int = 500, upload_workers: int = 1, text_field: str = "content",
+                       vector_field: str = "contentVector",
+                       on_progress: Optional[Callable[[int], None]] = None) -> int:
+    """Embed and upload `docs`; returns the number of uploaded documents."""
+    upload_workers = max(1, upload_workers)
+    in_q: "asyncio.Queue[Optional[List[Dict[str, Any]]]]" = asyncio.Queue(maxsize=workers * 2)
+    out_q: "asyncio.Queue[Optional[List[Dict[str, Any]]]]" = asyncio.Queue(maxsize=workers * 2)
+    uploaded = 0
+
+    async def produce() -> None:
+        for batch in pack_batches(docs, token_budget, max_inputs, text_field):
+            await in_q.put(batch)
+        for _ in range(workers):
+            await in_q.put(None)
+
+    async def embed_worker() -> None:
+        while (batch := await in_q.get()) is not None:
+            vectors = await embed([d[text_field] for d in batch])
+            for doc, vec in zip(batch, vectors):
+                doc[vector_field] = vec
+            await out_q.put(batch)
+
+    async def uploader() -> None:
+        nonlocal uploaded
+        buffer: List[Dict[str, Any]] = []
+        while (batch := await out_q.get()) is not None:
+            buffer.extend(batch)
+            while len(buffer) >= upload_batch:
+                chunk, buffer = buffer[:upload_batch], buffer[upload_batch:]
+                await upload(chunk)
+                uploaded += len(chunk)
+                if on_progress:
+                    on_progress(uploaded)
+        if buffer:
+            await upload(buffer)
+            uploaded += len(buffer)
+            if on_progress:
+                on_progress(uploaded)
+
+    async def embed_all() -> None:
+        await asyncio.gather(*(embed_worker() for _ in range(workers)))
+        for _ in range(upload_workers):
+            await out_q.put(None)
+
+    # several uploaders (bulk loads into a fresh index) each keep their own buffer
+    stages = [produce(), embed_all()] + [uploader() for _ in range(upload_workers)]
+    tasks = [asyncio.create_task(c) for c in stages]
+    try:
+        # any failing stage aborts the others instead of leaving them blocked on a full queue
+        await asyncio.gather(*tasks)
+    except BaseException:
+        for t in tasks:
+            t.cancel()
+        raise
+    return uploaded
+
+# ---------- Incremental indexing ----------
+def content_hash(data: bytes) -> str:
+    return hashlib.sha256(data).hexdigest()
+
+def parent_id(relpath: str) -> str:
+    # one id per source runbook, shared by all of its chunks and stable across edits
+    return hashlib.sha1(relpath.encode("utf-8")).hexdigest()[:16]
+
+def doc_id(relpath: str, digest: str, part: int = 0) -> str:
+    # stable across runs: same file + same content -> same key, so re-uploads are idempotent upserts
+    # (Azure Search keys allow letters, digits, '_', '-', '=')
+    return f"{parent_id(relpath)}-{digest[:16]}-{part}"
+
+class IngestManifest:
+    """
+    Local record of what has been indexed: {relpath: {"hash": sha256, "ids": [doc ids]}}.
+    Only new or changed files are re-embedded; ids of changed/removed files are reported for deletion.
+    """
+    def __init__(self, path: str):
+        self.path = path
+        self.entries: Dict[str, Dict[str, Any]] = {}
+        self._seen: set = set()
+        self._pending: Dict[str, Dict[str, Any]] = {}
+        self.stale_ids: List[str] = []
+        if os.path.exists(path):
+            with open(path, "r", encoding="utf-8") as f:
+                self.entries = json.load(f)
+
+    def is_current(self, relpath: str, digest: str) -> bool:
+        self._seen.add(relpath)
+        entry = self.entries.get(relpath)
+        return entry is not None and entry.get("hash") == digest
+
+    def record(self, relpath: str, digest: str, ids: List[str]) -> None:
+        old = self.entries.get(relpath)
+        if old:
+            self.stale_ids.extend(i for i in old.get("ids", []) if i not in ids)
+        self._pending[relpath] = {"hash": digest, "ids": ids}
+
+    def removed_ids(self) -> List[str]:
+        """Ids of files that were indexed before but are gone now (call after iterating all files)."""
+        ids = list(self.stale_ids)
+        for relpath, entry in self.entries.items():
+            if relpath not in self._seen:
+                ids.extend(entry.get("ids", []))
+        return ids
+
+    def discard(self, ids: Iterable[str]) -> List[str]:
+        """Forget the files owning any of `ids` (documents that failed to index) so the next run re-ingests them."""
+        ids = set(ids)
+        dropped = [relpath for relpath, entry in {**self.entries, **self._pending}.items()
+                   if ids.intersection(entry.get("ids", []))]
+        for relpath in dropped:
+            self.entries.pop(relpath, None)
+            self._pending.pop(relpath, None)
+        return dropped
+
+    def commit(self) -> None:
+        # called only after uploads and deletes succeeded
+        entries = {k: v for k, v in self.entries.items() if k in self._seen}
+        entries.update(self._pending)
+        os.makedirs(os.path.dirname(os.path.abspath(self.path)), exist_ok=True)
+        tmp = self.path + ".tmp"
+        with open(tmp, "w", encoding="utf-8") as f:
+            json.dump(entries, f, ensure_ascii=False, indent=1)
+        os.replace(tmp, self.path)
+        self.entries, self._pending, self.stale_ids = entries, {}, []
@@ -0,0 +1,404 @@
+"""
+Local in-process retrieval backend, a drop-in for the aio SearchClient used by rag_search
+and scripts/upload_runbooks.py (SEARCH_BACKEND=local).
+
+Layout of LOCAL_INDEX_DIR:
+    meta.json      {"dim", "rows", "quant"}
+    vectors.f32    unit-normalised float32 rows, memory-mapped
+    vectors.i8     int8 rows + scales.f32 per-row scale (LOCAL_INDEX_QUANT=int8)
+    docs.jsonl     one metadata record per row (same fields as the Azure index, no vector)
+    deleted.json   tombstoned ids
+
+Rows are append-only: re-uploading an id supersedes its earlier row, deletes are tombstones.
+Keyword search is BM25 over the searchable fields (Hangul words are indexed as character
+bigrams, a rough stand-in for the ko.lucene analyzer); vector search is NumPy brute force,
+or an hnswlib HNSW graph when it is installed and the filter leaves LOCAL_HNSW_MIN_ROWS rows
+(the filter is applied inside the graph walk, so filtered queries still get k neighbours).
+"""
+from __future__ import annotations
+import json, math, os, re, threading
+from collections import Counter, defaultdict
+from functools import lru_cache
+from typing import Any, Callable, Dict, Iterable, List, NamedTuple, Optional
+
+import numpy as np
+
+try:  # optional: approximate kNN for large corpora
+    import hnswlib
+except ImportError:  # pragma: no cover - optional dependency
+    hnswlib = None
+
+SEARCHABLE_FIELDS = ("title", "content", "service", "impact", "actions")
+VECTOR_FIELD = "contentVector"
+BM25_K1 = 1.2
+BM25_B = 0.75
+
+_TOKEN = re.compile(r"[0-9a-z]+|[가-힣]+")
+
+def tokenize(text: str) -> List[str]:
+    out: List[str] = []
+    for tok in _TOKEN.findall((text or "").lower()):
+        if "가" <= tok[0] <= "힣" and len(tok) > 1:
+            out.extend(tok[i:i + 2] for i in range(len(tok) - 1))
+        else:
+            out.append(tok)
+    return out
+
+# ---------- OData filter subset ----------
+_EQ = re.compile(r"^\s*(\w+)\s+(eq|ne)\s+'((?:[^']|'')*)'\s*$")
+_IN = re.compile(r"^\s*search\.in\(\s*(\w+)\s*,\s*'((?:[^']|'')*)'(?:\s*,\s*'([^']*)')?\s*\)\s*$")
+
+# fields with a value -> rows index built at load, so their filters are NumPy masks (id: latest row per key)
+INDEXED_FIELDS = ("service", "parentId", "severity")
+
+Term = tuple  # (field, "eq" | "ne" | "in", frozenset of values)
+
+@lru_cache(maxsize=256)
+def parse_filter(expr: str) -> tuple:
+    """Disjunction of conjunctions of terms: `field eq|ne 'v'`, `search.in(field, 'a,b'[, ','])` joined by `and` / `or` (no parentheses)."""
+    alternatives = []
+    for alt in re.split(r"\s+or\s+", expr):
+        terms = []
+        for term in re.split(r"\s+and\s+", alt):
+            m = _EQ.match(term)
+            if m:
+                terms.append((m.group(1), m.group(2), frozenset([m.group(3).replace("''", "'")])))
+                continue
+            m = _IN.match(term)
+            if m:
+                field, values, sep = m.group(1), m.group(2).replace("''", "'"), m.group(3) or ","
+                terms.append((field, "in", frozenset(v.strip() for v in values.split(sep))))
+                continue
+            raise ValueError(f"unsupported filter for local search backend: {term!r}")
+        alternatives.append(tuple(terms))
+    return tuple(alternatives)
+
+def compile_filter(expr: Optional[str]) -> Optional[Callable[[Dict[str, Any]], bool]]:
+    """Per-document predicate for a filter (see parse_filter)."""
+    if not expr:
+        return None
+
+    def match(d: Dict[str, Any], term: Term) -> bool:
+        field, op, values = term
+        return (d.get(field) in values) != (op == "ne")
+    alternatives = parse_filter(expr)
+    return lambda d: any(all(match(d, t) for t in terms) for terms in alternatives)
+
+class IndexingResult(NamedTuple):
+    key: str
+    succeeded: bool
+
+class _Results:
+    # async-iterable like AsyncSearchItemPaged
+    def __init__(self, docs: List[Dict[str, Any]]):
+        self._docs = docs
+
+    def __aiter__(self):
+        async def gen():
+            for d in self._docs:
+                yield d
+        return gen()
+
+class LocalSearchIndex:
+    def __init__(self, path: str, quant: str = "float32", hnsw_min_rows: int = 50_000, hnsw_ef: int = 64):
+        self.path = path
+        self.quant = quant
+        self.hnsw_min_rows = hnsw_min_rows
+        self.hnsw_ef = hnsw_ef
+        self._lock = threading.RLock()
+        self._stamp: Optional[tuple] = None
+        self._reset()
+
+    def _reset(self) -> None:
+        self.dim = 0
+        self.rows = 0
+        self._docs: List[Dict[str, Any]] = []
+        self._vecs: Optional[np.ndarray] = None
+        self._scales: Optional[np.ndarray] = None
+        self._live = np.zeros(0, dtype=bool)
+        self._id_row: Dict[str, int] = {}
+        self._field_rows: Dict[str, Dict[str, np.ndarray]] = {}
+        self._postings: Dict[str, List[tuple]] = {}
+        self._doclen = np.zeros(0, dtype=np.float32)
+        self._hnsw = None
+
+    def _file(self, name: str) -> str:
+        return os.path.join(self.path, name)
+
+    # ---------- load ----------
+    def _current_stamp(self) -> Optional[tuple]:
+        try:
+            meta = os.stat(self._file("meta.json")).st_mtime_ns
+        except FileNotFoundError:
+            return None
+        deleted = os.stat(self._file("deleted.json")).st_mtime_ns if os.path.exists(self._file("deleted.json")) else 0
+        return meta, deleted
+
+    def _ensure_loaded(self) -> None:
+        # picks up uploads made by another process (e.g. upload_runbooks.py) without a restart
+        stamp = self._current_stamp()
+        if stamp == self._stamp:
+            return
+        with self._lock:
+            self._reset()
+            self._stamp = stamp
+            if stamp is None:
+                return
+            with open(self._file("meta.json"), "r", encoding="utf-8") as f:
+                meta = json.load(f)
+            self.dim, self.rows, self.quant = meta["dim"], meta["rows"], meta.get("quant", self.quant)
+            if self.rows == 0:
+                return
+            if self.quant == "int8":
+                self._vecs = np.memmap(self._file("vectors.i8"), dtype=np.int8, mode="r", shape=(self.rows, self.dim))
+                self._scales = np.memmap(self._file("scales.f32"), dtype=np.float32, mode="r", shape=(self.rows,))
+            else:
+                self._vecs = np.memmap(self._file("vectors.f32"), dtype=np.float32, mode="r", shape=(self.rows, self.dim))
+            with open(self._file("docs.jsonl"), "r", encoding="utf-8") as f:
+                for _, line in zip(range(self.rows), f):
+                    self._docs.append(json.loads(line))
+            deleted = set()
+            if os.path.exists(self._file("deleted.json")):
+                with open(self._file("deleted.json"), "r", encoding="utf-8") as f:
+                    deleted = set(json.load(f))
+            latest: Dict[str, int] = {}
+            for row, doc in enumerate(self._docs):
+                latest[doc["id"]] = row
+            self._live = np.zeros(self.rows, dtype=bool)
+            for key, row in latest.items():
+                if key not in deleted:
+                    self._live[row] = True
+            self._id_row = latest
+            self._build_field_index()
+            self._build_bm25()
+
+    def _build_field_index(self) -> None:
+        groups: Dict[str, Dict[str, List[int]]] = {f: defaultdict(list) for f in INDEXED_FIELDS}
+        for row, doc in enumerate(self._docs):
+            for field, rows in groups.items():
+                value = doc.get(field)
+                if isinstance(value, str):  # filter literals are strings
+                    rows[value].append(row)
+        self._field_rows = {f: {v: np.asarray(r, dtype=np.int64) for v, r in g.items()} for f, g in groups.items()}
+
+    def _build_bm25(self) -> None:
+        postings: Dict[str, List[tuple]] = defaultdict(list)
+        doclen = np.zeros(self.rows, dtype=np.float32)
+        for row, doc in enumerate(self._docs):
+            if not self._live[row]:
+                continue
+            tokens = tokenize(" ".join(str(doc.get(f) or "") for f in SEARCHABLE_FIELDS))
+            doclen[row] = len(tokens)
+            for term, tf in Counter(tokens).items():
+                postings[term].append((row, tf))
+        self._postings = dict(postings)
+        self._doclen = doclen
+
+    # ---------- filtering ----------
+    def _term_mask(self, field: str, values: frozenset) -> np.ndarray:
+        sel = np.zeros(self.rows, dtype=bool)
+        if field == "id":
+            rows = [self._id_row[v] for v in values if v in self._id_row]
+            sel[np.asarray(rows, dtype=np.int64)] = True
+        else:
+            index = self._field_rows[field]
+            for v in values:
+                rows = index.get(v)
+                if rows is not None:
+                    sel[rows] = True
+        return sel
+
+    def _filter_mask(self, expr: str) -> np.ndarray:
+        alternatives = parse_filter(expr)
+        if any(f != "id" and f not in self._field_rows for terms in alternatives for f, _, _ in terms):
+            # a field without a value index: per-row predicate
+            pred = compile_filter(expr)
+            mask = self._live.copy()
+            for row in np.nonzero(mask)[0]:
+                if not pred(self._docs[row]):
+                    mask[row] = False
+            return mask
+        mask = np.zeros(self.rows, dtype=bool)
+        for terms in alternatives:
+            alt = self._live.copy()
+            for field, op, values in terms:
+                sel = self._term_mask(field, values)
+                alt &= ~sel if op == "ne" else sel
+            mask |= alt
+        return mask
+
+    # ---------- scoring ----------
+    def _bm25(self, text: str, mask: np.ndarray) -> Dict[int, float]:
+        n = int(self._live.sum())
+        live_len = self._doclen[self._live]
+        avgdl = float(live_len.mean()) if n else 1.0
+        scores: Dict[int, float] = defaultdict(float)
+        for term in set(tokenize(text)):
+            plist = self._postings.get(term)
+            if not plist:
+                continue
+            idf = math.log(1 + (n - len(plist) + 0.5) / (len(plist) + 0.5))
+            for row, tf in plist:
+                if mask[row]:
+                    norm = BM25_K1 * (1 - BM25_B + BM25_B * self._doclen[row] / avgdl)
+                    scores[row] += idf * tf * (BM25_K1 + 1) / (tf + norm)
+        return scores
+
+    def _dense(self, rows: np.ndarray) -> np.ndarray:
+        if self.quant == "int8":
+            return self._vecs[rows].astype(np.float32) * self._scales[rows, None]
+        return np.asarray(self._vecs[rows], dtype=np.float32)
+
+    def _knn(self, vector: List[float], k: int, mask: np.ndarray, exhaustive: bool = False) -> Dict[int, float]:
+        q = np.asarray(vector, dtype=np.float32)
+        q /= (np.linalg.norm(q) or 1.0)
+        selected = int(mask.sum())
+        if not exhaustive and hnswlib is not None and selected >= self.hnsw_min_rows:
+            index = self._hnsw_index()
+            # filtered during the search, not afterwards: a small service would otherwise get few or no
+            # rows from the global neighbours
+            labels, dists = index.knn_query(q, k=min(selected, k), filter=lambda label: bool(mask[label]))
+            sims = {int(r): 1.0 - float(d) for r, d in zip(labels[0], dists[0])}
+        else:
+            # also used when the filter leaves few rows: exact search over them is cheap
+            rows = np.nonzero(mask)[0]
+            if rows.size == 0:
+                return {}
+            sim = self._dense(rows) @ q
+            top = np.argsort(-sim)[:k]
+            sims = {int(rows[i]): float(sim[i]) for i in top}
+        # same shape as Azure's cosine score: 1 / (1 + cosine distance)
+        best = sorted(sims.items(), key=lambda kv: kv[1], reverse=True)[:k]
+        return {row: 1.0 / (1.0 + (1.0 - s)) for row, s in best}
+
+    def _hnsw_index(self):
+        with self._lock:
+            if self._hnsw is None:
+                index = hnswlib.Index(space="ip", dim=self.dim)
+                index.init_index(max_elements=self.rows, ef_construction=200, M=16)
+                rows = np.nonzero(self._live)[0]
+                for start in range(0, rows.size, 10_000):
+                    batch = rows[start:start + 10_000]
+                    index.add_items(self._dense(batch), batch)
+                index.set_ef(max(self.hnsw_ef, 16))
+                self._hnsw = index
+            return self._hnsw
+
+    # ---------- SearchClient-compatible read API ----------
+    async def search(self, search_text: Optional[str] = None, *, top: Optional[int] = None,
+                     vector_queries: Optional[list] = None, filter: Optional[str] = None,
+                     select: Optional[List[str]] = None, **_: Any) -> _Results:
+        self._ensure_loaded()
+        top = top or 50
+        if self.rows == 0:
+            return _Results([])
+        mask = self._filter_mask(filter) if filter else self._live.copy()
+        if vector_queries:
+            # Azure semantics: a vector query returns k neighbours; combined with text it is RRF-fused
+            vq = vector_queries[0]
+            scores = self._knn(vq.vector, vq.k_nearest_neighbors or top, mask, bool(getattr(vq, "exhaustive", False)))
+            if search_text and search_text != "*":
+                bm = self._bm25(search_text, mask)
+                ranked_bm = sorted(bm, key=bm.get, reverse=True)
+                ranked_vec = sorted(scores, key=scores.get, reverse=True)
+                fused: Dict[int, float] = defaultdict(float)
+                for ranked in (ranked_bm, ranked_vec):
+                    for rank, row in enumerate(ranked):
+                        fused[row] += 1.0 / (60 + rank + 1)
+                scores = dict(fused)
+        elif search_text and search_text != "*":
+            scores = self._bm25(search_text, mask)
+        else:
+            scores = {int(r): 1.0 for r in np.nonzero(mask)[0]}
+        ranked = sorted(scores.items(), key=lambda kv: kv[1], reverse=True)[:top]
+        out = []
+        for row, score in ranked:
+            doc = self._docs[row]
+            doc = {k: doc.get(k) for k in select} if select else dict(doc)
+            doc["@search.score"] = float(score)
+            out.append(doc)
+        return _Results(out)
+
+    async def get_document(self, key: str, selected_fields: Optional[List[str]] = None) -> Dict[str, Any]:
+        self._ensure_loaded()
+        for row in range(self.rows - 1, -1, -1):
+            if self._live[row] and self._docs[row]["id"] == key:
+                doc = self._docs[row]
+                return {k: doc.get(k) for k in selected_fields} if selected_fields else dict(doc)
+        raise KeyError(key)
+
+    async def get_document_count(self) -> int:
+        self._ensure_loaded()
+        return int(self._live.sum())
+
+    # ---------- SearchClient-compatible write API ----------
+    async def upload_documents(self, documents: Iterable[Dict[str, Any]]) -> List[IndexingResult]:
+        docs = list(documents)
+        if not docs:
+            return []
+        with self._lock:
+            os.makedirs(self.path, exist_ok=True)
+            meta = {"dim": 0, "rows": 0, "quant": self.quant}
+            if os.path.exists(self._file("meta.json")):
+                with open(self._file("meta.json"), "r", encoding="utf-8") as f:
+                    meta = json.load(f)
+            mat = np.asarray([d[VECTOR_FIELD] for d in docs], dtype=np.float32)
+            if meta["dim"] and mat.shape[1] != meta["dim"]:
+                raise ValueError(f"vector dimension mismatch: index={meta['dim']} documents={mat.shape[1]}")
+            mat /= np.maximum(np.linalg.norm(mat, axis=1, keepdims=True), 1e-12)
+            if meta.get("quant", self.quant) == "int8":
+                scales = np.maximum(np.abs(mat).max(axis=1), 1e-12) / 127.0
+                with open(self._file("vectors.i8"), "ab") as f:
+                    f.write(np.round(mat / scales[:, None]).astype(np.int8).tobytes())
+                with open(self._file("scales.f32"), "ab") as f:
+                    f.write(scales.astype(np.float32).tobytes())
+            else:
+                with open(self._file("vectors.f32"), "ab") as f:
+                    f.write(mat.tobytes())
+            with open(self._file("docs.jsonl"), "a", encoding="utf-8") as f:
+                for d in docs:
+                    f.write(json.dumps({k: v for k, v in d.items() if k != VECTOR_FIELD}, ensure_ascii=False) + "\n")
+            self._untombstone(d["id"] for d in docs)
+            meta.update(dim=int(mat.shape[1]), rows=meta["rows"] + len(docs))
+            self._write_json("meta.json", meta)  # readers only see rows once meta is replaced
+        return [IndexingResult(d["id"], True) for d in docs]
+
+    async def delete_documents(self, documents: Iterable[Dict[str, Any]]) -> List[IndexingResult]:
+        keys = [d["id"] for d in documents]
+        with self._lock:
+            deleted = self._read_deleted()
+            deleted.update(keys)
+            self._write_json("deleted.json", sorted(deleted))
+        return [IndexingResult(k, True) for k in keys]
+
+    def _read_deleted(self) -> set:
+        if not os.path.exists(self._file("deleted.json")):
+            return set()
+        with open(self._file("deleted.json"), "r", encoding="utf-8") as f:
+            return set(json.load(f))
+
+    def _untombstone(self, keys: Iterable[str]) -> None:
+        deleted = self._read_deleted()
+        if deleted:
+            remaining = deleted.difference(keys)
+            if remaining != deleted:
+                self._write_json("deleted.json", sorted(remaining))
+
+    def _write_json(self, name: str, obj: Any) -> None:
+        tmp = self._file(name + ".tmp")
+        with open(tmp, "w", encoding="utf-8") as f:
+            json.dump(obj, f, ensure_ascii=False)
+        os.replace(tmp, self._file(name))
+
+    async def close(self) -> None:
+        pass
+
+    async def __aenter__(self) -> "LocalSearchIndex":
+        return self
+
+    async def __aexit__(self, *exc: Any) -> None:
+        await self.close()
+
+@lru_cache(maxsize=None)
+def get_local_index(path: str, quant: str = "float32", hnsw_min_rows: int = 50_000, hnsw_ef: int = 64) -> LocalSearchIndex:
+    return LocalSearchIndex(path, quant=quant, hnsw_min_rows=hnsw_min_rows, hnsw_ef=hnsw_ef)
@@ -19,3 +19,8 @@ USER_TEMPLATE = """
 [추가정보]
 {extra}
 """
+
+CONTEXT_TEMPLATE = """
+[검색컨텍스트]
+{context}
+"""
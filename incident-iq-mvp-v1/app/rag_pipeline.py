@@ -1,13 +1,25 @@
 from __future__ import annotations
-import os, json, time, math, datetime
-from typing import List, Dict, Any, Optional, Tuple
-from tenacity import retry, stop_after_attempt, wait_exponential
-from azure.search.documents.models import QueryType, QueryCaptionType, QueryAnswerType, VectorizedQuery
-from azure.search.documents import SearchClient
-import httpx
-from app.azure_clients import load_settings, search_client
+import os, json, time, datetime, asyncio
+from dataclasses import dataclass
+from typing import TYPE_CHECKING, List, Dict, Any, Optional, Tuple, AsyncIterator
+from app.azure_clients import get_settings, async_search_client, embedding_request
+from app.embedding_cache import get_embedding_cache, cache_key, embedding_text
+from app.answer_cache import get_answer_cache
+from app.web_cache import get_web_cache
+from app.rate_limit import estimate_tokens, estimate_message_tokens
+from app import telemetry
 from app.notice_templates import incident_suspected, incident_resolved, outage_declared, outage_cleared
-from app.prompts import SYSTEM_PROMPT, USER_TEMPLATE
+from app.prompts import SYSTEM_PROMPT, USER_TEMPLATE, CONTEXT_TEMPLATE
+from app.context_builder import build_context, count_message_tokens
+
+if TYPE_CHECKING:
+    import httpx
+    from azure.search.documents.aio import SearchClient
+    from azure.search.documents.models import VectorizedQuery
+    from app.aoai_router import Backend
+
+# httpx, the Azure Search SDK and the AOAI router are imported on first use, keeping this module
+# cheap to import (Streamlit reruns, container start); app/bootstrap.py pre-warms them
 
 
 # Custom exception to signal AOAI content filter / Responsible AI policy blocks
@@ -19,161 +31,560 @@ class AOAIContentFilterError(RuntimeError):
 
 # ---------- Embeddings via Azure OpenAI ----------
 async def aembed(texts: List[str], settings) -> List[List[float]]:
-    base = settings.AZURE_OPENAI_ENDPOINT.rstrip('/')
-    url = f"{base}/openai/deployments/{settings.AZURE_OPENAI_DEPLOYMENT}/embeddings?api-version=2023-05-15"
-    headers = {"api-key": settings.AZURE_OPENAI_API_KEY, "Content-Type": "application/json"}
-    async with httpx.AsyncClient(timeout=60.0) as client:
-        resp = await client.post(url, headers=headers, json={"input": texts})
+    # cached texts skip the round-trip; only the distinct misses go out, in one request
+    cache = get_embedding_cache(settings)
+    texts = [embedding_text(t) for t in texts]
+    keys = [cache_key(settings.AZURE_OPENAI_DEPLOYMENT, settings.vector_dim, t) for t in texts]
+    vectors = await cache.aget_many(keys)
+    missing: Dict[str, List[int]] = {}  # key -> positions (an alert storm repeats the same text)
+    for i, v in enumerate(vectors):
+        if v is None:
+            missing.setdefault(keys[i], []).append(i)
+    telemetry.record_cache("embedding", True, len(texts) - len(missing))
+    telemetry.record_cache("embedding", False, len(missing))
+    if missing:
+        fresh = await _aembed_remote([texts[positions[0]] for positions in missing.values()], settings)
+        for (key, positions), vec in zip(missing.items(), fresh):
+            cache.put(key, vec)
+            for i in positions:
+                vectors[i] = vec
+    return vectors
+
+async def _aembed_remote(texts: List[str], settings) -> List[List[float]]:
+    import httpx
+    from app.aoai_router import get_router
+    from app.http_clients import get_client
+    api_version, body = embedding_request(texts, settings.EMBEDDING_DIMENSIONS)
+    tokens = sum(estimate_tokens(t) for t in texts)
+
+    async def send(b: Backend) -> httpx.Response:
+        url = b.embed_url(api_version)
+        return await get_client(url, settings).post(url, headers=b.headers, json=body, timeout=60.0)
+
+    resp, _ = await get_router(settings).send("embed", send, tokens)
+    try:
+        resp.raise_for_status()
+    except httpx.HTTPStatusError as e:
+        # surface response body for debugging
+        body = None
         try:
-            resp.raise_for_status()
-        except httpx.HTTPStatusError as e:
-            # surface response body for debugging
-            body = None
-            try:
-                body = resp.json()
-            except Exception:
-                body = resp.text
-            raise RuntimeError(f"Embedding request failed: {resp.status_code} {body}") from e
-        data = resp.json()
-        return [d["embedding"] for d in data["data"]]
+            body = resp.json()
+        except Exception:
+            body = resp.text
+        raise RuntimeError(f"Embedding request failed: {resp.status_code} {body}") from e
+    data = resp.json()
+    telemetry.record_tokens(data.get("usage"), "embedding")
+    return [d["embedding"] for d in data["data"]]
+
+def _raise_chat_error(resp: httpx.Response, exc: Exception) -> None:
+    # include response body to diagnose 400 errors
+    body = None
+    try:
+        body = resp.json()
+    except Exception:
+        body = {'text': resp.text}
+    # detect AOAI content-filter / ResponsibleAIPolicyViolation errors and raise a structured exception
+    err = body.get('error') if isinstance(body, dict) else None
+    if err and (err.get('code') == 'content_filter' or (err.get('innererror') and err['innererror'].get('code') == 'ResponsibleAIPolicyViolation')):
+        raise AOAIContentFilterError(body) from exc
+    raise RuntimeError(f"Chat completions request failed: {resp.status_code} {body}") from exc
+
+def _choice_filtered(choice: dict) -> bool:
+    if choice.get("finish_reason") == "content_filter":
+        return True
+    results = choice.get("content_filter_results") or {}
+    return any(isinstance(v, dict) and v.get("filtered") for v in results.values())
 
 async def achat(messages: List[Dict[str, str]], settings) -> str:
-    base = settings.AZURE_OPENAI_ENDPOINT.rstrip('/')
-    url = f"{base}/openai/deployments/{settings.AZURE_OPENAI_CHAT_DEPLOYMENT}/chat/completions?api-version=2025-01-01-preview"
-    headers = {"api-key": settings.AZURE_OPENAI_API_KEY, "Content-Type": "application/json"}
-    async with httpx.AsyncClient(timeout=120.0) as client:
-        resp = await client.post(url, headers=headers, json={"messages": messages, "temperature": 0.2})
+    import httpx
+    from app.aoai_router import get_router
+    from app.http_clients import get_client
+    tokens = estimate_message_tokens(messages) + settings.AOAI_COMPLETION_TOKENS
+
+    async def send(b: Backend) -> httpx.Response:
+        url = b.chat_url()
+        return await get_client(url, settings).post(url, headers=b.headers, json={"messages": messages, "temperature": 0.2}, timeout=120.0)
+
+    # routed over the AOAI backend pool (fail over, optional hedging, see app/aoai_router.py)
+    resp, _ = await get_router(settings).send("chat", send, tokens)
+    try:
+        resp.raise_for_status()
+    except httpx.HTTPStatusError as e:
+        _raise_chat_error(resp, e)
+    data = resp.json()
+    telemetry.record_tokens(data.get("usage"), "chat")
+    return data["choices"][0]["message"]["content"]
+
+async def achat_stream(messages: List[Dict[str, str]], settings) -> AsyncIterator[str]:
+    """Yield completion tokens as they arrive (stream=True, server-sent events)."""
+    import httpx
+    from app.aoai_router import get_router
+    from app.http_clients import get_client
+    # include_usage adds a final chunk with token usage (empty choices)
+    payload = {"messages": messages, "temperature": 0.2, "stream": True, "stream_options": {"include_usage": True}}
+    tokens = estimate_message_tokens(messages) + settings.AOAI_COMPLETION_TOKENS
+
+    async def send(b: Backend) -> httpx.Response:
+        url = b.chat_url()
+        client = get_client(url, settings)
+        req = client.build_request("POST", url, headers=b.headers, json=payload, timeout=120.0)
+        return await client.send(req, stream=True)
+
+    # only opening the stream is routed / retried / hedged; once tokens flow, failures surface to the caller
+    resp, _ = await get_router(settings).send("chat_stream", send, tokens)
+    try:
         try:
             resp.raise_for_status()
         except httpx.HTTPStatusError as e:
-            # include response body to diagnose 400 errors
-            body = None
-            try:
-                body = resp.json()
-            except Exception:
-                body = {'text': resp.text}
-            # detect AOAI content-filter / ResponsibleAIPolicyViolation errors and raise a structured exception
-            err = body.get('error') if isinstance(body, dict) else None
-            if err and (err.get('code') == 'content_filter' or (err.get('innererror') and err['innererror'].get('code') == 'ResponsibleAIPolicyViolation')):
-                raise AOAIContentFilterError(body) from e
-            raise RuntimeError(f"Chat completions request failed: {resp.status_code} {body}") from e
-        data = resp.json()
-        return data["choices"][0]["message"]["content"]
+            await resp.aread()
+            _raise_chat_error(resp, e)
+        async for line in resp.aiter_lines():
+            if not line.startswith("data:"):
+                continue
+            data = line[len("data:"):].strip()
+            if data == "[DONE]":
+                break
+            chunk = json.loads(data)
+            if chunk.get("usage"):
+                telemetry.record_tokens(chunk["usage"], "chat")
+            if "error" in chunk:
+                # errors can also be reported in-band after the stream started
+                err = chunk["error"] or {}
+                if err.get("code") == "content_filter":
+                    raise AOAIContentFilterError(chunk)
+                raise RuntimeError(f"Chat completions stream failed: {chunk}")
+            for choice in chunk.get("choices", []):
+                # the output filter can cut a stream mid-answer
+                if _choice_filtered(choice):
+                    raise AOAIContentFilterError(chunk)
+                delta = (choice.get("delta") or {}).get("content")
+                if delta:
+                    yield delta
+    finally:
+        await resp.aclose()
 
 # ---------- Bing Web Search (optional) ----------
 async def bing_search(query: str, settings) -> List[Dict[str, str]]:
+    from app.http_clients import get_client
     if not (settings.BING_SEARCH_ENDPOINT and settings.BING_SEARCH_API_KEY):
         return []
     headers = {"Ocp-Apim-Subscription-Key": settings.BING_SEARCH_API_KEY}
-    async with httpx.AsyncClient(timeout=30.0) as client:
-        r = await client.get(settings.BING_SEARCH_ENDPOINT, params={"q": query, "mkt": "ko-KR", "count": 5}, headers=headers)
-        r.raise_for_status()
-        j = r.json()
-        results = []
-        for v in j.get("webPages", {}).get("value", []):
-            results.append({"name": v.get("name"), "url": v.get("url"), "snippet": v.get("snippet", "")})
-        return results
+    client = get_client(settings.BING_SEARCH_ENDPOINT, settings)
+    r = await client.get(settings.BING_SEARCH_ENDPOINT, params={"q": query, "mkt": "ko-KR", "count": 5}, headers=headers, timeout=30.0)
+    r.raise_for_status()
+    j = r.json()
+    results = []
+    for v in j.get("webPages", {}).get("value", []):
+        results.append({"name": v.get("name"), "url": v.get("url"), "snippet": v.get("snippet", "")})
+    return results
+
+async def web_search(service: str, symptom: str, settings) -> List[Dict[str, str]]:
+    # backup search through the (service, symptom) LRU
+    cache = get_web_cache(settings)
+    refs = cache.get(service, symptom)
+    telemetry.record_cache("web", refs is not None)
+    if refs is None:
+        refs = await bing_search(f"{service} {symptom} 대응 방안", settings)
+        cache.put(service, symptom, refs)
+    return refs
+
+def _needs_web(hits: List[dict], settings) -> bool:
+    return not hits or (hits[0].get("score") or 0.0) < settings.WEB_MIN_SCORE
 
 # ---------- RAG Search ----------
+RRF_K = 60  # reciprocal-rank-fusion constant (same default Azure AI Search uses for hybrid)
+# projected fields: contentVector never comes back; the rank phase of two-phase retrieval
+# needs only enough to order and dedup, content is fetched for the final k
+HIT_FIELDS = ["id", "service", "severity", "title", "impact", "actions", "content", "parentId", "section"]
+RANK_FIELDS = ["id", "parentId", "title", "section"]
+
+def _to_hit(doc: dict, score: Optional[float] = None) -> dict:
+    return {
+        "id": doc.get("id"),
+        "service": doc.get("service"),
+        "severity": doc.get("severity"),
+        "title": doc.get("title"),
+        "impact": doc.get("impact"),
+        "actions": doc.get("actions"),
+        "content": doc.get("content"),
+        "parentId": doc.get("parentId"),
+        "section": doc.get("section"),
+        "score": doc["@search.score"] if score is None else score,
+    }
+
+async def _search_leg(sc: SearchClient, **kwargs) -> List[dict]:
+    results = await sc.search(**kwargs)
+    return [doc async for doc in results]
+
+def _select(settings) -> List[str]:
+    return RANK_FIELDS if settings.SEARCH_TWO_PHASE else HIT_FIELDS
+
+def _fuse(legs: List[List[dict]], top: int) -> List[dict]:
+    # client-side RRF over the keyword and vector legs
+    scores: Dict[str, float] = {}
+    docs: Dict[str, dict] = {}
+    for leg in legs:
+        for rank, doc in enumerate(leg):
+            key = doc.get("id")
+            docs.setdefault(key, doc)
+            scores[key] = scores.get(key, 0.0) + 1.0 / (RRF_K + rank + 1)
+    ranked = sorted(scores, key=scores.get, reverse=True)[:top]
+    return [_to_hit(docs[k], scores[k]) for k in ranked]
+
+def query_text(symptom: str, service: str, extra: str) -> str:
+    return f"{symptom}\n{service}\n{extra}"
+
 async def rag_search(symptom: str, service: str, extra: str, settings) -> Tuple[List[dict], str]:
-    sc: SearchClient = search_client(settings)
-    # combine keyword + vector query
-    try:
-        # vectorize query
-        qvec = await aembed([f"{symptom}\n{service}\n{extra}"], settings)
-        vector_query = VectorizedQuery(vector=qvec[0], k_nearest_neighbors=8, fields="contentVector")
-        # When using vector queries, do not request semantic captions/answers (these cannot be combined)
-        use_vector = True
-        if use_vector:
-            results = sc.search(
-                search_text=symptom,
-                top=8,
-                vector_queries=[vector_query],
-                query_type=QueryType.SIMPLE,
-                filter=None,
-            )
-        else:
-            # semantic-only search (no vector) — use semantic parameters
-            results = sc.search(
-                search_text=symptom,
-                top=8,
-                query_type=QueryType.SEMANTIC,
-                semantic_configuration_name="default-semantic-config",
-                query_caption=QueryCaptionType.EXTRACTIVE,
-                query_answer=QueryAnswerType.EXTRACTIVE,
-                filter=None,
-            )
-    except Exception:
-        # fallback without vector
-        results = sc.search(search_text=symptom, top=8, query_type=QueryType.SIMPLE)
-
-    hits = []
-    for doc in results:
-        hits.append({
-            "id": doc.get("id"),
-            "service": doc.get("service"),
-            "severity": doc.get("severity"),
-            "title": doc.get("title"),
-            "impact": doc.get("impact"),
-            "actions": doc.get("actions"),
-            "content": doc.get("content"),
-            "score": doc["@search.score"]
-        })
-    reason = "azure_ai_search" if hits else "no_rag_hits"
+    hits, reason, _ = await _rag_search(symptom, service, extra, settings)
     return hits, reason
 
-# ---------- Orchestrator ----------
-async def generate_incident_response(symptom: str, service: str, extra: str) -> Dict[str, Any]:
-    settings = load_settings()
-    hits, reason = await rag_search(symptom, service, extra, settings)
+def _hits_reason(hits: List[dict], settings) -> str:
+    if not hits:
+        return "no_rag_hits"
+    return "local_search" if settings.SEARCH_BACKEND == "local" else "azure_ai_search"
+
+def service_filter(service: str, settings) -> Optional[str]:
+    # push the service down to the index as an OData filter on the filterable `service` field
+    service = (service or "").strip()
+    if not (settings.SEARCH_SERVICE_FILTER and service):
+        return None
+    return "service eq '{}'".format(service.replace("'", "''"))
+
+def _vector_query(qvec: List[float], settings) -> VectorizedQuery:
+    from azure.search.documents.models import VectorizedQuery
+    return VectorizedQuery(vector=qvec, k_nearest_neighbors=settings.SEARCH_KNN, fields="contentVector",
+                           exhaustive=settings.SEARCH_EXHAUSTIVE or None)
+
+async def _query_vector(symptom: str, service: str, extra: str, settings) -> List[float]:
+    with telemetry.span("embed"):
+        return (await aembed([query_text(symptom, service, extra)], settings))[0]
+
+async def _hybrid_search(sc: SearchClient, symptom: str, service: str, extra: str, settings,
+                         qvec: Optional[List[float]], flt: Optional[str]) -> Tuple[List[dict], Optional[List[float]]]:
+    from azure.search.documents.models import QueryType
+    # BM25 leg starts right away; the vector leg follows as soon as the query embedding arrives
+    top, select = settings.SEARCH_TOP, _select(settings)
+    kw_task = asyncio.create_task(_search_leg(sc, search_text=symptom, top=top, query_type=QueryType.SIMPLE, filter=flt, select=select))
+    try:
+        try:
+            if qvec is None:
+                qvec = await _query_vector(symptom, service, extra, settings)
+            vec_docs = await _search_leg(sc, search_text=None, top=top, vector_queries=[_vector_query(qvec, settings)], filter=flt, select=select)
+        except Exception:
+            # fallback without vector: keyword leg only
+            vec_docs = []
+        try:
+            kw_docs = await kw_task
+        except Exception:
+            if not vec_docs:
+                raise
+            kw_docs = []
+    finally:
+        if not kw_task.done():
+            kw_task.cancel()
 
-    web_refs = []
-    context_chunks = []
+    if vec_docs:
+        return _fuse([kw_docs, vec_docs], top), qvec
+    return [_to_hit(d) for d in kw_docs], qvec
+
+async def _search_mode(sc: SearchClient, symptom: str, service: str, extra: str, settings,
+                       qvec: Optional[List[float]], flt: Optional[str]) -> Tuple[List[dict], Optional[List[float]]]:
+    from azure.search.documents.models import QueryType, QueryCaptionType, QueryAnswerType
+    mode, select = settings.SEARCH_MODE, _select(settings)
+    if mode == "keyword":
+        docs = await _search_leg(sc, search_text=symptom, top=settings.SEARCH_TOP, query_type=QueryType.SIMPLE, filter=flt, select=select)
+        return [_to_hit(d) for d in docs], qvec
+    if mode == "semantic":
+        # semantic ranker over the keyword results (needs the index's semantic configuration)
+        docs = await _search_leg(
+            sc,
+            search_text=symptom,
+            top=settings.SEARCH_TOP,
+            query_type=QueryType.SEMANTIC,
+            semantic_configuration_name=settings.SEARCH_SEMANTIC_CONFIG,
+            query_caption=QueryCaptionType.EXTRACTIVE,
+            query_answer=QueryAnswerType.EXTRACTIVE,
+            filter=flt,
+            select=select,
+        )
+        return [_to_hit(d, d.get("@search.reranker_score") or d["@search.score"]) for d in docs], qvec
+    if mode == "vector":
+        if qvec is None:
+            qvec = await _query_vector(symptom, service, extra, settings)
+        docs = await _search_leg(sc, search_text=None, top=settings.SEARCH_TOP, vector_queries=[_vector_query(qvec, settings)], filter=flt, select=select)
+        return [_to_hit(d) for d in docs], qvec
+    return await _hybrid_search(sc, symptom, service, extra, settings, qvec, flt)
+
+def _dedup_parents(hits: List[dict], per_parent: int, k: int) -> List[dict]:
+    # chunks of one runbook compete for the same slots; keep the best `per_parent` of each
+    kept: List[dict] = []
+    seen: Dict[str, int] = {}
+    for h in hits:
+        parent = h.get("parentId") or h.get("id")
+        if seen.get(parent, 0) >= per_parent:
+            continue
+        seen[parent] = seen.get(parent, 0) + 1
+        kept.append(h)
+        if len(kept) >= k:
+            break
+    return kept
+
+async def _hydrate(sc: SearchClient, hits: List[dict]) -> List[dict]:
+    # phase 2: one filtered lookup for the final ids; order and scores stay from phase 1
     if not hits:
-        # internet backup search
-        web_refs = await bing_search(f"{service} {symptom} 대응 방안", settings)
+        return hits
+    ids = ",".join(h["id"] for h in hits)
+    docs = await _search_leg(sc, search_text="*", top=len(hits), filter=f"search.in(id, '{ids}', ',')", select=HIT_FIELDS)
+    by_id = {d["id"]: d for d in docs}
+    return [_to_hit(by_id[h["id"]], h["score"]) for h in hits if h["id"] in by_id]
+
+async def _rag_search(symptom: str, service: str, extra: str, settings,
+                      qvec: Optional[List[float]] = None) -> Tuple[List[dict], str, Optional[List[float]]]:
+    # same as rag_search, but also hands back the query embedding (None when it was not computed);
+    # a precomputed `qvec` (batched embeddings) skips the aembed call
+    sc = async_search_client(settings)
+    flt = service_filter(service, settings)
+    hits, qvec = await _search_mode(sc, symptom, service, extra, settings, qvec, flt)
+    if not hits and flt:
+        # the typed service name may not match any runbook header exactly; widen to the whole index
+        hits, qvec = await _search_mode(sc, symptom, service, extra, settings, qvec, None)
+    if settings.SEARCH_TWO_PHASE and hits:
+        with telemetry.span("hydrate"):
+            hits = await _hydrate(sc, _dedup_parents(hits, settings.SEARCH_PER_PARENT, settings.SEARCH_FINAL_K))
+    return hits, _hits_reason(hits, settings), qvec
+
+# ---------- Orchestrator ----------
+BLOCKED_ANSWER = (
+    "생성 실패: 요청이 콘텐츠 정책에 의해 차단되었습니다. 민감하거나 성적인 표현이 포함되어 있지 않은지 확인하고, "
+    "문장을 간단하게 줄여 다시 시도해 주세요."
+)
 
-    # Compose prompt
-    context_text = ""
-    for h in hits[:5]:
-        context_text += f"\n### {h['title']} (sev:{h.get('severity','N/A')})\n{h['content']}\n대응:{h.get('actions','')}\n"    
-    if web_refs:
-        context_text += "\n[인터넷 참고자료]\n" + "\n".join([f"- {w['name']} ({w['url']})" for w in web_refs])
+@dataclass
+class Retrieval:
+    hits: List[dict]
+    reason: str
+    web_refs: List[Dict[str, str]]
+    messages: List[Dict[str, str]]
+    qvec: Optional[List[float]] = None
+    cached_answer: Optional[str] = None
+    context: Optional[Dict[str, int]] = None  # token accounting of the packed context
 
+async def _retrieve(symptom: str, service: str, extra: str, settings, qvec: Optional[List[float]] = None) -> Retrieval:
+    web_task = None
+    if settings.WEB_SEARCH_MODE == "hedged" and settings.BING_SEARCH_ENDPOINT and settings.BING_SEARCH_API_KEY:
+        # hedge: the backup search runs alongside retrieval, so a miss costs no extra wall time
+        web_task = asyncio.create_task(web_search(service, symptom, settings))
+        web_task.add_done_callback(lambda t: t.cancelled() or t.exception())  # unused failures stay quiet
+    try:
+        with telemetry.span("search"):
+            hits, reason, qvec = await _rag_search(symptom, service, extra, settings, qvec)
+
+        cached = None
+        if qvec is not None:
+            cached = get_answer_cache(settings).lookup(qvec, service, [h["id"] for h in hits])
+            telemetry.record_cache("answer", cached is not None)
+        if cached is not None:
+            # near-duplicate of a recent incident with the same service and runbooks: skip Bing and chat
+            return Retrieval(hits, "semantic_answer_cache", cached.web_refs, [], qvec, cached.answer)
+
+        web_refs = []
+        if _needs_web(hits, settings):
+            # internet backup search: no hits, or the best one is below WEB_MIN_SCORE
+            with telemetry.span("bing"):
+                web_refs = await (web_task or web_search(service, symptom, settings))
+    finally:
+        # good hits arrived first: drop the hedged lookup
+        if web_task is not None and not web_task.done():
+            web_task.cancel()
+
+    messages, context = compose_messages(symptom, service, extra, hits, web_refs, settings)
+    return Retrieval(hits, reason, web_refs, messages, qvec, context=context)
+
+def build_messages(context_text: str, user_text: str, layout: str = "prefix") -> List[Dict[str, str]]:
+    if layout == "inline":
+        # legacy layout: retrieved context inside the system message
+        return [
+            {"role": "system", "content": SYSTEM_PROMPT + "\n\n[검색컨텍스트]\n" + context_text},
+            {"role": "user", "content": user_text},
+        ]
+    # static system prompt first, byte-identical on every request, so the service's prompt cache
+    # can reuse it; everything that varies per incident follows in the user turn
+    return [
+        {"role": "system", "content": SYSTEM_PROMPT},
+        {"role": "user", "content": CONTEXT_TEMPLATE.format(context=context_text) + user_text},
+    ]
+
+def compose_messages(symptom: str, service: str, extra: str, hits: List[dict], web_refs: List[Dict[str, str]],
+                     settings) -> Tuple[List[Dict[str, str]], Dict[str, int]]:
+    # relevance-ordered hits packed under the token budget (see app/context_builder.py)
+    packed = build_context(
+        hits, web_refs, query_text(symptom, service, extra),
+        budget=settings.CONTEXT_TOKEN_BUDGET,
+        max_hits=settings.CONTEXT_MAX_HITS,
+        dedup_threshold=settings.CONTEXT_DEDUP_THRESHOLD,
+        model=settings.CHAT_TOKENIZER_MODEL,
+    )
     user_text = USER_TEMPLATE.format(symptom=symptom, service=service, extra=extra)
-    messages = [
-        {"role": "system", "content": SYSTEM_PROMPT + "\n\n[검색컨텍스트]\n" + context_text},
-        {"role": "user", "content": user_text},
+    messages = build_messages(packed.text, user_text, settings.PROMPT_LAYOUT)
+    context = packed.stats()
+    context["prompt_tokens"] = count_message_tokens(messages, settings.CHAT_TOKENIZER_MODEL)
+    return messages, context
+
+def _remember_answer(r: Retrieval, service: str, answer: str, reason: str, settings) -> None:
+    # only clean answers are reused; content-filter fallbacks are not
+    if r.qvec is not None and reason in ("azure_ai_search", "local_search", "no_rag_hits"):
+        get_answer_cache(settings).store(r.qvec, service, [h["id"] for h in r.hits], answer, r.web_refs)
+
+def _sanitized_messages(symptom: str, service: str) -> List[Dict[str, str]]:
+    sanitized_user = f"요약/간단 조치 안내를 작성해 주세요. 문제: {symptom} 서비스: {service}. 추가 정보는 생략합니다."
+    return [
+        {"role": "system", "content": SYSTEM_PROMPT},
+        {"role": "user", "content": sanitized_user},
     ]
+
+def _notices(service: str, symptom: str) -> Dict[str, str]:
+    now = datetime.datetime.now()
+    return {
+        "suspected": incident_suspected(service, symptom, now),
+        "resolved": incident_resolved(service, symptom, impact="영향도 확인중", event_time=now, resolved_time=now, action="조치"),
+        "declared": outage_declared(service, symptom, impact="영향도 확인중", declare_time=now),
+        "cleared": outage_cleared(service, symptom, impact="영향도 확인중", start_time=now, end_time=now, root_cause="원인분석중", actions="조치내역 정리")
+    }
+
+async def _answer(r: Retrieval, symptom: str, service: str, settings) -> Tuple[str, str]:
+    if r.cached_answer is not None:
+        return r.cached_answer, r.reason
+    reason = r.reason
     try:
-        answer = await achat(messages, settings)
+        with telemetry.span("chat"):
+            answer = await achat(r.messages, settings)
+        _remember_answer(r, service, answer, reason, settings)
     except AOAIContentFilterError as afe:
         # The request was blocked by AOAI Responsible AI policy. Try a sanitized retry without context.
         try:
-            sanitized_user = f"요약/간단 조치 안내를 작성해 주세요. 문제: {symptom} 서비스: {service}. 추가 정보는 생략합니다."
-            sanitized_messages = [
-                {"role": "system", "content": SYSTEM_PROMPT},
-                {"role": "user", "content": sanitized_user},
-            ]
-            answer = await achat(sanitized_messages, settings)
+            with telemetry.span("content_filter_retry"):
+                answer = await achat(_sanitized_messages(symptom, service), settings)
             # mark reason to indicate content-filter fallback
             reason = "aoai_content_filter_sanitized"
         except Exception:
             # still blocked or other error -> return a helpful message to the user
-            answer = (
-                "생성 실패: 요청이 콘텐츠 정책에 의해 차단되었습니다. 민감하거나 성적인 표현이 포함되어 있지 않은지 확인하고, "
-                "문장을 간단하게 줄여 다시 시도해 주세요."
-            )
+            answer = BLOCKED_ANSWER
             reason = "aoai_content_filter_blocked"
-    except Exception as e:
-        # bubble up other errors
-        raise
+    return answer, reason
 
-    now = datetime.datetime.now()
-    notices = {
-        "suspected": incident_suspected(service, symptom, now),
-        "resolved": incident_resolved(service, symptom, impact="영향도 확인중", event_time=now, resolved_time=now, action="조치"),
-        "declared": outage_declared(service, symptom, impact="영향도 확인중", declare_time=now),
-        "cleared": outage_cleared(service, symptom, impact="영향도 확인중", start_time=now, end_time=now, root_cause="원인분석중", actions="조치내역 정리")
-    }
-    return {"hits": hits, "reason": reason, "web_refs": web_refs, "answer": answer, "notices": notices}
+async def generate_incident_response(symptom: str, service: str, extra: str, session=None) -> Dict[str, Any]:
+    # settings, search client and HTTP pools are process-wide; nothing is rebuilt per incident
+    with telemetry.Trace().active() as tr:
+        with telemetry.span("settings"):
+            settings = get_settings()
+        r = await _retrieve(symptom, service, extra, settings)
+        answer, reason = await _answer(r, symptom, service, settings)
+    if session is not None:
+        session.attach(r, answer, reason)
+    return {"hits": r.hits, "reason": reason, "web_refs": r.web_refs, "answer": answer, "context": r.context,
+            "trace": tr.finish(reason), "notices": _notices(service, symptom)}
+
+async def stream_incident_response(symptom: str, service: str, extra: str, session=None) -> AsyncIterator[Dict[str, Any]]:
+    """
+    Streaming variant of generate_incident_response. When an IncidentSession is passed it keeps
+    the hits and the first exchange for follow-up questions (see app/session.py). Yields events:
+      {"type": "context", "hits", "web_refs", "reason"}  once retrieval is done
+      {"type": "token", "text"}                          answer tokens as they arrive
+      {"type": "reset"}                                   content filter tripped mid-stream; discard shown tokens
+      {"type": "result", "result"}                        final dict (same shape as generate_incident_response)
+    """
+    # the trace is activated per step only (see Trace.iterate): each step may run in another task
+    tr = telemetry.Trace()
+    with tr.active():
+        with telemetry.span("settings"):
+            settings = get_settings()
+        r = await _retrieve(symptom, service, extra, settings)
+    reason = r.reason
+    yield {"type": "context", "hits": r.hits, "web_refs": r.web_refs, "reason": reason}
+
+    parts: List[str] = []
+    if r.cached_answer is not None:
+        parts = [r.cached_answer]
+        yield {"type": "token", "text": r.cached_answer}
+    else:
+        try:
+            with tr.timed("chat"):
+                async for tok in tr.iterate(achat_stream(r.messages, settings)):
+                    parts.append(tok)
+                    yield {"type": "token", "text": tok}
+            _remember_answer(r, service, "".join(parts), reason, settings)
+        except AOAIContentFilterError:
+            if parts:
+                yield {"type": "reset"}
+            parts = []
+            try:
+                with tr.timed("content_filter_retry"):
+                    async for tok in tr.iterate(achat_stream(_sanitized_messages(symptom, service), settings)):
+                        parts.append(tok)
+                        yield {"type": "token", "text": tok}
+                reason = "aoai_content_filter_sanitized"
+            except Exception:
+                if parts:
+                    yield {"type": "reset"}
+                parts = [BLOCKED_ANSWER]
+                reason = "aoai_content_filter_blocked"
+                yield {"type": "token", "text": BLOCKED_ANSWER}
+
+    answer = "".join(parts)
+    if session is not None:
+        session.attach(r, answer, reason)
+    yield {"type": "result", "result": {"hits": r.hits, "reason": reason, "web_refs": r.web_refs, "answer": answer, "context": r.context,
+                                        "trace": tr.finish(reason), "notices": _notices(service, symptom)}}
+
+# ---------- Batch orchestrator ----------
+def _event_fields(ev: Dict[str, Any]) -> Tuple[str, str, str]:
+    return ev.get("symptom", "") or "", ev.get("service", "") or "", ev.get("extra", "") or ""
+
+async def iter_incident_responses(events: List[Dict[str, Any]]) -> AsyncIterator[Tuple[int, Dict[str, Any]]]:
+    """
+    Analyse many incidents at once and yield (input index, result) as each one completes.
+    Events are dicts with symptom / service / extra. All query embeddings go out in one
+    batched request, searches run concurrently and at most BATCH_CHAT_CONCURRENCY chat calls
+    are in flight; every AOAI call also goes through the shared quota limiter.
+    A failing event yields a result with reason="error" instead of aborting the batch.
+    """
+    settings = get_settings()
+    fields = [_event_fields(ev) for ev in events]
+    try:
+        qvecs: List[Optional[List[float]]] = await aembed([query_text(*f) for f in fields], settings) if fields else []
+    except Exception:
+        # each search falls back to its own embedding attempt / keyword leg
+        qvecs = [None] * len(fields)
+
+    search_sem = asyncio.Semaphore(settings.BATCH_SEARCH_CONCURRENCY)
+    chat_sem = asyncio.Semaphore(settings.BATCH_CHAT_CONCURRENCY)
+
+    async def one(i: int) -> Tuple[int, Dict[str, Any]]:
+        symptom, service, extra = fields[i]
+        tr = telemetry.Trace()
+        try:
+            with tr.active():
+                async with search_sem:
+                    r = await _retrieve(symptom, service, extra, settings, qvecs[i])
+                async with chat_sem:
+                    answer, reason = await _answer(r, symptom, service, settings)
+            return i, {"hits": r.hits, "reason": reason, "web_refs": r.web_refs, "answer": answer, "context": r.context,
+                       "trace": tr.finish(reason), "notices": _notices(service, symptom)}
+        except Exception as e:
+            return i, {"hits": [], "reason": "error", "error": str(e), "web_refs": [], "answer": "",
+                       "trace": tr.finish("error"), "notices": _notices(service, symptom)}
+
+    tasks = [asyncio.create_task(one(i)) for i in range(len(fields))]
+    try:
+        for fut in asyncio.as_completed(tasks):
+            yield await fut
+    finally:
+        for t in tasks:
+            t.cancel()
+
+async def generate_incident_responses(events: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+    """Batch version of generate_incident_response; results are returned in input order."""
+    results: List[Optional[Dict[str, Any]]] = [None] * len(events)
+    async for i, res in iter_incident_responses(events):
+        results[i] = res
+    return results
@@ -0,0 +1,88 @@
+"""
+Client-side token-bucket limiter sized to the AOAI quota (requests/min + tokens/min).
+
+One limiter is shared by every aembed / achat call in the process, across event loops,
+so a burst of incidents queues locally instead of running into 429s.
+"""
+from __future__ import annotations
+import asyncio, threading, time
+from functools import lru_cache
+from typing import Dict, Iterable
+
+def estimate_tokens(text: str) -> int:
+    # cheap upper-ish bound: ~4 UTF-8 bytes per token (Korean is 3 bytes/char, ~1 token/char or less)
+    return max(1, len(text.encode("utf-8")) // 4)
+
+def estimate_message_tokens(messages: Iterable[Dict[str, str]]) -> int:
+    return sum(estimate_tokens(m.get("content") or "") + 4 for m in messages)
+
+class TokenBucketLimiter:
+    def __init__(self, rpm: int = 0, tpm: int = 0):
+        # 0 disables the corresponding bucket
+        self.rpm = rpm
+        self.tpm = tpm
+        self._req = float(rpm)
+        self._tok = float(tpm)
+        self._stamp = time.monotonic()
+        self._lock = threading.Lock()
+        self.waited_seconds = 0.0
+
+    def _refill(self, now: float) -> None:
+        elapsed = now - self._stamp
+        self._stamp = now
+        if self.rpm:
+            self._req = min(self.rpm, self._req + elapsed * self.rpm / 60.0)
+        if self.tpm:
+            self._tok = min(self.tpm, self._tok + elapsed * self.tpm / 60.0)
+
+    def _try_take(self, tokens: int) -> float:
+        """Take capacity if available and return 0, otherwise return the seconds to wait."""
+        with self._lock:
+            self._refill(time.monotonic())
+            tokens = min(tokens, self.tpm) if self.tpm else 0
+            wait = 0.0
+            if self.rpm and self._req < 1:
+                wait = max(wait, (1 - self._req) * 60.0 / self.rpm)
+            if self.tpm and self._tok < tokens:
+                wait = max(wait, (tokens - self._tok) * 60.0 / self.tpm)
+            if wait > 0:
+                return wait
+            if self.rpm:
+                self._req -= 1
+            if self.tpm:
+                self._tok -= tokens
+            return 0.0
+
+    def observe(self, headers) -> None:
+        """Align the buckets with the server's view (x-ratelimit-remaining-*) after each response."""
+        with self._lock:
+            self._refill(time.monotonic())
+            for header, attr, enabled in (("x-ratelimit-remaining-requests", "_req", self.rpm),
+                                          ("x-ratelimit-remaining-tokens", "_tok", self.tpm)):
+                if enabled and header in headers:
+                    try:
+                        setattr(self, attr, min(getattr(self, attr), float(headers[header])))
+                    except ValueError:
+                        pass
+
+    async def acquire(self, tokens: int = 0) -> float:
+        """Wait until one request carrying `tokens` fits the quota; returns the time spent waiting."""
+        if not (self.rpm or self.tpm):
+            return 0.0
+        waited = 0.0
+        while True:
+            wait = self._try_take(tokens)
+            if wait <= 0:
+                self.waited_seconds += waited
+                return waited
+            await asyncio.sleep(wait)
+            waited += wait
+
+def get_rate_limiter(settings) -> TokenBucketLimiter:
+    # keyed on the endpoint and its quota, not the whole Settings: an index pointer switch
+    # (app/index_pointer.py) derives new Settings but must keep the same buckets
+    return _limiter(settings.AZURE_OPENAI_ENDPOINT, settings.AOAI_RPM, settings.AOAI_TPM)
+
+@lru_cache(maxsize=None)
+def _limiter(endpoint: str, rpm: int, tpm: int) -> TokenBucketLimiter:
+    return TokenBucketLimiter(rpm=rpm, tpm=tpm)
@@ -0,0 +1,217 @@
+"""
+Shared retry policy for every AOAI call (app and scripts).
+
+- retries 429 / 408 / 5xx responses and transport errors (timeouts, resets)
+- waits what the service asks for (Retry-After, retry-after-ms, x-ratelimit-reset-*),
+  otherwise jittered exponential backoff
+- per-endpoint circuit breaker: after BREAKER_FAILURES consecutive 5xx/transport failures
+  calls fail fast for BREAKER_COOLDOWN seconds, then one trial call is let through
+- retry / throttle counters via retry_stats()
+
+Configured from the environment so scripts without app Settings share the same policy:
+RETRY_MAX_ATTEMPTS (5), RETRY_MAX_WAIT (60s), BREAKER_FAILURES (5), BREAKER_COOLDOWN (30s).
+"""
+from __future__ import annotations
+import email.utils, os, random, re, threading, time
+from typing import Awaitable, Callable, Dict, Optional
+from urllib.parse import urlsplit
+import httpx
+from tenacity import AsyncRetrying, Retrying, retry_if_exception, stop_after_attempt, wait_random_exponential
+from tenacity.wait import wait_base
+
+from app import telemetry
+
+RETRYABLE_STATUS = {408, 429, 500, 502, 503, 504}
+
+_stats_lock = threading.Lock()
+_STATS: Dict[str, float] = {"attempts": 0, "retries": 0, "throttled": 0, "throttle_seconds": 0.0, "circuit_open": 0}
+
+def _bump(key: str, value: float = 1) -> None:
+    with _stats_lock:
+        _STATS[key] += value
+
+def retry_stats() -> Dict[str, float]:
+    with _stats_lock:
+        return dict(_STATS)
+
+class RetryableHTTPError(RuntimeError):
+    def __init__(self, response: httpx.Response):
+        self.response = response
+        self.retry_after = retry_after_seconds(response.headers)
+        super().__init__(f"HTTP {response.status_code} from {response.request.url.host if response.request else '?'}")
+
+class CircuitOpenError(RuntimeError):
+    pass
+
+# ---------- Retry-After parsing ----------
+_DURATION = re.compile(r"(\d+(?:\.\d+)?)(ms|s|m|h)")
+
+def _parse_duration(value: str) -> Optional[float]:
+    # x-ratelimit-reset-* is either plain seconds or a Go-style duration such as "6m0s" / "20ms"
+    value = value.strip()
+    try:
+        return float(value)
+    except ValueError:
+        pass
+    parts = _DURATION.findall(value)
+    if not parts:
+        return None
+    scale = {"ms": 0.001, "s": 1.0, "m": 60.0, "h": 3600.0}
+    return sum(float(n) * scale[u] for n, u in parts)
+
+def retry_after_seconds(headers: httpx.Headers) -> Optional[float]:
+    if "retry-after-ms" in headers:
+        try:
+            return float(headers["retry-after-ms"]) / 1000.0
+        except ValueError:
+            pass
+    if "retry-after" in headers:
+        raw = headers["retry-after"]
+        try:
+            return float(raw)
+        except ValueError:
+            dt = email.utils.parsedate_to_datetime(raw) if raw else None
+            if dt is not None:
+                return max(0.0, dt.timestamp() - time.time())
+    resets = [_parse_duration(headers[h]) for h in ("x-ratelimit-reset-requests", "x-ratelimit-reset-tokens") if h in headers]
+    resets = [r for r in resets if r is not None]
+    return max(resets) if resets else None
+
+class wait_retry_after(wait_base):
+    """Honour the server's Retry-After hint (plus jitter); fall back to jittered exponential backoff."""
+    def __init__(self, max_wait: float):
+        self.max_wait = max_wait
+        self.fallback = wait_random_exponential(multiplier=0.5, max=max_wait)
+
+    def __call__(self, retry_state) -> float:
+        exc = retry_state.outcome.exception() if retry_state.outcome else None
+        hint = getattr(exc, "retry_after", None)
+        if hint is not None:
+            return min(self.max_wait, hint + random.uniform(0, 0.5))
+        return self.fallback(retry_state)
+
+# ---------- Circuit breaker ----------
+class CircuitBreaker:
+    def __init__(self, failures: int, cooldown: float):
+        self.failures = failures
+        self.cooldown = cooldown
+        self._count = 0
+        self._opened_at: Optional[float] = None
+        self._probing = False
+        self._lock = threading.Lock()
+
+    def check(self, name: str) -> None:
+        with self._lock:
+            if self._opened_at is None:
+                return
+            now = time.monotonic()
+            if now - self._opened_at >= self.cooldown:
+                # half-open: one trial call goes through, the others fail fast until it is recorded.
+                # The cooldown restarts, so a trial that never reports (429, cancelled) is retried later
+                self._probing = True
+                self._opened_at = now
+                return
+        _bump("circuit_open")
+        raise CircuitOpenError(f"circuit open for {name}; retry after cooldown")
+
+    def record_success(self) -> None:
+        with self._lock:
+            self._count = 0
+            self._opened_at = None
+            self._probing = False
+
+    def record_failure(self) -> None:
+        with self._lock:
+            self._count += 1
+            if self._probing or self._count >= self.failures:
+                # a failed trial re-opens at once
+                self._opened_at = time.monotonic()
+                self._probing = False
+
+_breakers: Dict[str, CircuitBreaker] = {}
+_breakers_lock = threading.Lock()
+
+def get_breaker(url: str) -> CircuitBreaker:
+    parts = urlsplit(str(url))
+    key = f"{parts.scheme}://{parts.netloc}".lower()
+    with _breakers_lock:
+        if key not in _breakers:
+            _breakers[key] = CircuitBreaker(int(os.getenv("BREAKER_FAILURES", "5")), float(os.getenv("BREAKER_COOLDOWN", "30")))
+        return _breakers[key]
+
+# ---------- Policy ----------
+def _is_retryable(exc: BaseException) -> bool:
+    return isinstance(exc, (RetryableHTTPError, httpx.TransportError))
+
+def _before_sleep(retry_state) -> None:
+    _bump("retries")
+    exc = retry_state.outcome.exception()
+    throttled = isinstance(exc, RetryableHTTPError) and exc.response.status_code == 429
+    telemetry.note_retry(throttled)
+    if throttled:
+        _bump("throttled")
+        _bump("throttle_seconds", retry_state.next_action.sleep if retry_state.next_action else 0.0)
+
+def _policy_kwargs() -> dict:
+    max_wait = float(os.getenv("RETRY_MAX_WAIT", "60"))
+    return dict(
+        stop=stop_after_attempt(int(os.getenv("RETRY_MAX_ATTEMPTS", "5"))),
+        wait=wait_retry_after(max_wait),
+        retry=retry_if_exception(_is_retryable),
+        before_sleep=_before_sleep,
+        reraise=True,
+    )
+
+def _classify(resp: httpx.Response, breaker: CircuitBreaker) -> None:
+    if resp.status_code in RETRYABLE_STATUS:
+        if resp.status_code >= 500:
+            breaker.record_failure()
+        raise RetryableHTTPError(resp)
+    breaker.record_success()
+
+async def asend_with_retry(url: str, send: Callable[[], Awaitable[httpx.Response]],
+                           observe: Optional[Callable[[httpx.Headers], None]] = None) -> httpx.Response:
+    """
+    Run `send` under the shared policy. Returns the first non-retryable response; when retries
+    are exhausted the last retryable response is returned so callers surface its body as before.
+    """
+    breaker = get_breaker(url)
+    try:
+        async for attempt in AsyncRetrying(**_policy_kwargs()):
+            with attempt:
+                breaker.check(url)
+                _bump("attempts")
+                try:
+                    resp = await send()
+                except httpx.TransportError:
+                    breaker.record_failure()
+                    raise
+                if observe:
+                    observe(resp.headers)  # client-side quota accounting (x-ratelimit-remaining-*)
+                if resp.status_code in RETRYABLE_STATUS:
+                    await resp.aread()  # releases the connection of streamed responses
+                _classify(resp, breaker)
+    except RetryableHTTPError as e:
+        return e.response
+    return resp
+
+def send_with_retry(url: str, send: Callable[[], httpx.Response],
+                    observe: Optional[Callable[[httpx.Headers], None]] = None) -> httpx.Response:
+    """Synchronous twin of asend_with_retry for the ingestion scripts."""
+    breaker = get_breaker(url)
+    try:
+        for attempt in Retrying(**_policy_kwargs()):
+            with attempt:
+                breaker.check(url)
+                _bump("attempts")
+                try:
+                    resp = send()
+                except httpx.TransportError:
+                    breaker.record_failure()
+                    raise
+                if observe:
+                    observe(resp.headers)  # client-side quota accounting (x-ratelimit-remaining-*)
+                _classify(resp, breaker)
+    except RetryableHTTPError as e:
+        return e.response
+    return resp
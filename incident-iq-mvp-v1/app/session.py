@@ -0,0 +1,88 @@
+"""
+Incident session: one analysed incident plus its follow-up conversation.
+
+The first turn (retrieval + answer) runs through generate_incident_response /
+stream_incident_response with `session=`; follow-up questions reuse the retrieved hits and
+the conversation so far, without re-embedding or re-searching. Turns are only ever appended,
+so every request shares the previous one as an identical prefix (server-side prompt caching).
+"""
+from __future__ import annotations
+import time
+from typing import Any, AsyncIterator, Dict, List, Optional, Tuple
+
+from app.azure_clients import get_settings
+from app.rag_pipeline import (
+    AOAIContentFilterError, BLOCKED_ANSWER, Retrieval, achat, achat_stream, compose_messages, _sanitized_messages,
+)
+
+class IncidentSession:
+    def __init__(self, symptom: str, service: str, extra: str = "", settings=None):
+        self.symptom = symptom
+        self.service = service
+        self.extra = extra
+        self.settings = settings or get_settings()
+        self.hits: List[dict] = []
+        self.web_refs: List[Dict[str, str]] = []
+        self.reason: Optional[str] = None
+        self.messages: List[Dict[str, str]] = []
+        self.turns: List[Tuple[str, str]] = []  # follow-up (question, answer) pairs
+        self.updated_at = time.time()
+
+    @property
+    def ready(self) -> bool:
+        return bool(self.messages)
+
+    def attach(self, r: Retrieval, answer: str, reason: str) -> None:
+        """Record the first exchange; called by the orchestrator once the answer is final."""
+        self.hits, self.web_refs, self.reason = r.hits, r.web_refs, reason
+        if reason.startswith("aoai_content_filter"):
+            # the retrieved context tripped the filter once; follow-ups go without it
+            messages = _sanitized_messages(self.symptom, self.service)
+        elif r.messages:
+            messages = list(r.messages)
+        else:
+            # served from the answer cache: the prompt was never built
+            messages, _ = compose_messages(self.symptom, self.service, self.extra, r.hits, r.web_refs, self.settings)
+        self.messages = messages + [{"role": "assistant", "content": answer}]
+        self.turns = []
+        self.updated_at = time.time()
+
+    def _prompt(self, question: str) -> List[Dict[str, str]]:
+        if not self.ready:
+            raise RuntimeError("IncidentSession has no initial analysis yet")
+        return self.messages + [{"role": "user", "content": question}]
+
+    def _record(self, question: str, answer: str) -> None:
+        self.messages += [{"role": "user", "content": question}, {"role": "assistant", "content": answer}]
+        self.turns.append((question, answer))
+        if len(self.turns) > self.settings.SESSION_MAX_TURNS:
+            # drop the oldest follow-up pair; the first exchange (with the context) always stays
+            first = len(self.messages) - 2 * len(self.turns)
+            del self.messages[first:first + 2]
+            self.turns.pop(0)
+        self.updated_at = time.time()
+
+    async def ask(self, question: str) -> str:
+        try:
+            answer = await achat(self._prompt(question), self.settings)
+        except AOAIContentFilterError:
+            return BLOCKED_ANSWER
+        self._record(question, answer)
+        return answer
+
+    async def ask_stream(self, question: str) -> AsyncIterator[Dict[str, Any]]:
+        """Yields token / reset / result events like stream_incident_response."""
+        parts: List[str] = []
+        reason = "session_followup"
+        try:
+            async for tok in achat_stream(self._prompt(question), self.settings):
+                parts.append(tok)
+                yield {"type": "token", "text": tok}
+            self._record(question, "".join(parts))
+        except AOAIContentFilterError:
+            if parts:
+                yield {"type": "reset"}
+            parts = [BLOCKED_ANSWER]
+            reason = "aoai_content_filter_blocked"
+            yield {"type": "token", "text": BLOCKED_ANSWER}
+        yield {"type": "result", "result": {"answer": "".join(parts), "reason": reason}}
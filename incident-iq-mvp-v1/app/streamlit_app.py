@@ -1,21 +1,44 @@
 
-import asyncio
 import streamlit as st
 import sys
 from pathlib import Path
-from dotenv import load_dotenv, find_dotenv
 
-# 프로젝트 루트 경로 추가 및 환경변수 로드
+# 프로젝트 루트 경로 추가 및 환경변수 로드 (프로세스당 한 번, rerun 시에는 생략)
 PROJECT_ROOT = str(Path(__file__).resolve().parents[1])
 if PROJECT_ROOT not in sys.path:
     sys.path.insert(0, PROJECT_ROOT)
-env_path = find_dotenv()
-if env_path:
-    load_dotenv(env_path, override=True)
+from app.bootstrap import load_env, start_prewarm
+load_env()
 
 # 페이지 설정
 st.set_page_config(page_title="Incident IQ MVP", page_icon="🛠️", layout="wide")
-from app.rag_pipeline import generate_incident_response
+from app.rag_pipeline import stream_incident_response
+from app.session import IncidentSession
+from app.azure_clients import get_settings
+from app.telemetry import start_metrics_server
+from app.worker import BackgroundWorker
+
+# Prometheus /metrics on METRICS_PORT (started once per process; reruns are no-ops)
+try:
+    start_metrics_server(get_settings().METRICS_PORT)
+except RuntimeError:
+    pass  # missing settings are reported when an analysis runs
+
+@st.cache_resource
+def get_worker() -> BackgroundWorker:
+    # one event loop + job queue per server process, shared by every browser session and rerun.
+    # get_settings() raising is not cached: the next rerun tries again once the environment is fixed
+    settings = get_settings()
+    worker = BackgroundWorker(settings.WORKER_CONCURRENCY, settings.WORKER_JOB_TTL)
+    # SDK imports, tokenizer and connections warm up on the worker loop while the page renders
+    start_prewarm(settings, worker.loop)
+    return worker
+
+try:
+    worker = get_worker()
+except RuntimeError as e:
+    st.error(f"설정 오류: {e}")
+    st.stop()
 
 # 스타일 커스텀
 
@@ -59,28 +82,116 @@ extra = st.text_area("🔹추가 정보 (로그, 메트릭, 범위 등)", placeh
 
 btn = st.button("🔎 검색", type="primary")
 
-if btn:
-    with st.spinner("분석 중입니다..."):
-        result = asyncio.run(generate_incident_response(symptom, service, extra))
-    st.success("분석이 완료되었습니다. 아래 결과를 확인하세요.", icon="✅")
+def _render_context(hits, web_refs):
+    if web_refs:
+        st.info("🔗 인터넷 참고자료")
+        for w in web_refs:
+            st.markdown(f"- [{w['name']}]({w['url']}) — {w.get('snippet','')}")
+    st.markdown('<h2><span class="section-icon">📑</span>상위 검색 컨텍스트</h2>', unsafe_allow_html=True)
+    for h in hits[:5]:
+        section = f" · {h['section']}" if h.get("section") else ""
+        with st.expander(f"{h['title']}{section} (score={h['score']:.3f})"):
+            st.write(h["content"])
+            st.caption(f"서비스: {h.get('service','-')} | 심각도: {h.get('severity','-')} | 영향도: {h.get('impact','-')}")
+            if h.get("actions"):
+                st.code(h["actions"], language="bash")
+
+def _render_notices(result):
+    for key in ["suspected", "resolved", "declared", "cleared"]:
+        st.code(result["notices"].get(key, ""), language="markdown")
+
+def _layout():
     col1, col2 = st.columns([2, 1], gap="large")
     with col1:
         st.markdown('<h2><span class="section-icon">💡</span>조치 가이드 안내</h2>', unsafe_allow_html=True)
-        st.markdown(result["answer"])
-        if result.get("web_refs"):
-            st.info("🔗 인터넷 참고자료")
-            for w in result["web_refs"]:
-                st.markdown(f"- [{w['name']}]({w['url']}) — {w.get('snippet','')}")
-        st.markdown('<h2><span class="section-icon">📑</span>상위 검색 컨텍스트</h2>', unsafe_allow_html=True)
-        for h in result["hits"][:5]:
-            with st.expander(f"{h['title']} (score={h['score']:.3f})"):
-                st.write(h["content"])
-                st.caption(f"서비스: {h.get('service','-')} | 심각도: {h.get('severity','-')} | 영향도: {h.get('impact','-')}")
-                if h.get("actions"):
-                    st.code(h["actions"], language="bash")
+        answer_box = st.empty()
+        context_box = st.container()
     with col2:
         st.markdown('<h2><span class="section-icon">📝</span>공지 포맷 예시</h2>', unsafe_allow_html=True)
-        for key in ["suspected", "resolved", "declared", "cleared"]:
-            st.code(result["notices"].get(key, ""), language="markdown")
+        notice_box = st.container()
+    return answer_box, context_box, notice_box
+
+if btn:
+    # the session keeps hits and the conversation so follow-up questions skip retrieval
+    session = IncidentSession(symptom, service, extra)
+    job = worker.submit(lambda: stream_incident_response(symptom, service, extra, session=session), label="incident")
+    st.session_state["job"] = {"id": job.id, "session": session}
+    st.session_state.pop("followup", None)
+
+# a submitted analysis runs on the worker; this run (or the next rerun) follows it by id
+pending = st.session_state.get("job")
+job = worker.get(pending["id"]) if pending else None
+if pending and job is None:
+    st.session_state.pop("job", None)  # expired (WORKER_JOB_TTL) or server restarted
+
+if job is not None:
+    status = st.empty()
+    answer_box, context_box, notice_box = _layout()
+
+    answer = ""
+    with status, st.spinner("분석 중입니다..."):
+        for ev in job.follow():
+            if ev["type"] == "context":
+                with context_box:
+                    _render_context(ev["hits"], ev["web_refs"])
+            elif ev["type"] == "token":
+                answer += ev["text"]
+                answer_box.markdown(answer + "▌")
+            elif ev["type"] == "reset":
+                answer = ""
+                answer_box.markdown("")
+
+    st.session_state.pop("job", None)
+    result = job.result
+    if result is None:
+        answer_box.markdown(answer)
+        status.error(f"분석에 실패했습니다: {job.error or '결과 없음'}", icon="🚨")
+    else:
+        answer_box.markdown(result["answer"])
+        with notice_box:
+            _render_notices(result)
+        st.session_state["incident"] = {"session": pending["session"], "result": result}
+        status.success("분석이 완료되었습니다. 아래 결과를 확인하세요.", icon="✅")
+elif "incident" in st.session_state:
+    # reruns (e.g. a follow-up question) redraw the last analysis from the session state
+    result = st.session_state["incident"]["result"]
+    answer_box, context_box, notice_box = _layout()
+    answer_box.markdown(result["answer"])
+    with context_box:
+        _render_context(result["hits"], result["web_refs"])
+    with notice_box:
+        _render_notices(result)
 else:
     st.info("검색 조건을 입력 후 **검색** 버튼을 눌러주세요.")
+
+if "incident" in st.session_state:
+    session = st.session_state["incident"]["session"]
+    if session.ready:
+        st.markdown('<h2><span class="section-icon">💬</span>추가 질문</h2>', unsafe_allow_html=True)
+        followup = st.session_state.get("followup")
+        fjob = worker.get(followup["id"]) if followup else None
+        if fjob is not None and fjob.done and fjob.error is None:
+            # finished while the page was rerunning: the turn is already in session.turns
+            st.session_state.pop("followup", None)
+            fjob = None
+        for q, a in session.turns:
+            st.chat_message("user").write(q)
+            st.chat_message("assistant").markdown(a)
+        question = st.chat_input("이 이상징후에 대해 추가로 질문하세요 (검색 결과 재사용)")
+        if question and fjob is None:
+            fjob = worker.submit(lambda: session.ask_stream(question), label="followup")
+            followup = st.session_state["followup"] = {"id": fjob.id, "question": question}
+        if fjob is not None:
+            st.chat_message("user").write(followup["question"])
+            reply_box = st.chat_message("assistant").empty()
+            reply = ""
+            for ev in fjob.follow():
+                if ev["type"] == "token":
+                    reply += ev["text"]
+                    reply_box.markdown(reply + "▌")
+                elif ev["type"] == "reset":
+                    reply = ""
+                elif ev["type"] == "result":
+                    reply = ev["result"]["answer"]
+            st.session_state.pop("followup", None)
+            reply_box.markdown(reply if fjob.error is None else f"⚠️ 답변 생성 실패: {fjob.error}")
@@ -0,0 +1,219 @@
+"""
+Per-request tracing and Prometheus metrics.
+
+A Trace collects, for one incident:
+  - stage timings (settings, search, embed, hydrate, bing, chat, content_filter_retry)
+  - AOAI token usage reported by the service (chat / embedding, incl. prompt-cache hits)
+  - cache hits and misses (embedding, answer, web) and retry counts
+and is attached to the result dict as result["trace"]. The current trace travels in a
+ContextVar, so the clients (aembed, achat, retry policy) record into it without extra arguments.
+
+prometheus_client and opentelemetry are optional: without them metrics / spans are skipped.
+prometheus_client is imported when the first metric is recorded, not with this module.
+start_metrics_server(port) serves the Prometheus registry on http://<host>:<port>/metrics;
+metrics_payload() renders it for servers that expose /metrics themselves (app/http_api.py).
+"""
+from __future__ import annotations
+import threading, time
+from contextlib import contextmanager
+from contextvars import ContextVar
+from types import SimpleNamespace
+from typing import Any, AsyncIterator, Dict, Iterator, Optional
+
+try:
+    from opentelemetry import trace as _otel_trace
+    _tracer = _otel_trace.get_tracer("incident_iq")
+except ImportError:  # spans are exported only when an OTel SDK is installed and configured
+    _tracer = None
+
+_LATENCY_BUCKETS = (0.05, 0.1, 0.25, 0.5, 1, 2, 3, 5, 8, 13, 21, 34, 60)
+CONTENT_TYPE_LATEST = "text/plain; version=0.0.4; charset=utf-8"
+
+_metrics_lock = threading.Lock()
+_metrics_state: Optional[SimpleNamespace] = None
+
+def _metrics() -> Optional[SimpleNamespace]:
+    """The Prometheus client and metrics, created on first use; None when prometheus_client is missing."""
+    global _metrics_state
+    if _metrics_state is None:
+        with _metrics_lock:
+            if _metrics_state is None:
+                try:
+                    import prometheus_client as prom
+                except ImportError:  # metrics are optional
+                    _metrics_state = SimpleNamespace(prom=None)
+                else:
+                    Counter, Histogram = prom.Counter, prom.Histogram
+                    _metrics_state = SimpleNamespace(
+                        prom=prom,
+                        STAGE_SECONDS=Histogram("incident_iq_stage_seconds", "Time spent per pipeline stage", ["stage"], buckets=_LATENCY_BUCKETS),
+                        REQUEST_SECONDS=Histogram("incident_iq_request_seconds", "End-to-end incident analysis latency", ["reason"], buckets=_LATENCY_BUCKETS),
+                        REQUESTS=Counter("incident_iq_requests_total", "Analysed incidents by result reason", ["reason"]),
+                        AOAI_TOKENS=Counter("incident_iq_aoai_tokens_total", "Tokens reported by Azure OpenAI", ["kind"]),
+                        CACHE_EVENTS=Counter("incident_iq_cache_events_total", "Cache lookups", ["cache", "result"]),
+                        RETRIES=Counter("incident_iq_retries_total", "Retried AOAI calls", ["throttled"]),
+                        BACKEND_CALLS=Counter("incident_iq_aoai_backend_calls_total", "AOAI calls per routed backend", ["backend", "kind", "outcome"]),
+                        ALERTS=Counter("incident_iq_alerts_total", "Channel alerts by ingestion outcome", ["result"]),
+                    )
+    return _metrics_state if _metrics_state.prom is not None else None
+
+def metrics_enabled() -> bool:
+    # also warms the import (app/bootstrap.py prewarm)
+    return _metrics() is not None
+
+_current: ContextVar[Optional["Trace"]] = ContextVar("incident_iq_trace", default=None)
+
+class Trace:
+    def __init__(self):
+        self.started = time.perf_counter()
+        self.stages: Dict[str, float] = {}
+        self.tokens: Dict[str, int] = {}
+        self.cache: Dict[str, Dict[str, int]] = {}
+        self.retries = 0
+
+    @contextmanager
+    def active(self) -> Iterator["Trace"]:
+        token = _current.set(self)
+        try:
+            yield self
+        finally:
+            _current.reset(token)
+
+    async def iterate(self, agen: AsyncIterator[Any]) -> AsyncIterator[Any]:
+        # activate the trace for each step only: a generator step may run in a different
+        # task/context than the previous one (e.g. driven by run_until_complete)
+        try:
+            while True:
+                with self.active():
+                    try:
+                        item = await agen.__anext__()
+                    except StopAsyncIteration:
+                        return
+                yield item
+        finally:
+            await agen.aclose()
+
+    @contextmanager
+    def timed(self, stage: str) -> Iterator[None]:
+        # like span(), but bound to this trace; safe across generator yields
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.add_stage(stage, time.perf_counter() - started)
+
+    def add_stage(self, stage: str, seconds: float) -> None:
+        self.stages[stage] = self.stages.get(stage, 0.0) + seconds
+        m = _metrics()
+        if m is not None:
+            m.STAGE_SECONDS.labels(stage).observe(seconds)
+
+    def finish(self, reason: str) -> Dict[str, Any]:
+        total = time.perf_counter() - self.started
+        m = _metrics()
+        if m is not None:
+            m.REQUESTS.labels(reason).inc()
+            m.REQUEST_SECONDS.labels(reason).observe(total)
+        return {
+            "reason": reason,
+            "total_ms": round(total * 1000, 1),
+            "stages_ms": {k: round(v * 1000, 1) for k, v in self.stages.items()},
+            "tokens": dict(self.tokens),
+            "cache": {k: dict(v) for k, v in self.cache.items()},
+            "retries": self.retries,
+        }
+
+def current() -> Optional[Trace]:
+    return _current.get()
+
+@contextmanager
+def span(stage: str) -> Iterator[None]:
+    """Time a stage into the current trace and the stage histogram (and an OTel span if available)."""
+    started = time.perf_counter()
+    otel = _tracer.start_as_current_span(f"incident_iq.{stage}") if _tracer is not None else None
+    if otel is not None:
+        otel.__enter__()
+    try:
+        yield
+    finally:
+        if otel is not None:
+            otel.__exit__(None, None, None)
+        elapsed = time.perf_counter() - started
+        tr = _current.get()
+        m = _metrics() if tr is None else None
+        if tr is not None:
+            tr.add_stage(stage, elapsed)
+        elif m is not None:
+            m.STAGE_SECONDS.labels(stage).observe(elapsed)
+
+def record_tokens(usage: Optional[Dict[str, Any]], kind: str) -> None:
+    # `usage` as returned by AOAI: prompt_tokens / completion_tokens / prompt_tokens_details.cached_tokens
+    if not usage:
+        return
+    counts = {
+        f"{kind}_prompt": usage.get("prompt_tokens") or 0,
+        f"{kind}_completion": usage.get("completion_tokens") or 0,
+        f"{kind}_cached": (usage.get("prompt_tokens_details") or {}).get("cached_tokens") or 0,
+    }
+    tr = _current.get()
+    m = _metrics()
+    for key, n in counts.items():
+        if not n:
+            continue
+        if tr is not None:
+            tr.tokens[key] = tr.tokens.get(key, 0) + n
+        if m is not None:
+            m.AOAI_TOKENS.labels(key).inc(n)
+
+def record_cache(cache: str, hit: bool, n: int = 1) -> None:
+    if n <= 0:
+        return
+    result = "hit" if hit else "miss"
+    tr = _current.get()
+    if tr is not None:
+        bucket = tr.cache.setdefault(cache, {"hit": 0, "miss": 0})
+        bucket[result] += n
+    m = _metrics()
+    if m is not None:
+        m.CACHE_EVENTS.labels(cache, result).inc(n)
+
+def note_retry(throttled: bool) -> None:
+    tr = _current.get()
+    if tr is not None:
+        tr.retries += 1
+    m = _metrics()
+    if m is not None:
+        m.RETRIES.labels("true" if throttled else "false").inc()
+
+def record_backend(backend: str, kind: str, outcome: str) -> None:
+    # AOAI router: ok / throttled / error per attempt, hedged when a duplicate call is started
+    m = _metrics()
+    if m is not None:
+        m.BACKEND_CALLS.labels(backend, kind, outcome).inc()
+
+def record_alert(result: str, n: int = 1) -> None:
+    # alert ingestion outcomes: received / filtered / coalesced / suppressed / incidents / analysed / errors
+    m = _metrics()
+    if m is not None:
+        m.ALERTS.labels(result).inc(n)
+
+def metrics_payload() -> tuple:
+    """(body, content type) of the Prometheus text exposition; empty when prometheus_client is missing."""
+    m = _metrics()
+    if m is None:
+        return b"", CONTENT_TYPE_LATEST
+    return m.prom.generate_latest(), m.prom.CONTENT_TYPE_LATEST
+
+_server_lock = threading.Lock()
+_server_port: Optional[int] = None
+
+def start_metrics_server(port: int, addr: str = "0.0.0.0") -> bool:
+    """Serve /metrics once per process (idempotent); returns False when disabled or unavailable."""
+    global _server_port
+    if not port or _metrics() is None:
+        return False
+    with _server_lock:
+        if _server_port is None:
+            _metrics().prom.start_http_server(port, addr=addr)
+            _server_port = port
+    return True
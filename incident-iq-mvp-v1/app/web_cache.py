@@ -0,0 +1,61 @@
+"""
+Small LRU of recent web (Bing) results keyed by normalised (service, symptom).
+
+Alert storms repeat the same symptom text; the backup search then costs one Bing call
+per WEB_CACHE_TTL instead of one per incident.
+"""
+from __future__ import annotations
+import threading, time
+from collections import OrderedDict
+from functools import lru_cache
+from typing import Dict, List, Optional, Tuple
+
+from app.embedding_cache import normalize_text
+
+class WebResultCache:
+    def __init__(self, max_items: int = 256, ttl: float = 3600.0):
+        self.max_items = max_items
+        self.ttl = ttl
+        self._items: "OrderedDict[Tuple[str, str], Tuple[float, List[Dict[str, str]]]]" = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    @staticmethod
+    def _key(service: str, symptom: str) -> Tuple[str, str]:
+        return normalize_text(service), normalize_text(symptom)
+
+    def get(self, service: str, symptom: str) -> Optional[List[Dict[str, str]]]:
+        key = self._key(service, symptom)
+        with self._lock:
+            item = self._items.get(key)
+            if item is not None and (self.ttl <= 0 or time.time() - item[0] <= self.ttl):
+                self._items.move_to_end(key)
+                self.hits += 1
+                return list(item[1])
+            if item is not None:
+                del self._items[key]
+            self.misses += 1
+            return None
+
+    def put(self, service: str, symptom: str, refs: List[Dict[str, str]]) -> None:
+        if self.max_items <= 0:
+            return
+        key = self._key(service, symptom)
+        with self._lock:
+            self._items[key] = (time.time(), list(refs))
+            self._items.move_to_end(key)
+            while len(self._items) > self.max_items:
+                self._items.popitem(last=False)
+
+    def stats(self) -> Dict[str, int]:
+        with self._lock:
+            return {"items": len(self._items), "hits": self.hits, "misses": self.misses}
+
+def get_web_cache(settings) -> WebResultCache:
+    # web results do not depend on the search index or the models
+    return _web_cache(settings.WEB_CACHE_SIZE, settings.WEB_CACHE_TTL)
+
+@lru_cache(maxsize=None)
+def _web_cache(max_items: int, ttl: float) -> WebResultCache:
+    return WebResultCache(max_items=max_items, ttl=ttl)
@@ -0,0 +1,159 @@
+"""
+Process-wide background worker: one long-lived event loop in a daemon thread plus a job queue.
+
+Synchronous callers (the Streamlit script threads) submit async event streams such as
+stream_incident_response(...) or IncidentSession.ask_stream(...) and get a Job back right away:
+
+    job = worker.submit(lambda: stream_incident_response(symptom, service, extra, session=session))
+    for ev in job.follow():        # blocks only the calling thread; replays from the first event
+        ...
+
+The loop outlives script reruns, so HTTP pools, search clients and caches are built once per
+process, a rerun can pick an in-flight job up again by id, and WORKER_CONCURRENCY jobs run
+concurrently, so several operators do not queue behind one another. Finished jobs are kept for
+WORKER_JOB_TTL seconds.
+"""
+from __future__ import annotations
+import asyncio, threading, time, uuid
+from typing import Any, AsyncIterator, Callable, Dict, Iterator, List, Optional
+
+EventSource = Callable[[], AsyncIterator[Dict[str, Any]]]
+
+class Job:
+    def __init__(self, source: EventSource, label: str = ""):
+        self.id = uuid.uuid4().hex[:12]
+        self.label = label
+        self.source = source
+        self.events: List[Dict[str, Any]] = []
+        self.result: Optional[Dict[str, Any]] = None
+        self.error: Optional[str] = None
+        self.done = False
+        self.created = time.time()
+        self.finished: Optional[float] = None
+        self._cond = threading.Condition()
+        self._task: Optional[asyncio.Task] = None
+
+    @property
+    def state(self) -> str:
+        if self.error is not None:
+            return "error"
+        return "done" if self.done else ("running" if self.events else "queued")
+
+    def _publish(self, event: Dict[str, Any]) -> None:
+        with self._cond:
+            self.events.append(event)
+            if event.get("type") == "result":
+                self.result = event["result"]
+            self._cond.notify_all()
+
+    def _finish(self, error: Optional[str] = None) -> None:
+        with self._cond:
+            self.error = error
+            self.done = True
+            self.finished = time.time()
+            self._cond.notify_all()
+
+    def wait(self, after: int, timeout: float = 0.5) -> List[Dict[str, Any]]:
+        """Events after index `after`, waiting up to `timeout` for new ones."""
+        with self._cond:
+            self._cond.wait_for(lambda: len(self.events) > after or self.done, timeout)
+            return self.events[after:]
+
+    def follow(self, poll: float = 0.5) -> Iterator[Dict[str, Any]]:
+        """All events from the first one, then new ones as they arrive, until the job ends."""
+        i = 0
+        while True:
+            batch = self.wait(i, poll)
+            yield from batch
+            i += len(batch)
+            if self.done and i == len(self.events):
+                return
+
+class BackgroundWorker:
+    def __init__(self, concurrency: int = 8, job_ttl: float = 3600.0):
+        self.concurrency = concurrency
+        self.job_ttl = job_ttl
+        self.jobs: Dict[str, Job] = {}
+        self._lock = threading.Lock()
+        self._ready = threading.Event()
+        self.loop = asyncio.new_event_loop()
+        self.thread = threading.Thread(target=self._main, name="incident-iq-worker", daemon=True)
+        self.thread.start()
+        self._ready.wait()
+
+    def _main(self) -> None:
+        asyncio.set_event_loop(self.loop)
+        self.queue: "asyncio.Queue[Job]" = asyncio.Queue()
+        self._consumers = [self.loop.create_task(self._consume()) for _ in range(self.concurrency)]
+        self.loop.call_soon(self._ready.set)
+        self.loop.run_forever()
+
+    async def _consume(self) -> None:
+        while True:
+            job = await self.queue.get()
+            if job.done:  # cancelled while queued
+                continue
+            # own task per job: cancelling a job leaves the consumer running
+            job._task = asyncio.create_task(self._run(job))
+            await asyncio.wait([job._task])
+
+    @staticmethod
+    async def _run(job: Job) -> None:
+        try:
+            agen = job.source()
+            try:
+                async for ev in agen:
+                    job._publish(ev)
+            finally:
+                await agen.aclose()
+            job._finish()
+        except asyncio.CancelledError:
+            job._finish("cancelled")
+        except Exception as e:
+            job._finish(str(e) or type(e).__name__)
+
+    def submit(self, source: EventSource, label: str = "") -> Job:
+        """Queue an async event stream (a zero-argument callable returning it); returns immediately."""
+        job = Job(source, label)
+        with self._lock:
+            self._prune()
+            self.jobs[job.id] = job
+        self.loop.call_soon_threadsafe(self.queue.put_nowait, job)
+        return job
+
+    def get(self, job_id: Optional[str]) -> Optional[Job]:
+        with self._lock:
+            return self.jobs.get(job_id) if job_id else None
+
+    def cancel(self, job_id: str) -> None:
+        job = self.get(job_id)
+        if job is None or job.done:
+            return
+        if job._task is None:
+            job._finish("cancelled")
+        else:
+            self.loop.call_soon_threadsafe(job._task.cancel)
+
+    def _prune(self) -> None:
+        cutoff = time.time() - self.job_ttl
+        for jid in [jid for jid, j in self.jobs.items() if j.done and (j.finished or 0) < cutoff]:
+            del self.jobs[jid]
+
+    def run(self, coro, timeout: Optional[float] = None) -> Any:
+        """Run a one-off coroutine on the worker loop and wait for its result."""
+        return asyncio.run_coroutine_threadsafe(coro, self.loop).result(timeout)
+
+    def stop(self) -> None:
+        from app.http_clients import aclose_clients
+
+        async def shutdown():
+            tasks = self._consumers + [j._task for j in list(self.jobs.values()) if j._task is not None and not j.done]
+            for task in tasks:
+                task.cancel()
+            await asyncio.gather(*tasks, return_exceptions=True)
+            await aclose_clients()
+        try:
+            self.run(shutdown(), timeout=10)
+        finally:
+            self.loop.call_soon_threadsafe(self.loop.stop)
+            self.thread.join(timeout=5)
@@ -0,0 +1,273 @@
+"""
+Local stand-ins for Azure OpenAI, Azure AI Search and Bing, used by scripts/benchmark.py.
+
+One aiohttp server (background thread, 127.0.0.1, random port) serves the REST routes the
+app and scripts call, so the real clients (httpx pools, aio SearchClient, retry policy) run
+unmodified against it:
+
+  POST /openai/deployments/{d}/embeddings        deterministic hashed-bigram embeddings
+  POST /openai/deployments/{d}/chat/completions  fixed answer, JSON or SSE (stream=True)
+  POST /indexes('{name}')/docs/search.post.search, search.index, GET docs/$count
+                                                  one app.local_search.LocalSearchIndex per index name
+  PUT/GET/DELETE /indexes('{name}'), GET /indexes, GET /indexes('{name}')/search.stats
+                                                  index management (definitions kept as posted)
+  GET  /bing                                      canned web results
+
+Latency, 429 throttling and content-filter blocks are injected per FakeConfig.
+"""
+from __future__ import annotations
+import asyncio, hashlib, json, os, random, tempfile, threading
+from collections import Counter
+from dataclasses import dataclass
+from typing import Dict, List, Optional
+
+import numpy as np
+from aiohttp import web
+from azure.core.credentials import AzureKeyCredential
+from azure.search.documents.indexes import SearchIndexClient
+from azure.search.documents.models import VectorizedQuery
+
+from app.embedding_cache import normalize_text
+from app.local_search import LocalSearchIndex
+
+@dataclass
+class FakeConfig:
+    dim: int = 1536
+    embed_ms: float = 40.0
+    chat_ms: float = 600.0        # time to full completion (spread over the stream)
+    search_ms: float = 30.0
+    bing_ms: float = 250.0
+    jitter: float = 0.2           # +/- fraction applied to every latency
+    throttle_rate: float = 0.0    # share of AOAI calls answered with 429
+    filter_rate: float = 0.0      # share of chat calls blocked by the content filter
+    answer_tokens: int = 120
+    seed: int = 7
+
+def fake_embedding(text: str, dim: int, dimensions: Optional[int] = None) -> List[float]:
+    """Deterministic unit vector from signed, hashed character bigrams: similar texts land close.
+
+    `dimensions` shortens the vector like text-embedding-3 does (leading components, renormalised).
+    """
+    s = normalize_text(text)
+    vec = np.zeros(dim, dtype=np.float32)
+    for i in range(max(1, len(s) - 1)):
+        h = int.from_bytes(hashlib.blake2b(s[i:i + 2].encode("utf-8"), digest_size=8).digest(), "little")
+        vec[h % dim] += 1.0 if (h >> 32) & 1 else -1.0
+    if dimensions:
+        vec = vec[:dimensions]
+    norm = float(np.linalg.norm(vec)) or 1.0
+    return (vec / norm).tolist()
+
+# bytes per vector component by compression kind, for the modelled vectorIndexSize
+_VECTOR_BYTES = {"none": 4.0, "scalarQuantization": 1.0, "binaryQuantization": 1 / 8}
+
+class FakeAzure:
+    def __init__(self, config: Optional[FakeConfig] = None, index_dir: Optional[str] = None):
+        self.config = config or FakeConfig()
+        self.index_dir = index_dir or tempfile.mkdtemp(prefix="fake-search-")
+        self.indexes: Dict[str, LocalSearchIndex] = {}
+        self.definitions: Dict[str, dict] = {}
+        self.calls: Counter = Counter()
+        self._rng = random.Random(self.config.seed)
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._runner: Optional[web.AppRunner] = None
+        self._thread: Optional[threading.Thread] = None
+        self.base_url = ""
+
+    # ---------- injection helpers ----------
+    async def _sleep(self, ms: float) -> None:
+        jitter = self.config.jitter
+        await asyncio.sleep(max(0.0, ms * (1 + self._rng.uniform(-jitter, jitter))) / 1000.0)
+
+    def _throttled(self) -> Optional[web.Response]:
+        if self._rng.random() < self.config.throttle_rate:
+            self.calls["429"] += 1
+            return web.json_response({"error": {"code": "429", "message": "Rate limit is exceeded."}},
+                                     status=429, headers={"retry-after-ms": "200"})
+        return None
+
+    # ---------- Azure OpenAI ----------
+    async def embeddings(self, request: web.Request) -> web.Response:
+        self.calls["embeddings"] += 1
+        body = await request.json()
+        await self._sleep(self.config.embed_ms)
+        throttled = self._throttled()
+        if throttled is not None:
+            return throttled
+        texts = body["input"] if isinstance(body["input"], list) else [body["input"]]
+        data = [{"index": i, "embedding": fake_embedding(t, self.config.dim, body.get("dimensions"))} for i, t in enumerate(texts)]
+        tokens = sum(max(1, len(t.encode("utf-8")) // 4) for t in texts)
+        return web.json_response({"data": data, "usage": {"prompt_tokens": tokens, "total_tokens": tokens}})
+
+    async def chat(self, request: web.Request) -> web.StreamResponse:
+        self.calls["chat"] += 1
+        body = await request.json()
+        throttled = self._throttled()
+        if throttled is not None:
+            await self._sleep(self.config.embed_ms)
+            return throttled
+        prompt_tokens = sum(max(1, len((m.get("content") or "").encode("utf-8")) // 4) for m in body["messages"])
+        usage = {"prompt_tokens": prompt_tokens, "completion_tokens": self.config.answer_tokens}
+        blocked = self._rng.random() < self.config.filter_rate
+        words = [f"단계{i % 7}" for i in range(self.config.answer_tokens)]
+        if not body.get("stream"):
+            await self._sleep(self.config.chat_ms)
+            if blocked:
+                self.calls["content_filter"] += 1
+                return web.json_response({"error": {"code": "content_filter", "message": "filtered",
+                                                    "innererror": {"code": "ResponsibleAIPolicyViolation"}}}, status=400)
+            return web.json_response({"choices": [{"message": {"role": "assistant", "content": " ".join(words)},
+                                                   "finish_reason": "stop"}], "usage": usage})
+        resp = web.StreamResponse(headers={"content-type": "text/event-stream"})
+        await resp.prepare(request)
+        per_token = self.config.chat_ms / max(1, len(words))
+        for i, w in enumerate(words):
+            await self._sleep(per_token)
+            if blocked and i == len(words) // 2:
+                # output filter cuts the stream mid-answer
+                self.calls["content_filter"] += 1
+                await resp.write(b"data: " + json.dumps({"choices": [{"delta": {}, "finish_reason": "content_filter"}]}).encode() + b"\n\n")
+                break
+            chunk = {"choices": [{"delta": {"content": w + " "}}]}
+            await resp.write(b"data: " + json.dumps(chunk, ensure_ascii=False).encode("utf-8") + b"\n\n")
+        else:
+            await resp.write(b"data: " + json.dumps({"choices": [], "usage": usage}).encode() + b"\n\n")
+        await resp.write(b"data: [DONE]\n\n")
+        return resp
+
+    # ---------- Azure AI Search ----------
+    @staticmethod
+    def _name(request: web.Request) -> str:
+        return request.match_info["name"].strip("()'")
+
+    def _compression(self, name: str) -> str:
+        compressions = (self.definitions.get(name, {}).get("vectorSearch") or {}).get("compressions") or []
+        return compressions[0]["kind"] if compressions else "none"
+
+    def _index(self, request: web.Request) -> LocalSearchIndex:
+        name = self._name(request)
+        if name not in self.indexes:
+            # scalar quantisation is mirrored with the local int8 store; binary is searched at full precision
+            quant = "int8" if self._compression(name) == "scalarQuantization" else "float32"
+            self.indexes[name] = LocalSearchIndex(os.path.join(self.index_dir, name), quant=quant)
+        return self.indexes[name]
+
+    async def put_index(self, request: web.Request) -> web.Response:
+        name = self._name(request)
+        body = await request.json()
+        created = name not in self.definitions
+        self.definitions[name] = body
+        return web.json_response(body, status=201 if created else 200)
+
+    async def get_index(self, request: web.Request) -> web.Response:
+        name = self._name(request)
+        if name not in self.definitions:
+            return web.json_response({"error": {"code": "ResourceNotFound", "message": f"index {name} not found"}}, status=404)
+        return web.json_response(self.definitions[name])
+
+    async def delete_index(self, request: web.Request) -> web.Response:
+        name = self._name(request)
+        self.definitions.pop(name, None)
+        index = self.indexes.pop(name, None)
+        if index is not None:
+            await index.close()
+        return web.Response(status=204)
+
+    async def list_indexes(self, request: web.Request) -> web.Response:
+        return web.json_response({"value": [{"name": n, **d} for n, d in self.definitions.items()]})
+
+    async def index_stats(self, request: web.Request) -> web.Response:
+        index = self._index(request)
+        count = await index.get_document_count()
+        path = index.path
+        storage = sum(os.path.getsize(os.path.join(path, f)) for f in os.listdir(path)) if os.path.isdir(path) else 0
+        vector_bytes = count * (index.dim or 0) * _VECTOR_BYTES.get(self._compression(self._name(request)), 4.0)
+        return web.json_response({"documentCount": count, "storageSize": storage, "vectorIndexSize": int(vector_bytes)})
+
+    async def search(self, request: web.Request) -> web.Response:
+        self.calls["search"] += 1
+        body = await request.json()
+        await self._sleep(self.config.search_ms)
+        vqs = [VectorizedQuery(vector=v["vector"], k_nearest_neighbors=v.get("k"), fields=v.get("fields"), exhaustive=v.get("exhaustive"))
+               for v in body.get("vectorQueries") or []]
+        select = body.get("select")
+        results = await self._index(request).search(body.get("search"), top=body.get("top"), vector_queries=vqs or None,
+                                          filter=body.get("filter"), select=select.split(",") if select else None)
+        resp = web.json_response({"value": [d async for d in results]})
+        self.calls["search_bytes"] += len(resp.body)
+        return resp
+
+    async def index_docs(self, request: web.Request) -> web.Response:
+        self.calls["index"] += 1
+        body = await request.json()
+        await self._sleep(self.config.search_ms)
+        uploads = [{k: v for k, v in d.items() if k != "@search.action"} for d in body["value"] if d.get("@search.action") != "delete"]
+        deletes = [{"id": d["id"]} for d in body["value"] if d.get("@search.action") == "delete"]
+        if uploads:
+            await self._index(request).upload_documents(uploads)
+        if deletes:
+            await self._index(request).delete_documents(deletes)
+        return web.json_response({"value": [{"key": d.get("id"), "status": True, "errorMessage": None, "statusCode": 200}
+                                            for d in body["value"]]})
+
+    async def count(self, request: web.Request) -> web.Response:
+        return web.Response(text=str(await self._index(request).get_document_count()))
+
+    # ---------- Bing ----------
+    async def bing(self, request: web.Request) -> web.Response:
+        self.calls["bing"] += 1
+        await self._sleep(self.config.bing_ms)
+        q = request.query.get("q", "")
+        return web.json_response({"webPages": {"value": [
+            {"name": f"{q} 대응 가이드 {i}", "url": f"https://docs.example.com/{i}", "snippet": q} for i in range(3)]}})
+
+    # ---------- lifecycle ----------
+    def _app(self) -> web.Application:
+        app = web.Application(client_max_size=256 * 1024 ** 2)
+        app.router.add_post("/openai/deployments/{deployment}/embeddings", self.embeddings)
+        app.router.add_post("/openai/deployments/{deployment}/chat/completions", self.chat)
+        app.router.add_post("/indexes{name}/docs/search.post.search", self.search)
+        app.router.add_post("/indexes{name}/docs/search.index", self.index_docs)
+        app.router.add_get("/indexes{name}/docs/$count", self.count)
+        app.router.add_get("/indexes{name}/search.stats", self.index_stats)
+        app.router.add_put("/indexes{name}", self.put_index)
+        app.router.add_get("/indexes{name}", self.get_index)
+        app.router.add_delete("/indexes{name}", self.delete_index)
+        app.router.add_get("/indexes", self.list_indexes)
+        app.router.add_get("/bing", self.bing)
+        return app
+
+    def start(self) -> str:
+        ready = threading.Event()
+
+        def run() -> None:
+            self._loop = asyncio.new_event_loop()
+            self._runner = web.AppRunner(self._app(), access_log=None)
+            self._loop.run_until_complete(self._runner.setup())
+            site = web.TCPSite(self._runner, "127.0.0.1", 0)
+            self._loop.run_until_complete(site.start())
+            port = site._server.sockets[0].getsockname()[1]
+            self.base_url = f"http://127.0.0.1:{port}"
+            ready.set()
+            self._loop.run_forever()
+            self._loop.run_until_complete(self._runner.cleanup())
+            self._loop.close()
+
+        self._thread = threading.Thread(target=run, name="fake-azure", daemon=True)
+        self._thread.start()
+        ready.wait()
+        return self.base_url
+
+    def stop(self) -> None:
+        if self._loop is not None:
+            self._loop.call_soon_threadsafe(self._loop.stop)
+            self._thread.join(timeout=10)
+
+    def index_client(self, key: str = "fake") -> SearchIndexClient:
+        # SearchIndexClient refuses http:// endpoints: build it for https, then retarget its pipeline
+        client = SearchIndexClient("https://fake.search.windows.net", AzureKeyCredential(key))
+        client._client._config.endpoint = self.base_url
+        return client
+
+    def stats(self) -> Dict[str, int]:
+        return dict(self.calls)
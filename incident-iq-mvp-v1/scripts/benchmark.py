@@ -0,0 +1,197 @@
+"""
+Offline benchmark: ingestion, rag_search and generate_incident_response against local fakes.
+
+    python scripts/benchmark.py --incidents 200 --concurrency 1,8,32 --corpus-multiplier 20
+
+No Azure resources are used: scripts/bench_fakes.py serves Azure OpenAI / AI Search / Bing
+on 127.0.0.1 with configurable latency, 429 and content-filter injection. A corpus is generated
+from data/runbooks (each runbook copied --corpus-multiplier times with varied titles/services).
+Results (p50/p95/p99, throughput, ingestion docs/s) are printed and written to JSON
+(default bench_results/<timestamp>.json) so runs can be compared over time.
+"""
+import argparse, asyncio, datetime, json, os, random, statistics, subprocess, sys, tempfile, time
+from collections import Counter
+from pathlib import Path
+
+PROJECT_ROOT = str(Path(__file__).resolve().parents[1])
+if PROJECT_ROOT not in sys.path:
+    sys.path.insert(0, PROJECT_ROOT)
+
+from bench_fakes import FakeAzure, FakeConfig
+
+SERVICES = ["결제", "회원/인증", "검색", "주문", "메시징", "Kafka 클러스터", "Redis"]
+
+def percentiles(samples):
+    if not samples:
+        return {"n": 0}
+    xs = sorted(samples)
+
+    def pct(p):
+        return xs[min(len(xs) - 1, int(round(p / 100.0 * (len(xs) - 1))))]
+    return {"n": len(xs), "mean_ms": round(statistics.fmean(xs), 2), "p50_ms": round(pct(50), 2),
+            "p95_ms": round(pct(95), 2), "p99_ms": round(pct(99), 2), "max_ms": round(xs[-1], 2)}
+
+def build_corpus(src_dir, dst_dir, multiplier):
+    """Copy every runbook `multiplier` times; copies get a suffixed title and a rotated service header."""
+    files = sorted(Path(src_dir).glob("*.md"))
+    n = 0
+    for copy in range(multiplier):
+        for fp in files:
+            text = fp.read_text(encoding="utf-8")
+            if copy:
+                lines = text.splitlines()
+                for i, line in enumerate(lines):
+                    if line.startswith("# "):
+                        lines[i] = f"{line} (변형 {copy})"
+                    elif line.startswith("서비스:"):
+                        lines[i] = f"서비스: {SERVICES[(copy + i) % len(SERVICES)]}"
+                text = "\n".join(lines)
+            (Path(dst_dir) / f"{fp.stem}_{copy:03d}.md").write_text(text, encoding="utf-8")
+            n += 1
+    return n
+
+def sample_incidents(src_dir, n, seed):
+    # incident texts from runbook titles / first situation lines, so retrieval has something to find
+    rng = random.Random(seed)
+    pool = []
+    for fp in sorted(Path(src_dir).glob("*.md")):
+        lines = [l.strip() for l in fp.read_text(encoding="utf-8").splitlines() if l.strip()]
+        title = lines[0].lstrip("# ").split(" ", 1)[-1] if lines else fp.stem
+        service = next((l.split(":", 1)[1].strip() for l in lines if l.startswith("서비스:")), "")
+        pool.append({"symptom": title, "service": service, "extra": ""})
+    pool.append({"symptom": "알 수 없는 외부 연동 오류 급증", "service": "미등록 서비스", "extra": ""})  # retrieval miss
+    return [rng.choice(pool) for _ in range(n)]
+
+def configure(env):
+    """Point the app at the fakes (even if a developer .env was loaded with override=True); returns the upload config."""
+    import app.azure_clients as azure_clients
+    import upload_runbooks
+    os.environ.update(env)
+    azure_clients.reset_settings()
+    return upload_runbooks.load_config(azure_clients.get_settings())
+
+async def bench_search(incidents):
+    from app.azure_clients import get_settings
+    from app.http_clients import aclose_clients
+    from app.rag_pipeline import rag_search
+    settings = get_settings()
+    lat = []
+    for ev in incidents:
+        t = time.perf_counter()
+        await rag_search(ev["symptom"], ev["service"], ev["extra"], settings)
+        lat.append((time.perf_counter() - t) * 1000)
+    await aclose_clients()
+    return percentiles(lat)
+
+async def bench_generate(incidents, concurrency):
+    from app.http_clients import aclose_clients
+    from app.rag_pipeline import generate_incident_response
+    sem = asyncio.Semaphore(concurrency)
+    lat, reasons, stages = [], Counter(), {}
+
+    async def one(ev):
+        async with sem:
+            t = time.perf_counter()
+            try:
+                res = await generate_incident_response(ev["symptom"], ev["service"], ev["extra"])
+                reasons[res["reason"]] += 1
+                for stage, ms in res["trace"]["stages_ms"].items():
+                    stages.setdefault(stage, []).append(ms)
+            except Exception as e:
+                reasons[f"error:{type(e).__name__}"] += 1
+            lat.append((time.perf_counter() - t) * 1000)
+
+    t0 = time.perf_counter()
+    await asyncio.gather(*(one(ev) for ev in incidents))
+    wall = time.perf_counter() - t0
+    await aclose_clients()
+    return {"concurrency": concurrency, "latency": percentiles(lat), "throughput_rps": round(len(incidents) / wall, 2),
+            "wall_s": round(wall, 3), "reasons": dict(reasons), "stages": {k: percentiles(v) for k, v in stages.items()}}
+
+def git_rev():
+    try:
+        return subprocess.check_output(["git", "rev-parse", "--short", "HEAD"], cwd=PROJECT_ROOT, text=True).strip()
+    except Exception:
+        return None
+
+def main():
+    ap = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    ap.add_argument("--incidents", type=int, default=100)
+    ap.add_argument("--concurrency", default="1,8,32", help="comma-separated levels for generate_incident_response")
+    ap.add_argument("--search-queries", type=int, default=50)
+    ap.add_argument("--corpus-multiplier", type=int, default=4)
+    ap.add_argument("--backend", choices=["azure", "local"], default="azure",
+                    help="azure: aio SearchClient against the fake REST endpoint; local: in-process index")
+    ap.add_argument("--two-phase", action="store_true", help="SEARCH_TWO_PHASE: rank on ids/titles, fetch content for the final k")
+    ap.add_argument("--embed-ms", type=float, default=40.0)
+    ap.add_argument("--chat-ms", type=float, default=600.0)
+    ap.add_argument("--search-ms", type=float, default=30.0)
+    ap.add_argument("--bing-ms", type=float, default=250.0)
+    ap.add_argument("--throttle-rate", type=float, default=0.0)
+    ap.add_argument("--filter-rate", type=float, default=0.0)
+    ap.add_argument("--dim", type=int, default=1536)
+    ap.add_argument("--warm-caches", action="store_true", help="keep embedding/answer caches on (off by default)")
+    ap.add_argument("--seed", type=int, default=7)
+    ap.add_argument("--out", default=None)
+    args = ap.parse_args()
+
+    cfg = FakeConfig(dim=args.dim, embed_ms=args.embed_ms, chat_ms=args.chat_ms, search_ms=args.search_ms,
+                     bing_ms=args.bing_ms, throttle_rate=args.throttle_rate, filter_rate=args.filter_rate, seed=args.seed)
+    work = tempfile.mkdtemp(prefix="incident-iq-bench-")
+    corpus_dir = os.path.join(work, "runbooks")
+    os.makedirs(corpus_dir)
+    n_files = build_corpus(os.path.join(PROJECT_ROOT, "data", "runbooks"), corpus_dir, args.corpus_multiplier)
+
+    fake = FakeAzure(cfg, index_dir=os.path.join(work, "fake-index"))
+    base = fake.start()
+    env = {
+        "AZURE_OPENAI_ENDPOINT": base, "AZURE_OPENAI_API_KEY": "bench", "AZURE_OPENAI_DEPLOYMENT": "embed",
+        "AZURE_OPENAI_CHAT_DEPLOYMENT": "chat", "AZURE_SEARCH_ENDPOINT": base, "AZURE_SEARCH_API_KEY": "bench",
+        "AZURE_SEARCH_INDEX": "bench", "BING_SEARCH_ENDPOINT": f"{base}/bing", "BING_SEARCH_API_KEY": "bench",
+        "SEARCH_BACKEND": args.backend, "LOCAL_INDEX_DIR": os.path.join(work, "local-index"),
+        "DATA_DIR": corpus_dir, "INGEST_MANIFEST": os.path.join(work, "manifest.json"),
+        "EMBEDDING_DIM": str(args.dim), "RETRY_MAX_WAIT": "2", "HTTP2": "false",
+    }
+    if args.two_phase:
+        env["SEARCH_TWO_PHASE"] = "true"
+    if not args.warm_caches:
+        env.update({"EMBED_CACHE_SIZE": "0", "ANSWER_CACHE_SIZE": "0", "WEB_CACHE_SIZE": "0"})
+    upload_cfg = configure(env)
+    import upload_runbooks
+    from app.retry_policy import retry_stats
+
+    results = {"timestamp": datetime.datetime.utcnow().isoformat() + "Z", "git_rev": git_rev(), "config": vars(args)}
+    try:
+        t = time.perf_counter()
+        upload_runbooks.main(upload_cfg, full=True)
+        ingest_s = time.perf_counter() - t
+        with open(env["INGEST_MANIFEST"], encoding="utf-8") as f:
+            n_docs = sum(len(e["ids"]) for e in json.load(f).values())
+        results["ingest"] = {"files": n_files, "documents": n_docs, "seconds": round(ingest_s, 3),
+                             "docs_per_s": round(n_docs / ingest_s, 1)}
+
+        results["rag_search"] = asyncio.run(bench_search(sample_incidents(corpus_dir, args.search_queries, args.seed)))
+        incidents = sample_incidents(corpus_dir, args.incidents, args.seed + 1)
+        results["generate"] = [asyncio.run(bench_generate(incidents, int(c))) for c in args.concurrency.split(",") if c.strip()]
+        results["retry_stats"] = retry_stats()
+        results["fake_calls"] = fake.stats()
+    finally:
+        fake.stop()
+
+    out = args.out or os.path.join(PROJECT_ROOT, "bench_results", datetime.datetime.utcnow().strftime("%Y%m%d-%H%M%S") + ".json")
+    os.makedirs(os.path.dirname(os.path.abspath(out)), exist_ok=True)
+    with open(out, "w", encoding="utf-8") as f:
+        json.dump(results, f, ensure_ascii=False, indent=2)
+
+    ing = results["ingest"]
+    print(f"\ningest: {ing['documents']} docs from {ing['files']} files in {ing['seconds']}s ({ing['docs_per_s']} docs/s)")
+    rs = results["rag_search"]
+    print(f"rag_search: p50 {rs['p50_ms']}ms p95 {rs['p95_ms']}ms p99 {rs['p99_ms']}ms")
+    for g in results["generate"]:
+        lat = g["latency"]
+        print(f"generate c={g['concurrency']}: p50 {lat['p50_ms']}ms p95 {lat['p95_ms']}ms p99 {lat['p99_ms']}ms "
+              f"{g['throughput_rps']} req/s reasons={g['reasons']}")
+    print(f"results: {out}")
+
+if __name__ == "__main__":
+    main()
@@ -1,92 +1,155 @@
 """
 Create Azure AI Search index with vector + semantic (SDK 11.6.0b12)
+
+Vector size follows EMBEDDING_DIMENSIONS (reduced text-embedding-3 vectors) or EMBEDDING_DIM.
+VECTOR_COMPRESSION=scalar|binary quantises the vector index; original vectors are kept and the
+top VECTOR_OVERSAMPLING x k candidates are rescored with them.
+
+Settings are read when an index is built, not at import: reindex.py and migrate_embeddings.py
+import this module and load the .env themselves (app.bootstrap.load_env).
 """
-import os
-from dotenv import load_dotenv, find_dotenv
+import os, sys
+from pathlib import Path
 from azure.core.exceptions import HttpResponseError
 from azure.core.credentials import AzureKeyCredential
 from azure.search.documents.indexes import SearchIndexClient
 from azure.search.documents.indexes.models import (
     SearchIndex, SearchField, SimpleField, SearchableField, ComplexField,
     SearchFieldDataType, VectorSearch, VectorSearchAlgorithmConfiguration,
-    HnswAlgorithmConfiguration, SemanticConfiguration,
-    InputFieldMappingEntry, OutputFieldMappingEntry, 
+    HnswAlgorithmConfiguration, HnswParameters, SemanticConfiguration,
+    SemanticSearch, SemanticPrioritizedFields, SemanticField,
+    ScalarQuantizationCompression, BinaryQuantizationCompression, RescoringOptions,
+    InputFieldMappingEntry, OutputFieldMappingEntry,
     VectorSearchProfile
 )
 
-dotenv_path = find_dotenv()
-if dotenv_path:
-    # override=True ensures .env values replace any existing shell placeholders
-    load_dotenv(dotenv_path, override=True)
-    print(f"Loaded .env from: {dotenv_path} (overriding shell environment variables)")
-else:
-    print("No .env file found; relying on environment variables.")
-
-SEARCH_ENDPOINT = os.environ["AZURE_SEARCH_ENDPOINT"]
-SEARCH_KEY = os.environ["AZURE_SEARCH_API_KEY"]
-# If AZURE_SEARCH_INDEX is not provided, auto-generate a new index name to avoid
-# attempting to change an existing index's field definitions.
-env_index = os.getenv("AZURE_SEARCH_INDEX")
-EMBEDDING_DIM = int(os.getenv("EMBEDDING_DIM", os.getenv("AZURE_OPENAI_EMBEDDING_DIM", "1536")))
-
-if env_index:
-    INDEX_NAME = env_index
-else:
-    from datetime import datetime
-    ts = datetime.utcnow().strftime("%Y%m%d-%H%M%S")
-    INDEX_NAME = f"incident-runbooks-v{EMBEDDING_DIM}-{ts}"
-
-index_client = SearchIndexClient(SEARCH_ENDPOINT, AzureKeyCredential(SEARCH_KEY))
-
-# Vector search configuration
-vector_search = VectorSearch(
-    algorithms=[
-        HnswAlgorithmConfiguration(name="hnsw")
-    ],
-    profiles=[
-        VectorSearchProfile(name="vprofile", algorithm_configuration_name="hnsw")
-    ]
-)
+PROJECT_ROOT = str(Path(__file__).resolve().parents[1])
+if PROJECT_ROOT not in sys.path:
+    sys.path.insert(0, PROJECT_ROOT)
 
+def embedding_dim():
+    return int(os.getenv("EMBEDDING_DIMENSIONS", "0") or 0) or \
+        int(os.getenv("EMBEDDING_DIM", os.getenv("AZURE_OPENAI_EMBEDDING_DIM", "1536")))
 
+def vector_compression():
+    # none | scalar (int8, ~4x smaller) | binary (1 bit, ~32x smaller)
+    return os.getenv("VECTOR_COMPRESSION", "none").lower()
 
-fields = [
-    SimpleField(name="id", type=SearchFieldDataType.String, key=True, filterable=True, sortable=True),
-    SearchableField(name="title", type=SearchFieldDataType.String, sortable=True, filterable=True, analyzer_name="ko.lucene"),
-    SearchableField(name="content", type=SearchFieldDataType.String, analyzer_name="ko.lucene"),
-    SearchableField(name="service", type=SearchFieldDataType.String, filterable=True, facetable=True),
-    SimpleField(name="severity", type=SearchFieldDataType.String, filterable=True, facetable=True),
-    SearchableField(name="impact", type=SearchFieldDataType.String),
-    SearchableField(name="actions", type=SearchFieldDataType.String),
-    SimpleField(name="createdAt", type=SearchFieldDataType.DateTimeOffset, filterable=True, sortable=True),
-    # vector field (1536 or 3072 depending on the embedding model)
-    SearchField(name="contentVector", type=SearchFieldDataType.Collection(SearchFieldDataType.Single),
-                searchable=True, vector_search_dimensions=EMBEDDING_DIM, vector_search_profile_name="vprofile")
-]
-
-index = SearchIndex(
-    name=INDEX_NAME,
-    fields=fields,
-    vector_search=vector_search
-)
+def vector_oversampling():
+    return float(os.getenv("VECTOR_OVERSAMPLING", "4"))
 
-print(f"Creating or updating index: {INDEX_NAME}")
-try:
-    created = index_client.create_or_update_index(index)
-    print(f"Done. Created index: {getattr(created, 'name', INDEX_NAME)}")
-except HttpResponseError as ex:
-    # If the error indicates an existing field cannot be changed, create a new index name
-    msg = str(ex)
-    if 'CannotChangeExistingField' in msg or 'Existing field' in msg:
-        from datetime import datetime
-        # use a lowercase, dash-separated timestamp to satisfy Azure index name rules
-        ts = datetime.utcnow().strftime("%Y%m%d-%H%M%S")
-        # ensure lowercase and allowed characters only
-        base = INDEX_NAME.lower()
-        new_name = f"{base}-v{EMBEDDING_DIM}-{ts}"
-        print(f"Index update failed because existing fields cannot be changed. Creating a new index: {new_name}")
-        index.name = new_name
+def _hnsw_parameters():
+    # HNSW graph parameters (service defaults); build indexes with different values and compare them
+    # with scripts/eval_retrieval.py --indexes
+    return HnswParameters(m=int(os.getenv("HNSW_M", "4")), ef_construction=int(os.getenv("HNSW_EF_CONSTRUCTION", "400")),
+                          ef_search=int(os.getenv("HNSW_EF_SEARCH", "500")), metric="cosine")
+
+def _compressions(compression, oversampling):
+    if compression == "none":
+        return []
+    # originals stay in the index so the oversampled candidates are rescored at full precision
+    rescoring = RescoringOptions(enable_rescoring=True, default_oversampling=oversampling,
+                                 rescore_storage_method="preserveOriginals")
+    if compression == "scalar":
+        return [ScalarQuantizationCompression(compression_name="vcompression", rescoring_options=rescoring)]
+    if compression == "binary":
+        return [BinaryQuantizationCompression(compression_name="vcompression", rescoring_options=rescoring)]
+    raise ValueError(f"VECTOR_COMPRESSION must be none, scalar or binary: {compression}")
+
+def build_index(name, dim=None, compression=None, oversampling=None):
+    dim = dim or embedding_dim()
+    compressions = _compressions(compression or vector_compression(),
+                                 vector_oversampling() if oversampling is None else oversampling)
+    # Vector search configuration
+    vector_search = VectorSearch(
+        algorithms=[
+            HnswAlgorithmConfiguration(name="hnsw", parameters=_hnsw_parameters())
+        ],
+        profiles=[
+            VectorSearchProfile(name="vprofile", algorithm_configuration_name="hnsw",
+                                compression_name="vcompression" if compressions else None)
+        ],
+        compressions=compressions or None,
+    )
+
+    # Semantic ranker configuration used by SEARCH_MODE=semantic
+    semantic_search = SemanticSearch(configurations=[
+        SemanticConfiguration(name=os.getenv("SEARCH_SEMANTIC_CONFIG", "default-semantic-config"), prioritized_fields=SemanticPrioritizedFields(
+            title_field=SemanticField(field_name="title"),
+            content_fields=[SemanticField(field_name="content"), SemanticField(field_name="actions")],
+            keywords_fields=[SemanticField(field_name="service")],
+        ))
+    ])
+
+    fields = [
+        SimpleField(name="id", type=SearchFieldDataType.String, key=True, filterable=True, sortable=True),
+        # section-level chunks: parentId groups the chunks of one runbook, section names the heading
+        SimpleField(name="parentId", type=SearchFieldDataType.String, filterable=True, facetable=True),
+        SimpleField(name="section", type=SearchFieldDataType.String, filterable=True, facetable=True),
+        SearchableField(name="title", type=SearchFieldDataType.String, sortable=True, filterable=True, analyzer_name="ko.lucene"),
+        SearchableField(name="content", type=SearchFieldDataType.String, analyzer_name="ko.lucene"),
+        SearchableField(name="service", type=SearchFieldDataType.String, filterable=True, facetable=True),
+        SimpleField(name="severity", type=SearchFieldDataType.String, filterable=True, facetable=True),
+        SearchableField(name="impact", type=SearchFieldDataType.String),
+        SearchableField(name="actions", type=SearchFieldDataType.String),
+        SimpleField(name="createdAt", type=SearchFieldDataType.DateTimeOffset, filterable=True, sortable=True),
+        # vector field (1536 or 3072 depending on the embedding model, less with EMBEDDING_DIMENSIONS)
+        SearchField(name="contentVector", type=SearchFieldDataType.Collection(SearchFieldDataType.Single),
+                    searchable=True, vector_search_dimensions=dim, vector_search_profile_name="vprofile")
+    ]
+
+    return SearchIndex(
+        name=name,
+        fields=fields,
+        vector_search=vector_search,
+        semantic_search=semantic_search
+    )
+
+def create_index(index_client, index, dim=None):
+    """Create or update `index`; returns the name actually created."""
+    print(f"Creating or updating index: {index.name}")
+    try:
         created = index_client.create_or_update_index(index)
-        print(f"Done. Created new index: {getattr(created, 'name', new_name)}")
-    else:
+        print(f"Done. Created index: {getattr(created, 'name', index.name)}")
+        return getattr(created, "name", index.name)
+    except HttpResponseError as ex:
+        # If the error indicates an existing field cannot be changed, create a new index name
+        msg = str(ex)
+        if 'CannotChangeExistingField' in msg or 'Existing field' in msg:
+            from datetime import datetime
+            # use a lowercase, dash-separated timestamp to satisfy Azure index name rules
+            ts = datetime.utcnow().strftime("%Y%m%d-%H%M%S")
+            # ensure lowercase and allowed characters only
+            base = index.name.lower()
+            new_name = f"{base}-v{dim or embedding_dim()}-{ts}"
+            print(f"Index update failed because existing fields cannot be changed. Creating a new index: {new_name}")
+            index.name = new_name
+            created = index_client.create_or_update_index(index)
+            print(f"Done. Created new index: {getattr(created, 'name', new_name)}")
+            return getattr(created, "name", new_name)
         raise
+
+def main():
+    from app.bootstrap import load_env
+    dotenv_path = load_env()
+    if dotenv_path:
+        print(f"Loaded .env from: {dotenv_path} (overriding shell environment variables)")
+    else:
+        print("No .env file found; relying on environment variables.")
+    SEARCH_ENDPOINT = os.environ["AZURE_SEARCH_ENDPOINT"]
+    SEARCH_KEY = os.environ["AZURE_SEARCH_API_KEY"]
+    # If AZURE_SEARCH_INDEX is not provided, auto-generate a new index name to avoid
+    # attempting to change an existing index's field definitions.
+    env_index = os.getenv("AZURE_SEARCH_INDEX")
+    if env_index:
+        INDEX_NAME = env_index
+    else:
+        from datetime import datetime
+        ts = datetime.utcnow().strftime("%Y%m%d-%H%M%S")
+        INDEX_NAME = f"incident-runbooks-v{embedding_dim()}-{ts}"
+
+    index_client = SearchIndexClient(SEARCH_ENDPOINT, AzureKeyCredential(SEARCH_KEY))
+    create_index(index_client, build_index(INDEX_NAME))
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,184 @@
+"""
+Retrieval quality vs. latency across search configurations.
+
+    python scripts/eval_retrieval.py --modes hybrid,keyword,vector,semantic --top 5,8 --knn 4,8,16
+    python scripts/eval_retrieval.py --offline          # against local fakes (scripts/bench_fakes.py)
+
+Runs the labelled queries in data/eval/retrieval_queries.jsonl ({"query", "service", "relevant":
+[runbook file names]}) through the app's own _rag_search for every combination of SEARCH_MODE,
+SEARCH_TOP, SEARCH_KNN (and optionally exhaustive kNN, several Azure indexes built with different
+HNSW parameters, or LOCAL_HNSW_EF values), and reports recall@k, MRR and search latency.
+Query embeddings are computed once up front, so latencies compare the search step only.
+
+With --target-recall the cheapest configuration (lowest p95) meeting recall@--at is recommended.
+"""
+import argparse, asyncio, itertools, json, os, re, statistics, sys, tempfile, time
+from pathlib import Path
+
+PROJECT_ROOT = str(Path(__file__).resolve().parents[1])
+if PROJECT_ROOT not in sys.path:
+    sys.path.insert(0, PROJECT_ROOT)
+
+_RUNBOOK_NO = re.compile(r"RUNBOOK-(\d+)")
+
+def load_queries(path):
+    with open(path, encoding="utf-8") as f:
+        return [json.loads(line) for line in f if line.strip()]
+
+def runbook_resolver(data_dir):
+    """Map a hit to its runbook file name: via parentId, falling back to the RUNBOOK-NN title."""
+    from app.ingest import parent_id
+    by_parent = {parent_id(p.name): p.name for p in Path(data_dir).glob("*.md")}
+
+    def resolve(hit):
+        if hit.get("parentId") in by_parent:
+            return by_parent[hit["parentId"]]
+        m = _RUNBOOK_NO.search(hit.get("title") or "")
+        return f"runbook_{int(m.group(1)):02d}.md" if m else None
+    return resolve
+
+def score_query(ranked, relevant, ks):
+    rel = set(relevant)
+    out = {f"recall@{k}": len(rel & set(ranked[:k])) / len(rel) for k in ks}
+    first = next((i for i, rb in enumerate(ranked) if rb in rel), None)
+    out["rr"] = 0.0 if first is None else 1.0 / (first + 1)
+    return out
+
+def pct(xs, p):
+    xs = sorted(xs)
+    return xs[min(len(xs) - 1, int(round(p / 100.0 * (len(xs) - 1))))] if xs else None
+
+async def evaluate(configs, queries, resolve, ks, repeat):
+    from app.rag_pipeline import _rag_search, aembed, query_text
+    from app.http_clients import aclose_clients
+    base = configs[0][1]
+    # one batched embedding call; every configuration reuses the same query vectors
+    qvecs = await aembed([query_text(q["query"], q.get("service", ""), "") for q in queries], base)
+    rows = []
+    for label, settings in configs:
+        lat, per_query, error = [], [], None
+        try:
+            for _ in range(repeat):
+                per_query = []
+                for q, qvec in zip(queries, qvecs):
+                    t = time.perf_counter()
+                    hits, _, _ = await _rag_search(q["query"], q.get("service", ""), "", settings, qvec)
+                    lat.append((time.perf_counter() - t) * 1000)
+                    per_query.append(score_query([resolve(h) for h in hits], q["relevant"], ks))
+        except Exception as e:
+            # e.g. semantic mode without a semantic configuration / tier
+            error = f"{type(e).__name__}: {e}"[:200]
+        row = {"config": label, "error": error}
+        if per_query and not error:
+            for key in per_query[0]:
+                row["mrr" if key == "rr" else key] = round(statistics.fmean(r[key] for r in per_query), 4)
+            row.update({"p50_ms": round(pct(lat, 50), 2), "p95_ms": round(pct(lat, 95), 2), "mean_ms": round(statistics.fmean(lat), 2)})
+        rows.append(row)
+    await aclose_clients()
+    return rows
+
+def build_configs(base, args):
+    modes = [m.strip() for m in args.modes.split(",") if m.strip()]
+    tops = [int(x) for x in args.top.split(",")]
+    knns = [int(x) for x in args.knn.split(",")]
+    exhaustive = [False, True] if args.exhaustive else [False]
+    indexes = [x for x in (args.indexes or "").split(",") if x] or [None]
+    efs = [int(x) for x in (args.local_ef or "").split(",") if x] or [None]
+    configs, seen = [], set()
+    for mode, top, knn, exh, index, ef in itertools.product(modes, tops, knns, exhaustive, indexes, efs):
+        uses_vector = mode in ("hybrid", "vector")
+        if not uses_vector:
+            # keyword / semantic ignore the vector parameters
+            knn, exh, ef = None, False, None
+        update = {"SEARCH_MODE": mode, "SEARCH_TOP": top, "SEARCH_EXHAUSTIVE": exh}
+        parts = [mode, f"top={top}"]
+        if knn is not None:
+            update["SEARCH_KNN"] = knn
+            parts.append(f"k={knn}")
+        if exh:
+            parts.append("exhaustive")
+        if index:
+            update["AZURE_SEARCH_INDEX"] = index
+            parts.append(f"index={index}")
+        if ef is not None:
+            update["LOCAL_HNSW_EF"] = ef
+            parts.append(f"ef={ef}")
+        label = " ".join(parts)
+        if label not in seen:
+            seen.add(label)
+            configs.append((label, base.model_copy(update=update)))
+    return configs
+
+def start_offline(data_dir):
+    """Index data_dir into the local fakes (no latency) and point the app at them."""
+    from bench_fakes import FakeAzure, FakeConfig
+    from benchmark import configure
+    work = tempfile.mkdtemp(prefix="incident-iq-eval-")
+    fake = FakeAzure(FakeConfig(embed_ms=0, chat_ms=0, search_ms=0, bing_ms=0, jitter=0), index_dir=os.path.join(work, "index"))
+    base = fake.start()
+    env = {
+        "AZURE_OPENAI_ENDPOINT": base, "AZURE_OPENAI_API_KEY": "eval", "AZURE_OPENAI_DEPLOYMENT": "embed",
+        "AZURE_OPENAI_CHAT_DEPLOYMENT": "chat", "AZURE_SEARCH_ENDPOINT": base, "AZURE_SEARCH_API_KEY": "eval",
+        "AZURE_SEARCH_INDEX": "eval", "BING_SEARCH_ENDPOINT": "", "BING_SEARCH_API_KEY": "",
+        "SEARCH_BACKEND": "azure", "LOCAL_INDEX_DIR": os.path.join(work, "local-index"), "DATA_DIR": data_dir,
+        "INGEST_MANIFEST": os.path.join(work, "manifest.json"), "EMBEDDING_DIM": "1536", "HTTP2": "false",
+    }
+    import upload_runbooks
+    upload_runbooks.main(configure(env), full=True)
+    return fake
+
+def main():
+    ap = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    ap.add_argument("--queries", default=os.path.join(PROJECT_ROOT, "data", "eval", "retrieval_queries.jsonl"))
+    ap.add_argument("--data-dir", default=os.path.join(PROJECT_ROOT, "data", "runbooks"))
+    ap.add_argument("--modes", default="hybrid,keyword,vector,semantic")
+    ap.add_argument("--top", default="5,8")
+    ap.add_argument("--knn", default="4,8,16")
+    ap.add_argument("--exhaustive", action="store_true", help="also run exact kNN variants (HNSW recall baseline)")
+    ap.add_argument("--indexes", help="comma-separated Azure index names, e.g. built with different HNSW_M / HNSW_EF_*")
+    ap.add_argument("--local-ef", help="comma-separated LOCAL_HNSW_EF values (SEARCH_BACKEND=local)")
+    ap.add_argument("--ks", default="1,3,5")
+    ap.add_argument("--repeat", type=int, default=1, help="passes per configuration (latency samples)")
+    ap.add_argument("--target-recall", type=float, default=None)
+    ap.add_argument("--at", type=int, default=5, help="k used with --target-recall")
+    ap.add_argument("--offline", action="store_true", help="run against local fakes instead of the configured services")
+    ap.add_argument("--out", default=None)
+    args = ap.parse_args()
+
+    fake = start_offline(args.data_dir) if args.offline else None
+    try:
+        from app.azure_clients import get_settings
+        ks = sorted({int(k) for k in args.ks.split(",")} | ({args.at} if args.target_recall else set()))
+        queries = load_queries(args.queries)
+        configs = build_configs(get_settings(), args)
+        rows = asyncio.run(evaluate(configs, queries, runbook_resolver(args.data_dir), ks, args.repeat))
+    finally:
+        if fake is not None:
+            fake.stop()
+
+    cols = [f"recall@{k}" for k in ks] + ["mrr", "p50_ms", "p95_ms"]
+    width = max(len(r["config"]) for r in rows)
+    print(f"\n{'config':<{width}}  " + "  ".join(f"{c:>9}" for c in cols))
+    for r in rows:
+        if r["error"]:
+            print(f"{r['config']:<{width}}  error: {r['error']}")
+        else:
+            print(f"{r['config']:<{width}}  " + "  ".join(f"{r[c]:>9}" for c in cols))
+
+    result = {"queries": len(queries), "rows": rows}
+    if args.target_recall is not None:
+        key = f"recall@{args.at}"
+        ok = [r for r in rows if not r["error"] and r[key] >= args.target_recall]
+        best = min(ok, key=lambda r: (r["p95_ms"], r["p50_ms"])) if ok else None
+        result["recommendation"] = best
+        if best:
+            print(f"\ncheapest configuration with {key} >= {args.target_recall}: {best['config']} (p95 {best['p95_ms']} ms)")
+        else:
+            print(f"\nno configuration reaches {key} >= {args.target_recall}")
+    if args.out:
+        with open(args.out, "w", encoding="utf-8") as f:
+            json.dump(result, f, ensure_ascii=False, indent=2)
+        print(f"results: {args.out}")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,103 @@
+"""
+Migrate the runbook index to reduced embedding dimensions and/or a quantised vector index.
+
+    python scripts/migrate_embeddings.py --dimensions 512 --compression scalar
+    python scripts/migrate_embeddings.py --dimensions 256 --compression binary --offline   # local fakes
+
+Vector dimensions and compression cannot be changed on an existing index, so the migration builds
+a new index next to the current one (AZURE_SEARCH_INDEX):
+  1. create the target index (scripts/create_search_index.build_index)
+  2. re-embed every runbook with `dimensions` and upload it (scripts/upload_runbooks, own manifest)
+  3. report index size (documents, storage, vector index) and retrieval recall / latency
+     (scripts/eval_retrieval) for source and target side by side
+The app keeps serving the source index; switch by setting AZURE_SEARCH_INDEX and EMBEDDING_DIMENSIONS
+to the printed values (both must change together: query vectors must match the index).
+"""
+import argparse, asyncio, json, os, sys, time
+from pathlib import Path
+
+PROJECT_ROOT = str(Path(__file__).resolve().parents[1])
+if PROJECT_ROOT not in sys.path:
+    sys.path.insert(0, PROJECT_ROOT)
+
+import create_search_index
+import eval_retrieval
+
+def index_report(ic, name):
+    stats = ic.get_index_statistics(name)
+    compression = "none"
+    try:
+        compressions = ic.get_index(name).vector_search.compressions or []
+        compression = compressions[0].kind if compressions else "none"
+    except Exception:
+        pass
+    return {"index": name, "compression": compression, "documents": stats.get("document_count"),
+            "storage_mb": round((stats.get("storage_size") or 0) / 1024 ** 2, 3),
+            "vector_index_mb": round((stats.get("vector_index_size") or 0) / 1024 ** 2, 3)}
+
+def wait_for_documents(ic, name, expected, timeout=120.0):
+    # index statistics are refreshed asynchronously after uploads
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        if (ic.get_index_statistics(name).get("document_count") or 0) >= expected:
+            return
+        time.sleep(2)
+    print(f"warning: {name} statistics still below {expected} documents after {timeout:.0f}s")
+
+def main():
+    from app.bootstrap import load_env
+    load_env()
+    ap = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    ap.add_argument("--dimensions", type=int, required=True, help="target embedding size (text-embedding-3 `dimensions`)")
+    ap.add_argument("--compression", choices=["none", "scalar", "binary"], default="scalar")
+    ap.add_argument("--oversampling", type=float, default=create_search_index.vector_oversampling())
+    ap.add_argument("--source", default=None, help="current index (default AZURE_SEARCH_INDEX)")
+    ap.add_argument("--target", default=None, help="new index name (default <source>-d<dimensions>-<compression>)")
+    ap.add_argument("--queries", default=os.path.join(PROJECT_ROOT, "data", "eval", "retrieval_queries.jsonl"))
+    ap.add_argument("--repeat", type=int, default=3, help="passes over the queries per index (latency samples)")
+    ap.add_argument("--offline", action="store_true", help="run against local fakes instead of the configured services")
+    ap.add_argument("--out", default=None)
+    args = ap.parse_args()
+
+    data_dir = os.path.join(PROJECT_ROOT, "data", "runbooks")
+    fake = eval_retrieval.start_offline(data_dir) if args.offline else None
+    try:
+        import upload_runbooks
+        from app.azure_clients import get_settings, index_client
+        settings = get_settings()
+        source = args.source or settings.AZURE_SEARCH_INDEX
+        target = (args.target or f"{source}-d{args.dimensions}-{args.compression}").lower()
+        ic = fake.index_client() if fake is not None else index_client(settings)
+
+        target = create_search_index.create_index(
+            ic, create_search_index.build_index(target, args.dimensions, args.compression, args.oversampling), args.dimensions)
+        upload_cfg = upload_runbooks.load_config(settings).for_index(target, args.dimensions)
+        upload_runbooks.main(upload_cfg, full=True)
+        with open(upload_cfg.manifest_path, encoding="utf-8") as f:
+            n_docs = sum(len(e["ids"]) for e in json.load(f).values())
+        wait_for_documents(ic, target, n_docs)
+
+        queries = eval_retrieval.load_queries(args.queries)
+        resolve = eval_retrieval.runbook_resolver(upload_cfg.data_dir)
+        ks = [1, 3, 5]
+        rows = []
+        for label, name, dims in (("source", source, settings.EMBEDDING_DIMENSIONS), ("target", target, args.dimensions)):
+            cfg = settings.model_copy(update={"AZURE_SEARCH_INDEX": name, "EMBEDDING_DIMENSIONS": dims})
+            quality = asyncio.run(eval_retrieval.evaluate([(label, cfg)], queries, resolve, ks, args.repeat))[0]
+            rows.append({"role": label, "dimensions": cfg.vector_dim, **index_report(ic, name), **quality})
+    finally:
+        if fake is not None:
+            fake.stop()
+
+    cols = ["dimensions", "compression", "documents", "storage_mb", "vector_index_mb", "recall@5", "mrr", "p50_ms", "p95_ms"]
+    print("\n" + "role    " + "  ".join(f"{c:>15}" for c in cols))
+    for r in rows:
+        print(f"{r['role']:<8}" + "  ".join(f"{str(r.get(c, r.get('error'))):>15}" for c in cols))
+    print(f"\nto switch: AZURE_SEARCH_INDEX={target} EMBEDDING_DIMENSIONS={args.dimensions}")
+    if args.out:
+        with open(args.out, "w", encoding="utf-8") as f:
+            json.dump({"source": rows[0], "target": rows[1]}, f, ensure_ascii=False, indent=2)
+        print(f"results: {args.out}")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,191 @@
+"""
+Blue/green reindexing behind the index pointer (app/index_pointer.py, INDEX_POINTER_PATH).
+
+    python scripts/reindex.py run [--dimensions 512 --compression scalar]   # build, verify, switch, gc
+    python scripts/reindex.py status | switch <index> | rollback | gc
+
+`run` never touches the live index:
+  1. create <INDEX_PREFIX>-v<dim>-<YYYYMMDD-HHMMSS> (scripts/create_search_index.build_index)
+  2. bulk-load it: full re-embed with parallel embedding workers and uploaders (scripts/upload_runbooks)
+  3. verify: document count equals the ingest manifest, smoke queries (data/eval) reach --min-recall
+     and do not fall more than --max-drop below the live index
+  4. switch the pointer atomically; running apps pick it up within INDEX_POINTER_TTL seconds
+  5. garbage-collect old indexes, keeping the live one and --retain previous ones for rollback
+"""
+import argparse, asyncio, datetime, json, os, re, sys, tempfile, time
+from pathlib import Path
+
+PROJECT_ROOT = str(Path(__file__).resolve().parents[1])
+if PROJECT_ROOT not in sys.path:
+    sys.path.insert(0, PROJECT_ROOT)
+
+import create_search_index
+import eval_retrieval
+
+def _index_prefix():
+    return os.getenv("INDEX_PREFIX", "incident-runbooks")
+
+def _pointer(settings):
+    from app.index_pointer import get_index_pointer
+    if not settings.INDEX_POINTER_PATH:
+        raise SystemExit("Error: INDEX_POINTER_PATH must be set (shared by the app and this script).")
+    return get_index_pointer(settings.INDEX_POINTER_PATH, 0)
+
+def _live(settings, pointer):
+    state = pointer.read()
+    if state:
+        return state["index"], int(state.get("dimensions") or 0)
+    return settings.AZURE_SEARCH_INDEX or None, settings.EMBEDDING_DIMENSIONS
+
+def _settings_for(settings, index, dimensions):
+    return settings.model_copy(update={"AZURE_SEARCH_INDEX": index, "EMBEDDING_DIMENSIONS": dimensions})
+
+async def _count(settings):
+    from app.azure_clients import async_search_client
+    from app.http_clients import aclose_clients
+    try:
+        return await async_search_client(settings).get_document_count()
+    finally:
+        await aclose_clients()
+
+def wait_for_count(settings, expected, timeout):
+    # $count is near real-time, unlike the index statistics
+    deadline = time.monotonic() + timeout
+    while True:
+        n = asyncio.run(_count(settings))
+        if n == expected or time.monotonic() >= deadline:
+            return n
+        time.sleep(2)
+
+def smoke(settings, label, queries, resolve):
+    return asyncio.run(eval_retrieval.evaluate([(label, settings)], queries, resolve, [1, 3, 5], 1))[0]
+
+def collect_garbage(ic, pointer, retain, dry_run=False):
+    state = pointer.read() or {}
+    keep = {state.get("index"), *(p["index"] for p in state.get("previous", [])[:retain])}
+    pattern = re.compile(rf"^{re.escape(_index_prefix())}-v\d+-\d{{8}}-\d{{6}}$")
+    doomed = [n for n in ic.list_index_names() if pattern.match(n) and n not in keep]
+    for name in doomed:
+        print(f"{'would delete' if dry_run else 'deleting'} old index: {name}")
+        if not dry_run:
+            ic.delete_index(name)
+    return doomed
+
+def cmd_run(args, settings, ic, pointer):
+    import upload_runbooks
+    dims = settings.EMBEDDING_DIMENSIONS if args.dimensions is None else args.dimensions
+    vector_dim = dims or settings.EMBEDDING_DIM  # native size when no `dimensions` is requested
+    name = args.name or f"{_index_prefix()}-v{vector_dim}-{datetime.datetime.utcnow().strftime('%Y%m%d-%H%M%S')}"
+    live, live_dims = _live(settings, pointer)
+    print(f"live index: {live}  ->  building: {name}")
+
+    name = create_search_index.create_index(
+        ic, create_search_index.build_index(name, vector_dim, args.compression, args.oversampling), vector_dim)
+    upload_cfg = upload_runbooks.load_config(_settings_for(settings, name, dims)).for_index(
+        name, dims, ingest_workers=args.workers, upload_workers=args.upload_workers)
+    t = time.perf_counter()
+    upload_runbooks.main(upload_cfg, full=True)
+    print(f"bulk load: {time.perf_counter() - t:.1f}s")
+
+    with open(upload_cfg.manifest_path, encoding="utf-8") as f:
+        expected = sum(len(e["ids"]) for e in json.load(f).values())
+    target = _settings_for(settings, name, dims)
+    n = wait_for_count(target, expected, args.count_timeout)
+    if n != expected:
+        raise SystemExit(f"Aborting: {name} has {n} documents, manifest expects {expected}. Live index unchanged.")
+    print(f"document count ok: {n}")
+
+    queries = eval_retrieval.load_queries(args.queries)
+    resolve = eval_retrieval.runbook_resolver(upload_cfg.data_dir)
+    new = smoke(target, name, queries, resolve)
+    if new["error"] or new["recall@5"] < args.min_recall:
+        raise SystemExit(f"Aborting: smoke queries on {name}: {new}. Live index unchanged.")
+    print(f"smoke queries ok: recall@5 {new['recall@5']} mrr {new['mrr']} p95 {new['p95_ms']}ms")
+    if live and not args.skip_compare:
+        old = smoke(_settings_for(settings, live, live_dims), live, queries, resolve)
+        if not old["error"] and new["recall@5"] < old["recall@5"] - args.max_drop:
+            raise SystemExit(f"Aborting: recall@5 {new['recall@5']} vs live {old['recall@5']} (max drop {args.max_drop}).")
+
+    if pointer.read() is None and live:
+        # first cutover: record the index the app was configured with, so it can be rolled back to
+        pointer.switch(live, live_dims)
+    state = pointer.switch(name, dims)
+    print(f"switched: {state['index']} (previous: {', '.join(p['index'] for p in state['previous']) or '-'})")
+    if not args.no_gc:
+        collect_garbage(ic, pointer, args.retain)
+
+def cmd_switch(args, settings, ic, pointer):
+    ic.get_index(args.index)  # must exist
+    dims = settings.EMBEDDING_DIMENSIONS if args.dimensions is None else args.dimensions
+    state = pointer.switch(args.index, dims)
+    print(f"switched: {state['index']}")
+
+def cmd_rollback(args, settings, ic, pointer):
+    state = pointer.read() or {}
+    for prev in state.get("previous", []):
+        try:
+            ic.get_index(prev["index"])
+        except Exception:
+            continue  # already garbage-collected
+        pointer.switch(prev["index"], prev.get("dimensions") or 0)
+        print(f"rolled back: {state.get('index')} -> {prev['index']}")
+        return
+    raise SystemExit("No previous index to roll back to.")
+
+def cmd_status(args, settings, ic, pointer):
+    print(json.dumps(pointer.read(), ensure_ascii=False, indent=2))
+    for name in sorted(ic.list_index_names()):
+        print(f"  {name}")
+
+def cmd_gc(args, settings, ic, pointer):
+    collect_garbage(ic, pointer, args.retain, args.dry_run)
+
+def main():
+    from app.bootstrap import load_env
+    load_env()  # before VECTOR_* (argument defaults) and INDEX_PREFIX are read
+    ap = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    ap.add_argument("--offline", action="store_true", help="run against local fakes instead of the configured services")
+    sub = ap.add_subparsers(dest="command", required=True)
+    run = sub.add_parser("run", help="build, verify and switch to a new index")
+    run.add_argument("--name", default=None)
+    run.add_argument("--dimensions", type=int, default=None, help="default EMBEDDING_DIMENSIONS")
+    run.add_argument("--compression", choices=["none", "scalar", "binary"], default=create_search_index.vector_compression())
+    run.add_argument("--oversampling", type=float, default=create_search_index.vector_oversampling())
+    run.add_argument("--workers", type=int, default=8, help="parallel embedding requests")
+    run.add_argument("--upload-workers", type=int, default=4, help="parallel upload batches")
+    run.add_argument("--queries", default=os.path.join(PROJECT_ROOT, "data", "eval", "retrieval_queries.jsonl"))
+    run.add_argument("--min-recall", type=float, default=0.8)
+    run.add_argument("--max-drop", type=float, default=0.05)
+    run.add_argument("--skip-compare", action="store_true", help="do not compare against the live index")
+    run.add_argument("--count-timeout", type=float, default=120.0)
+    run.add_argument("--retain", type=int, default=1, help="previous indexes kept for rollback")
+    run.add_argument("--no-gc", action="store_true")
+    sw = sub.add_parser("switch", help="point at an existing index")
+    sw.add_argument("index")
+    sw.add_argument("--dimensions", type=int, default=None)
+    sub.add_parser("rollback", help="point back at the most recent previous index")
+    sub.add_parser("status")
+    gc = sub.add_parser("gc", help="delete old indexes")
+    gc.add_argument("--retain", type=int, default=1)
+    gc.add_argument("--dry-run", action="store_true")
+    args = ap.parse_args()
+
+    fake = None
+    if args.offline:
+        fake = eval_retrieval.start_offline(os.path.join(PROJECT_ROOT, "data", "runbooks"))
+        os.environ.setdefault("INDEX_POINTER_PATH", os.path.join(tempfile.mkdtemp(prefix="incident-iq-pointer-"), "pointer.json"))
+    try:
+        from app.azure_clients import env_settings, index_client, reset_settings
+        reset_settings()
+        # index names / embedding sizes below are explicit; the pointer is managed, not followed
+        settings = env_settings()
+        pointer = _pointer(settings)
+        ic = fake.index_client() if fake is not None else index_client(settings)
+        {"run": cmd_run, "switch": cmd_switch, "rollback": cmd_rollback, "status": cmd_status, "gc": cmd_gc}[args.command](
+            args, settings, ic, pointer)
+    finally:
+        if fake is not None:
+            fake.stop()
+
+if __name__ == "__main__":
+    main()
@@ -1,36 +1,37 @@
-import os, glob, json, uuid, datetime, httpx, re
-from dotenv import load_dotenv, find_dotenv
-from azure.core.credentials import AzureKeyCredential
-from azure.search.documents import SearchClient
-
-dotenv_path = find_dotenv()
-if dotenv_path:
-    # override=True ensures .env values replace any existing shell placeholders
-    load_dotenv(dotenv_path, override=True)
-    print(f"Loaded .env from: {dotenv_path} (overriding shell environment variables)")
-else:
-    print("No .env file found; relying on environment variables.")
-SEARCH_ENDPOINT = os.environ.get("AZURE_SEARCH_ENDPOINT")
-SEARCH_KEY = os.environ.get("AZURE_SEARCH_API_KEY")
-env_index = os.getenv("AZURE_SEARCH_INDEX")
-if env_index:
-    INDEX_NAME = env_index
-else:
-    # if not provided, try to find the latest auto-generated index that matches the
-    # pattern created by create_search_index.py: incident-runbooks-v{dim}-YYYYMMDDTHHMMSSZ
-    from azure.search.documents.indexes import SearchIndexClient
-    from azure.core.credentials import AzureKeyCredential
-    client = SearchIndexClient(SEARCH_ENDPOINT, AzureKeyCredential(SEARCH_KEY))
-    all_names = list(client.list_index_names())
-    # filter for pattern
-    import re
-    pattern = re.compile(rf"^incident-runbooks-v\d+-\d{{8}}T\d{{6}}Z$")
-    candidates = [n for n in all_names if pattern.match(n)]
-    if candidates:
-        # pick the latest by lexicographic order (timestamp suffix is ISO-like)
-        INDEX_NAME = sorted(candidates)[-1]
-    else:
-        INDEX_NAME = "incident-runbooks"
+import os, sys, glob, json, datetime, httpx, re, asyncio
+from dataclasses import dataclass, replace
+from pathlib import Path
+
+# 프로젝트 루트 경로 추가 (app 패키지의 공용 모듈 사용)
+PROJECT_ROOT = str(Path(__file__).resolve().parents[1])
+if PROJECT_ROOT not in sys.path:
+    sys.path.insert(0, PROJECT_ROOT)
+from app.retry_policy import asend_with_retry, retry_stats
+from app.ingest import iter_files, run_pipeline, IngestManifest, content_hash, doc_id, parent_id
+from app.chunking import parse_runbook, chunk_runbook
+from app.azure_clients import Settings, embedding_request
+from app.rate_limit import estimate_tokens, get_rate_limiter
+
+@dataclass(frozen=True)
+class UploadConfig:
+    """Where and how to upload; built from Settings by load_config() and passed to main()/amain()."""
+    settings: Settings
+    index_name: str
+    dimensions: int  # EMBEDDING_DIMENSIONS must match the app and the index definition (create_search_index.py)
+    data_dir: str
+    manifest_path: str
+    # streaming ingestion knobs (see app/ingest.py)
+    ingest_workers: int = 4
+    embed_batch_tokens: int = 8000
+    embed_batch_max_inputs: int = 16
+    upload_batch_size: int = 500
+    upload_workers: int = 1
+    chunk_max_chars: int = 1500
+
+    def for_index(self, index_name: str, dimensions: int, **changes) -> "UploadConfig":
+        # a new target index gets its own manifest next to the current one
+        manifest = os.path.join(os.path.dirname(self.manifest_path) or ".", f"{index_name}.json")
+        return replace(self, index_name=index_name, dimensions=dimensions, manifest_path=manifest, **changes)
 
 def _is_placeholder(val: str) -> bool:
     if not val:
@@ -40,22 +41,42 @@ def _is_placeholder(val: str) -> bool:
         return True
     return False
 
-if _is_placeholder(SEARCH_ENDPOINT) or _is_placeholder(SEARCH_KEY):
-    print("Error: AZURE_SEARCH_ENDPOINT and AZURE_SEARCH_API_KEY must be set to your real Azure Search endpoint and admin key.")
-    print("Example (PowerShell):")
-    print("  $env:AZURE_SEARCH_ENDPOINT='https://<your-search-name>.search.windows.net'")
-    print("  $env:AZURE_SEARCH_API_KEY='<your-search-admin-key>'")
-    raise SystemExit(1)
+def _latest_index(settings: Settings) -> str:
+    # the latest auto-generated index matching the pattern created by create_search_index.py:
+    # incident-runbooks-v{dim}-YYYYMMDD-HHMMSS
+    from app.azure_clients import index_client
+    pattern = re.compile(r"^incident-runbooks-v\d+-\d{8}-\d{6}$")
+    candidates = [n for n in index_client(settings).list_index_names() if pattern.match(n)]
+    # pick the latest by lexicographic order (timestamp suffix is ISO-like)
+    return sorted(candidates)[-1] if candidates else "incident-runbooks"
 
-AOAI_ENDPOINT = os.environ.get("AZURE_OPENAI_ENDPOINT")
-AOAI_KEY = os.environ.get("AZURE_OPENAI_API_KEY")
-EMBED_DEPLOY = os.environ.get("AZURE_OPENAI_DEPLOYMENT")
-
-if not AOAI_ENDPOINT or not AOAI_KEY or not EMBED_DEPLOY:
-    print("Error: AZURE_OPENAI_ENDPOINT, AZURE_OPENAI_API_KEY, and AZURE_OPENAI_DEPLOYMENT must be set.")
-    raise SystemExit(1)
-
-DATA_DIR = os.getenv("DATA_DIR", "data/runbooks")
+def load_config(settings: Settings) -> UploadConfig:
+    """Upload target for `settings` (get_settings(): follows the blue/green pointer) plus the ingestion knobs from the environment."""
+    if settings.SEARCH_BACKEND != "local" and (_is_placeholder(settings.AZURE_SEARCH_ENDPOINT) or _is_placeholder(settings.AZURE_SEARCH_API_KEY)):
+        raise RuntimeError(
+            "AZURE_SEARCH_ENDPOINT and AZURE_SEARCH_API_KEY must be set to your real Azure Search endpoint and admin key.\n"
+            "Example (PowerShell):\n"
+            "  $env:AZURE_SEARCH_ENDPOINT='https://<your-search-name>.search.windows.net'\n"
+            "  $env:AZURE_SEARCH_API_KEY='<your-search-admin-key>'")
+    if settings.SEARCH_BACKEND == "local":
+        # SEARCH_BACKEND=local writes to the in-process index (app/local_search.py) instead of Azure AI Search
+        index_name = "local-" + os.path.basename(os.path.abspath(settings.LOCAL_INDEX_DIR))
+    else:
+        index_name = settings.AZURE_SEARCH_INDEX or _latest_index(settings)
+    return UploadConfig(
+        settings=settings,
+        index_name=index_name,
+        dimensions=settings.EMBEDDING_DIMENSIONS,
+        data_dir=os.getenv("DATA_DIR", "data/runbooks"),
+        # incremental indexing: one manifest per target index
+        manifest_path=os.getenv("INGEST_MANIFEST", os.path.join(".ingest_manifest", f"{index_name}.json")),
+        ingest_workers=int(os.getenv("INGEST_WORKERS", "4")),
+        embed_batch_tokens=int(os.getenv("EMBED_BATCH_TOKENS", "8000")),
+        embed_batch_max_inputs=int(os.getenv("EMBED_BATCH_MAX_INPUTS", "16")),
+        upload_batch_size=int(os.getenv("UPLOAD_BATCH_SIZE", "500")),
+        upload_workers=int(os.getenv("UPLOAD_WORKERS", "1")),
+        chunk_max_chars=int(os.getenv("CHUNK_MAX_CHARS", "1500")),
+    )
 
 def md_to_text(md: str) -> str:
     # simple cleaner
@@ -63,75 +84,157 @@ def md_to_text(md: str) -> str:
     t = re.sub(r"#+\s*", "", t)
     return t
 
-def embed(texts):
-    #url = f"{AOAI_ENDPOINT}/openai/deployments/{EMBED_DEPLOY}/embeddings?api-version=2024-06-01"
-    url = f"{AOAI_ENDPOINT}/openai/deployments/{EMBED_DEPLOY}/embeddings?api-version=2023-05-15"
-#https://aoai-shs-0915.openai.azure.com/openai/deployments/text-embedding-3-large/embeddings?api-version=2023-05-15
-
-    headers = {"api-key": AOAI_KEY, "Content-Type": "application/json"}
-    max_retries = 3
-    backoff = 1.0
-    for attempt in range(1, max_retries + 1):
-        try:
-            # use a higher timeout because embeddings for long documents may take longer
-            r = httpx.post(url, headers=headers, json={"input": texts}, timeout=120.0)
-            r.raise_for_status()
-            return [d["embedding"] for d in r.json()["data"]]
-        except httpx.ReadTimeout:
-            print(f"Warning: embedding request timed out (attempt {attempt}/{max_retries}). Retrying after {backoff}s...")
-        except httpx.HTTPStatusError as ex:
-            # server returned 4xx/5xx
-            print(f"Error: embedding request failed with status {ex.response.status_code}: {ex.response.text}")
-            raise
-        except httpx.RequestError as ex:
-            print(f"Warning: embedding request error on attempt {attempt}/{max_retries}: {ex}")
-        if attempt < max_retries:
-            import time
-
-            time.sleep(backoff)
-            backoff *= 2
-    # if we get here all retries failed
-    raise RuntimeError("Failed to get embeddings after multiple attempts")
-
-def main():
-    sc = SearchClient(SEARCH_ENDPOINT, INDEX_NAME, AzureKeyCredential(SEARCH_KEY))
-    docs = []
-    files = glob.glob(os.path.join(DATA_DIR, "*.md"))
+async def embed(client: httpx.AsyncClient, texts, cfg: UploadConfig):
+    settings = cfg.settings
+    api_version, body = embedding_request(texts, cfg.dimensions)
+    url = f"{settings.AZURE_OPENAI_ENDPOINT}/openai/deployments/{settings.AZURE_OPENAI_DEPLOYMENT}/embeddings?api-version={api_version}"
+    headers = {"api-key": settings.AZURE_OPENAI_API_KEY, "Content-Type": "application/json"}
+    # shares the app's AOAI_RPM / AOAI_TPM budget for this endpoint (app/rate_limit.py)
+    limiter = get_rate_limiter(settings)
+    tokens = sum(estimate_tokens(t) for t in texts)
+
+    async def send() -> httpx.Response:
+        await limiter.acquire(tokens)
+        # use a higher timeout because embeddings for long documents may take longer
+        return await client.post(url, headers=headers, json=body, timeout=120.0)
+
+    # 429 / 5xx / timeouts are retried by the shared policy (Retry-After aware, jittered backoff)
+    r = await asend_with_retry(url, send, limiter.observe)
+    try:
+        r.raise_for_status()
+    except httpx.HTTPStatusError as ex:
+        # server returned 4xx/5xx
+        print(f"Error: embedding request failed with status {ex.response.status_code}: {ex.response.text}")
+        raise
+    return [d["embedding"] for d in r.json()["data"]]
+
+def iter_docs(files, manifest, cfg: UploadConfig, full: bool = False):
+    # files are read one at a time as the pipeline pulls them; unchanged files are skipped entirely
+    # unless `full` (is_current still runs: it marks the file as present for removed_ids)
     for fp in files:
-        with open(fp, "r", encoding="utf-8") as f:
-            md = f.read()
-        text = md_to_text(md)
-        vec = embed([text])[0]
-        title = os.path.splitext(os.path.basename(fp))[0].replace("_", " ")
-        doc = {
-            "id": str(uuid.uuid4()),
-            "title": title,
-            "content": text,
-            "service": "N/A",
-            "severity": "P3",
-            "impact": "N/A",
-            "actions": "",
-            "createdAt": datetime.datetime.utcnow().isoformat() + "Z",
-            "contentVector": vec
-        }
-        docs.append(doc)
-    # upload in batches
+        with open(fp, "rb") as f:
+            raw = f.read()
+        relpath = os.path.relpath(fp, cfg.data_dir).replace(os.sep, "/")
+        digest = content_hash(raw)
+        if manifest.is_current(relpath, digest) and not full:
+            continue
+        fallback_title = os.path.splitext(os.path.basename(fp))[0].replace("_", " ")
+        rb = parse_runbook(raw.decode("utf-8"), fallback_title)
+        created = datetime.datetime.utcnow().isoformat() + "Z"
+        ids = []
+        # one document per section chunk; runbook-level metadata is repeated on each chunk for filtering
+        for part, chunk in enumerate(chunk_runbook(rb, cfg.chunk_max_chars)):
+            doc = {
+                "id": doc_id(relpath, digest, part),
+                "parentId": parent_id(relpath),
+                "section": chunk["section"],
+                "title": rb.title,
+                "content": md_to_text(chunk["content"]),
+                "service": rb.service,
+                "severity": rb.severity,
+                "impact": md_to_text(rb.impact),
+                "actions": md_to_text(rb.actions),
+                "createdAt": created,
+            }
+            ids.append(doc["id"])
+            yield doc
+        manifest.record(relpath, digest, ids)
+
+async def upload_batch(sc, batch):
+    """Upload one batch; returns the keys of documents the index rejected (partial failure, HTTP 207)."""
     from azure.core.exceptions import HttpResponseError, ServiceRequestError
-    print(f"Target index: {INDEX_NAME}")
-    for i in range(0, len(docs), 1000):
-        batch = docs[i:i+1000]
-        try:
-            res = sc.upload_documents(batch)
-            print(f"Uploaded {len(batch)} documents, status: {res[0].succeeded if res else 'n/a'}")
-        except ServiceRequestError as ex:
-            print("Network/service error when contacting Azure Search. Check AZURE_SEARCH_ENDPOINT and network connectivity.")
-            print(f"Details: {ex}")
-            raise
-        except HttpResponseError as ex:
-            print("Azure Search rejected the batch. This is often caused by vector dimension mismatch or invalid document fields.")
-            print(f"Status: {ex.status_code}, Error: {ex.message}")
-            raise
-    print("Completed upload.")
+    try:
+        res = await sc.upload_documents(batch)
+    except ServiceRequestError as ex:
+        print("Network/service error when contacting Azure Search. Check AZURE_SEARCH_ENDPOINT and network connectivity.")
+        print(f"Details: {ex}")
+        raise
+    except HttpResponseError as ex:
+        print("Azure Search rejected the batch. This is often caused by vector dimension mismatch or invalid document fields.")
+        print(f"Status: {ex.status_code}, Error: {ex.message}")
+        raise
+    failed = [r.key for r in res if not r.succeeded]
+    print(f"Uploaded {len(batch) - len(failed)}/{len(batch)} documents")
+    for r in res:
+        if not r.succeeded:
+            print(f"  failed: {r.key} ({getattr(r, 'status_code', '?')}: {getattr(r, 'error_message', '')})")
+    return failed
+
+def target_client(cfg: UploadConfig):
+    settings = cfg.settings
+    if settings.SEARCH_BACKEND == "local":
+        from app.local_search import LocalSearchIndex
+        return LocalSearchIndex(settings.LOCAL_INDEX_DIR, quant=settings.LOCAL_INDEX_QUANT)
+    from azure.core.credentials import AzureKeyCredential
+    from azure.search.documents.aio import SearchClient as AsyncSearchClient
+    return AsyncSearchClient(settings.AZURE_SEARCH_ENDPOINT, cfg.index_name, AzureKeyCredential(settings.AZURE_SEARCH_API_KEY))
+
+async def delete_ids(sc, ids, batch_size: int):
+    failed = []
+    for i in range(0, len(ids), batch_size):
+        batch = ids[i:i + batch_size]
+        res = await sc.delete_documents([{"id": d} for d in batch])
+        failed.extend(r.key for r in res if not r.succeeded)
+        print(f"Deleted {len(batch)} stale documents")
+    if failed:
+        # the manifest is left as it was, so the next run computes the same deletions again
+        raise RuntimeError(f"{len(failed)} stale documents could not be deleted: {failed[:5]}")
+
+async def amain(cfg: UploadConfig, full: bool = False):
+    print(f"Target index: {cfg.index_name}")
+    # --full re-embeds every file but keeps the old manifest, so removed runbooks are still deleted
+    manifest = IngestManifest(cfg.manifest_path)
+    limits = httpx.Limits(max_connections=cfg.ingest_workers * 2, max_keepalive_connections=cfg.ingest_workers)
+    failed = []
+
+    async with httpx.AsyncClient(limits=limits) as client, target_client(cfg) as sc:
+        async def upload(batch):
+            failed.extend(await upload_batch(sc, batch))
+
+        total = await run_pipeline(
+            iter_docs(iter_files(cfg.data_dir), manifest, cfg, full),
+            embed=lambda texts: embed(client, texts, cfg),
+            upload=upload,
+            workers=cfg.ingest_workers,
+            token_budget=cfg.embed_batch_tokens,
+            max_inputs=cfg.embed_batch_max_inputs,
+            upload_batch=cfg.upload_batch_size,
+            upload_workers=cfg.upload_workers,
+        )
+        # files with rejected documents stay out of the manifest and are re-ingested on the next run
+        retry = manifest.discard(failed)
+        # changed files got new ids; removed files leave orphans -> delete both
+        stale = manifest.removed_ids()
+        if stale:
+            await delete_ids(sc, stale, cfg.upload_batch_size)
+    manifest.commit()
+    print(f"Completed upload of {total - len(failed)} new/changed documents, deleted {len(stale)}. Embedding retries: {retry_stats()}")
+    if failed:
+        raise RuntimeError(f"{len(failed)} documents were rejected by the index; "
+                           f"{len(retry)} files will be re-ingested on the next run: {retry[:5]}")
+
+def main(cfg: UploadConfig | None = None, full: bool = False):
+    if cfg is None:
+        from app.azure_clients import get_settings
+        cfg = load_config(get_settings())
+    asyncio.run(amain(cfg, full))
 
 if __name__ == "__main__":
-    main()
+    from app.bootstrap import load_env
+    dotenv_path = load_env()
+    if dotenv_path:
+        print(f"Loaded .env from: {dotenv_path} (overriding shell environment variables)")
+    else:
+        print("No .env file found; relying on environment variables.")
+    try:
+        from app.azure_clients import get_settings
+        config = load_config(get_settings())
+    except RuntimeError as e:
+        print(f"Error: {e}")
+        raise SystemExit(1)
+    # --full: ignore the manifest and re-embed every file
+    try:
+        main(config, full="--full" in sys.argv[1:])
+    except RuntimeError as e:
+        print(f"Error: {e}")
+        raise SystemExit(1)
@@ -0,0 +1,87 @@
+"""
+Watch an alert channel and analyse incidents as they happen (app/alert_ingest.py).
+
+    python scripts/watch_alerts.py --file alerts.jsonl --follow --output incidents.jsonl
+    python scripts/watch_alerts.py --teams --output incidents.jsonl        # TEAMS_TEAM_ID / TEAMS_CHANNEL_ID / TEAMS_GRAPH_TOKEN or app credentials
+    python scripts/watch_alerts.py --file data/alerts/sample_alerts.jsonl --offline --window 2
+
+Messages that do not look like anomalies are dropped before any model call, repeats of the same
+alert are merged into one incident (ALERT_COALESCE_WINDOW / ALERT_SUPPRESS_TTL), and each incident
+is analysed once. Results go to --output (JSONL) and, with TEAMS_WEBHOOK_URL, back to Teams.
+"""
+import argparse, asyncio, json, os, sys
+from pathlib import Path
+
+PROJECT_ROOT = str(Path(__file__).resolve().parents[1])
+if PROJECT_ROOT not in sys.path:
+    sys.path.insert(0, PROJECT_ROOT)
+
+async def watch(args, settings):
+    from app import alert_ingest
+    from app.http_clients import aclose_clients
+    if args.teams:
+        token = os.getenv("TEAMS_GRAPH_TOKEN", "")
+        team, channel = os.getenv("TEAMS_TEAM_ID", ""), os.getenv("TEAMS_CHANNEL_ID", "")
+        app_creds = [os.getenv(k, "") for k in ("TEAMS_TENANT_ID", "TEAMS_CLIENT_ID", "TEAMS_CLIENT_SECRET")]
+        if all(app_creds):
+            # app registration: the token is renewed when Graph answers 401
+            token = alert_ingest.graph_app_token(*app_creds, settings)
+        if not (token and team and channel):
+            raise SystemExit("Error: TEAMS_TEAM_ID, TEAMS_CHANNEL_ID and TEAMS_GRAPH_TOKEN "
+                             "(or TEAMS_TENANT_ID / TEAMS_CLIENT_ID / TEAMS_CLIENT_SECRET) must be set for --teams.")
+        source = alert_ingest.TeamsSource(team, channel, token, settings, poll=args.poll)
+    else:
+        source = alert_ingest.FileSource(args.file, follow=args.follow, from_start=not args.tail, poll=args.poll)
+
+    handlers = []
+    if args.output:
+        handlers.append(alert_ingest.jsonl_handler(args.output))
+    if os.getenv("TEAMS_WEBHOOK_URL"):
+        handlers.append(alert_ingest.teams_webhook_handler(os.environ["TEAMS_WEBHOOK_URL"], settings))
+
+    async def handle(incident, result):
+        print(f"[{incident.service or '-'}] {incident.count} alerts -> {result.get('reason')}  {incident.alerts[0].text[:80]}")
+        for h in handlers:
+            await h(incident, result)
+
+    service = alert_ingest.AlertIngestService(source, handle, settings)
+    try:
+        return await service.run()
+    finally:
+        await aclose_clients()
+
+def main():
+    ap = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    src = ap.add_mutually_exclusive_group(required=True)
+    src.add_argument("--file", help="JSONL alerts file ({\"text\", \"service\"?, \"channel\"?, \"ts\"?} per line)")
+    src.add_argument("--teams", action="store_true", help="poll a Teams channel through Microsoft Graph")
+    ap.add_argument("--follow", action="store_true", help="keep tailing --file for new lines")
+    ap.add_argument("--tail", action="store_true", help="start at the end of --file (only new alerts)")
+    ap.add_argument("--poll", type=float, default=None, help="seconds between reads (default 0.5 file / 10 teams)")
+    ap.add_argument("--output", default=None, help="append analysed incidents to this JSONL file")
+    ap.add_argument("--window", type=float, default=None, help="override ALERT_COALESCE_WINDOW (seconds)")
+    ap.add_argument("--offline", action="store_true", help="analyse against local fakes instead of the configured services")
+    args = ap.parse_args()
+    if args.poll is None:
+        args.poll = 10.0 if args.teams else 0.5
+
+    fake = None
+    if args.offline:
+        import eval_retrieval
+        fake = eval_retrieval.start_offline(os.path.join(PROJECT_ROOT, "data", "runbooks"))
+    try:
+        from app.azure_clients import get_settings, reset_settings
+        reset_settings()
+        settings = get_settings()
+        if args.window is not None:
+            settings = settings.model_copy(update={"ALERT_COALESCE_WINDOW": args.window})
+        stats = asyncio.run(watch(args, settings))
+    except KeyboardInterrupt:
+        return
+    finally:
+        if fake is not None:
+            fake.stop()
+    print(json.dumps(stats, ensure_ascii=False))
+
+if __name__ == "__main__":
+    main()
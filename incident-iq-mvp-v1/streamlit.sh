@@ -8,5 +8,8 @@ pip install streamlit==1.38.0 \
     python-dotenv==1.0.1 \
     tiktoken==0.7.0 \
     tenacity==8.5.0 \
-    httpx==0.27.0
+    "httpx[http2]==0.27.0" \
+    aiohttp==3.10.5 \
+    numpy==1.26.4 \
+    prometheus-client==0.20.0
 python -m streamlit run app/streamlit_app.py --server.port 8000 --server.address 0.0.0.0
\ No newline at end of file
@@ -0,0 +1,118 @@
+import asyncio
+
+import httpx
+import pytest
+
+from app import http_clients
+from app.alert_ingest import Alert, AlertFilter, AlertIngestService, FileSource, QueueSource, TeamsSource
+from app.azure_clients import Settings
+
+@pytest.mark.parametrize("text", [
+    "scale down completed for web-02",
+    "failover test passed",
+    "cooldown finished, autoscaler idle",
+    "[결제] 장애 복구 완료",
+])
+def test_benign_alerts_are_dropped(text):
+    assert not AlertFilter()(Alert(text))
+
+@pytest.mark.parametrize("text", [
+    "api-gateway is down",
+    "login failed for 120 users",
+    "payment failure rate above 5%",
+    "HTTP 503 from upstream",
+    "[결제] 응답 지연 급증",
+    "[결제] 장애 복구 실패, 롤백 필요",
+    "db-01 not recovered after restart, error rate 40%",
+])
+def test_anomalies_are_kept(text):
+    assert AlertFilter()(Alert(text))
+
+def _settings(**kw) -> Settings:
+    return Settings(AZURE_OPENAI_ENDPOINT="https://aoai.example.com", AZURE_OPENAI_API_KEY="key",
+                    AZURE_OPENAI_DEPLOYMENT="embed", AZURE_OPENAI_CHAT_DEPLOYMENT="chat", **kw)
+
+def test_stop_does_not_drop_incidents_waiting_for_the_queue():
+    # one slow worker and a one-slot queue: the flusher is blocked in queue.put when the source ends
+    settings = _settings(ALERT_COALESCE_WINDOW=0.05, ALERT_QUEUE_SIZE=1, ALERT_WORKERS=1)
+
+    async def analyse(symptom, service, extra):
+        await asyncio.sleep(0.02)
+        return {"reason": "ok", "answer": symptom}
+
+    async def main():
+        source = QueueSource()
+        service = AlertIngestService(source, settings=settings, analyse=analyse)
+        run = asyncio.create_task(service.run())
+        for i in range(20):
+            await source.queue.put(Alert(f"[svc-{i}] error {chr(97 + i)}", service=f"svc-{i}"))
+            await asyncio.sleep(0.01)
+        await asyncio.sleep(0.1)
+        await source.queue.put(None)
+        return await run
+
+    stats = asyncio.run(main())
+    assert stats["incidents"] == 20
+    assert stats["analysed"] == 20
+
+def test_malformed_lines_are_skipped(tmp_path):
+    path = tmp_path / "alerts.jsonl"
+    path.write_text('{"text": "api error"}\n{"text": broken\n[1, 2]\n{"text": "db timeout"}\n', encoding="utf-8")
+    source = FileSource(str(path), follow=False)
+
+    async def read():
+        return [a.text async for a in source]
+
+    assert asyncio.run(read()) == ["api error", "db timeout"]
+    assert source.skipped == 2
+
+def test_failing_source_still_analyses_grouped_incidents():
+    settings = _settings(ALERT_COALESCE_WINDOW=30, ALERT_WORKERS=2)
+    analysed = []
+
+    async def analyse(symptom, service, extra):
+        analysed.append(service)
+        return {"reason": "ok", "answer": symptom}
+
+    class BrokenSource:
+        async def __aiter__(self):
+            for svc in ("pay", "login"):
+                yield Alert(f"[{svc}] error", service=svc)
+            raise ConnectionError("source lost")
+
+    service = AlertIngestService(BrokenSource(), settings=settings, analyse=analyse)
+    with pytest.raises(ConnectionError):
+        asyncio.run(service.run())
+    assert sorted(analysed) == ["login", "pay"]
+    assert service.stats["analysed"] == 2
+
+def test_teams_source_refreshes_token_and_survives_throttling(monkeypatch):
+    monkeypatch.setenv("RETRY_MAX_ATTEMPTS", "1")
+    message = {"id": "m1", "body": {"content": "<p>결제 API 5xx 급증</p>"}, "createdDateTime": "2024-01-01T00:00:00Z"}
+    replies = iter([
+        httpx.Response(401),                                                  # expired token
+        httpx.Response(200, json={"value": [], "@odata.deltaLink": "https://graph.microsoft.com/v1.0/delta?t=1"}),
+        httpx.Response(429, headers={"Retry-After": "0"}),                    # throttled past the retry budget
+        httpx.Response(200, json={"value": [message], "@odata.deltaLink": "https://graph.microsoft.com/v1.0/delta?t=2"}),
+    ])
+    seen_tokens = []
+
+    def handle(request):
+        seen_tokens.append(request.headers["Authorization"])
+        return next(replies)
+
+    tokens = iter(["old", "new"])
+
+    async def token_source():
+        return next(tokens)
+
+    async def first_alert():
+        client = httpx.AsyncClient(transport=httpx.MockTransport(handle))
+        monkeypatch.setattr(http_clients, "get_client", lambda url, settings: client)
+        source = TeamsSource("team", "channel", token_source, _settings(), poll=0)
+        async for alert in source:
+            return alert
+
+    alert = asyncio.run(first_alert())
+    assert alert.text == "결제 API 5xx 급증"
+    assert seen_tokens == ["Bearer old"] + ["Bearer new"] * 3
@@ -0,0 +1,26 @@
+import asyncio
+
+import httpx
+
+from app.aoai_router import AOAIRouter, Backend
+from app.rate_limit import TokenBucketLimiter
+
+def test_latency_excludes_limiter_wait():
+    limiter = TokenBucketLimiter(rpm=600)  # one request per 0.1s once the bucket is empty
+    backend = Backend("primary", "https://aoai.example.com", "key", "embed", "chat", limiter)
+    router = AOAIRouter([backend, Backend("b2", "https://b2.example.com", "key", "embed", "chat",
+                                          TokenBucketLimiter())])
+
+    async def send(b: Backend) -> httpx.Response:
+        await asyncio.sleep(0.01)
+        return httpx.Response(200, request=httpx.Request("POST", b.chat_url()))
+
+    async def main():
+        limiter._req = 0
+        for _ in range(3):
+            resp, served = await router.send("chat", send)
+            assert resp.status_code == 200
+
+    asyncio.run(main())
+    assert limiter.waited_seconds >= 0.2
+    assert backend.ewma["chat"] < 0.05
@@ -0,0 +1,41 @@
+from app.chunking import SECTION_ACTIONS
+from app.context_builder import build_context, count_tokens
+
+def _hit(id, parent, section="상황", content="", actions=""):
+    return {"id": id, "parentId": parent, "title": f"runbook {parent}", "severity": "P2",
+            "section": section, "content": content, "actions": actions}
+
+def test_actions_once_per_runbook():
+    hits = [_hit("a0", "p1", content="결제 API 5xx 급증, 게이트웨이 타임아웃", actions="롤백 후 캐시 플러시"),
+            _hit("a1", "p1", section="서비스 영향도", content="결제 승인 실패로 주문 중단", actions="롤백 후 캐시 플러시")]
+    packed = build_context(hits, [], "결제 5xx", budget=2000)
+    assert packed.hit_ids == ["a0", "a1"]
+    assert packed.text.count("대응:롤백 후 캐시 플러시") == 1
+
+def test_actions_chunk_dropped_as_duplicate_does_not_hide_actions():
+    shared = "로그인 지연 발생, 인증 서버 커넥션 풀 고갈 확인"
+    hits = [_hit("b0", "p2", content=shared),
+            _hit("a0", "p1", section=SECTION_ACTIONS, content=shared, actions=shared),  # near-duplicate: dropped
+            _hit("a1", "p1", content="세션 저장소 응답 지연", actions="커넥션 풀 확장 후 재기동")]
+    packed = build_context(hits, [], "로그인 지연", budget=2000)
+    assert packed.hit_ids == ["b0", "a1"]
+    assert packed.duplicates == 1
+    assert "대응:커넥션 풀 확장 후 재기동" in packed.text
+
+def test_packed_actions_chunk_is_not_repeated():
+    hits = [_hit("a0", "p1", section=SECTION_ACTIONS, content="1) 롤백 2) 캐시 플러시", actions="1) 롤백 2) 캐시 플러시"),
+            _hit("a1", "p1", content="배포 직후 오류율 상승", actions="1) 롤백 2) 캐시 플러시")]
+    packed = build_context(hits, [], "배포 오류", budget=2000)
+    assert packed.hit_ids == ["a0", "a1"]
+    assert "대응:" not in packed.text
+
+def test_budget_is_never_exceeded_and_web_refs_go_last():
+    hits = [_hit(f"h{i}", f"p{i}", content=f"{i}번 서비스 장애 상세 " * 40) for i in range(5)]
+    web = [{"name": "참고 문서", "url": "https://example.com/doc"}]
+    tight = build_context(hits, web, "장애", budget=300)
+    assert tight.tokens <= 300 and count_tokens(tight.text) <= 300
+    assert len(tight.hit_ids) < 5 and tight.skipped >= 1
+    assert "[인터넷 참고자료]" not in tight.text  # no budget left
+
+    roomy = build_context(hits[:1], web, "장애", budget=2000)
+    assert roomy.text.index("### runbook p0") < roomy.text.index("[인터넷 참고자료]")
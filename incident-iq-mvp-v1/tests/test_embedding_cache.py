@@ -0,0 +1,62 @@
+import asyncio, hashlib
+
+from app import embedding_cache, rag_pipeline
+from app.azure_clients import Settings
+from app.embedding_cache import EmbeddingCache, cache_key, embedding_text, normalize_text
+
+def test_key_format_and_normalisation():
+    key = cache_key("embed", 256, "  결제\tAPI   5xx ")
+    assert key == "embed:256:" + hashlib.sha256("결제 API 5xx".encode("utf-8")).hexdigest()
+    assert cache_key("embed", 256, "ＡＰＩ 오류") == cache_key("embed", 256, "API  오류")  # NFKC, whitespace
+    assert cache_key("embed", 256, "API 오류") != cache_key("embed", 256, "api 오류")    # case is embedded
+    assert cache_key("embed", 256, "x") != cache_key("embed", 512, "x")
+    assert embedding_text(" API\n오류 ") == "API 오류" and normalize_text(" API\n오류 ") == "api 오류"
+
+def test_memory_tier_lru_and_ttl(monkeypatch):
+    now = [1000.0]
+    monkeypatch.setattr(embedding_cache.time, "time", lambda: now[0])
+    cache = EmbeddingCache(max_items=2, ttl=60)
+    cache.put("a", [1.0])
+    cache.put("b", [2.0])
+    assert cache.get("a") == [1.0]    # a becomes most recent
+    cache.put("c", [3.0])             # evicts b
+    assert cache.get("b") is None and cache.get("c") == [3.0]
+    now[0] += 61
+    assert cache.get("a") is None
+    assert cache.stats()["hits"] == 2 and cache.stats()["misses"] == 2
+
+def test_disk_tier_survives_restart_and_expires(tmp_path, monkeypatch):
+    now = [1000.0]
+    monkeypatch.setattr(embedding_cache.time, "time", lambda: now[0])
+    path = str(tmp_path / "emb.sqlite")
+    first = EmbeddingCache(ttl=60, disk_path=path)
+    first.put("k1", [0.5, 0.25])
+    first.put("k2", [1.5, 2.0])
+    first.flush()
+
+    second = EmbeddingCache(ttl=60, disk_path=path)
+    assert asyncio.run(second.aget_many(["k1", "k2", "k3"])) == [[0.5, 0.25], [1.5, 2.0], None]
+    assert second.stats()["disk_hits"] == 2 and second.stats()["misses"] == 1
+    assert second.get("k1") == [0.5, 0.25] and second.stats()["hits"] == 1  # now in memory
+
+    now[0] += 61
+    third = EmbeddingCache(ttl=60, disk_path=path)
+    assert third.get("k1") is None
+
+def test_aembed_sends_each_distinct_miss_once(monkeypatch):
+    settings = Settings(AZURE_OPENAI_ENDPOINT="https://aoai.example.com", AZURE_OPENAI_API_KEY="key",
+                        AZURE_OPENAI_DEPLOYMENT="dedup-test", AZURE_OPENAI_CHAT_DEPLOYMENT="chat")
+    sent = []
+
+    async def fake_remote(texts, settings):
+        sent.append(list(texts))
+        return [[float(i)] for i in range(len(texts))]
+
+    monkeypatch.setattr(rag_pipeline, "_aembed_remote", fake_remote)
+    storm = ["DB 연결 타임아웃", "DB  연결 타임아웃 ", "API 5xx 급증", "DB 연결 타임아웃"]
+    vectors = asyncio.run(rag_pipeline.aembed(storm, settings))
+    assert sent == [["DB 연결 타임아웃", "API 5xx 급증"]]
+    assert vectors == [[0.0], [0.0], [1.0], [0.0]]
+
+    assert asyncio.run(rag_pipeline.aembed(["API 5xx 급증"], settings)) == [[1.0]]
+    assert len(sent) == 1  # served from the cache
@@ -0,0 +1,57 @@
+import asyncio
+
+from aiohttp.test_utils import TestClient, TestServer
+
+from app import http_api, rag_pipeline
+from app.azure_clients import Settings
+
+def _app(**kw):
+    settings = Settings(AZURE_OPENAI_ENDPOINT="https://aoai.example.com", AZURE_OPENAI_API_KEY="key",
+                        AZURE_OPENAI_DEPLOYMENT="embed", AZURE_OPENAI_CHAT_DEPLOYMENT="chat", **kw)
+    app = http_api.create_app(settings)
+    app.on_startup.clear()  # no prewarm against the real services
+    return app
+
+async def _with_client(app, fn):
+    async with TestClient(TestServer(app)) as client:
+        return await fn(client)
+
+def test_identical_concurrent_requests_share_one_analysis(monkeypatch):
+    calls = []
+
+    async def fake_stream(symptom, service, extra):
+        calls.append(symptom)
+        await asyncio.sleep(0.1)  # both requests arrive while this one is running
+        yield {"type": "result", "result": {"reason": "ok", "answer": symptom}}
+
+    monkeypatch.setattr(rag_pipeline, "stream_incident_response", fake_stream)
+
+    async def run(client):
+        body = {"symptom": "결제 API 5xx 급증", "service": "결제"}
+        same = {"symptom": "  결제 API 5XX 급증 ", "service": "결제"}  # equal after normalize_text
+        responses = await asyncio.gather(client.post("/v1/incidents", json=body),
+                                         client.post("/v1/incidents/stream", json=same))
+        return [r.status for r in responses], await responses[0].json(), await responses[1].text()
+
+    statuses, result, stream = asyncio.run(_with_client(_app(), run))
+    assert statuses == [200, 200]
+    assert calls == ["결제 API 5xx 급증"]
+    assert result["answer"] == "결제 API 5xx 급증"
+    assert "event: result" in stream
+
+def test_oversized_batch_is_rejected():
+    async def run(client):
+        resp = await client.post("/v1/incidents/batch", json={"events": [{"symptom": "error"}] * 3})
+        return resp.status, await resp.json()
+
+    status, body = asyncio.run(_with_client(_app(API_MAX_BATCH=2), run))
+    assert status == 413
+    assert "API_MAX_BATCH" in body["error"]
+
+def test_api_key_is_required():
+    async def run(client):
+        denied = await client.post("/v1/incidents", json={"symptom": "x"}, headers={"X-API-Key": "wrong"})
+        health = await client.get("/healthz")
+        return denied.status, health.status
+
+    assert asyncio.run(_with_client(_app(API_KEY="secret"), run)) == (401, 200)
@@ -0,0 +1,66 @@
+from app.answer_cache import get_answer_cache
+from app.aoai_router import get_router
+from app.azure_clients import Settings, load_settings
+from app.embedding_cache import get_embedding_cache
+from app.index_pointer import apply_pointer, get_index_pointer
+from app.rate_limit import get_rate_limiter
+
+def _settings(tmp_path, **overrides) -> Settings:
+    return Settings(**{**dict(
+        AZURE_OPENAI_ENDPOINT="https://aoai.example.com", AZURE_OPENAI_API_KEY="key",
+        AZURE_OPENAI_DEPLOYMENT="embed", AZURE_OPENAI_CHAT_DEPLOYMENT="chat",
+        AZURE_SEARCH_INDEX="blue", AOAI_RPM=60, AOAI_TPM=10_000,
+        INDEX_POINTER_PATH=str(tmp_path / "pointer.json"), INDEX_POINTER_TTL=0,
+    ), **overrides})
+
+def test_switch_keeps_limiter_router_and_caches(tmp_path):
+    base = _settings(tmp_path)
+    pointer = get_index_pointer(base.INDEX_POINTER_PATH, 0)
+    pointer.switch("green")
+    first = apply_pointer(base)
+    pointer.switch("green-2")
+    second = apply_pointer(base)
+
+    assert (first.AZURE_SEARCH_INDEX, second.AZURE_SEARCH_INDEX) == ("green", "green-2")
+    assert get_rate_limiter(first) is get_rate_limiter(second) is get_rate_limiter(base)
+    assert get_router(first) is get_router(second) is get_router(base)
+    assert get_router(second).backends[0].limiter is get_rate_limiter(second)
+    assert get_embedding_cache(first) is get_embedding_cache(second)
+    assert get_answer_cache(first) is get_answer_cache(second)
+
+def test_switch_to_other_dimensions_gets_own_embedding_cache(tmp_path):
+    base = _settings(tmp_path)
+    pointer = get_index_pointer(base.INDEX_POINTER_PATH, 0)
+    pointer.switch("full")
+    full = apply_pointer(base)
+    pointer.switch("reduced", 256)
+    reduced = apply_pointer(base)
+
+    assert (full.vector_dim, reduced.vector_dim) == (1536, 256)
+    assert reduced.EMBEDDING_DIM == 1536
+    assert get_embedding_cache(full) is not get_embedding_cache(reduced)
+    assert get_router(full) is get_router(reduced)
+    assert get_rate_limiter(full) is get_rate_limiter(reduced)
+
+def test_full_size_pointer_with_reduced_base_dimensions(tmp_path):
+    # EMBEDDING_DIMENSIONS=512 in the environment; rollback to a full-size index (dimensions 0)
+    base = _settings(tmp_path, EMBEDDING_DIMENSIONS=512)
+    pointer = get_index_pointer(base.INDEX_POINTER_PATH, 0)
+    pointer.switch("reduced", 512)
+    reduced = apply_pointer(base)
+    pointer.switch("full")
+    full = apply_pointer(base)
+
+    assert (base.vector_dim, reduced.vector_dim, full.vector_dim) == (512, 512, 1536)
+    assert full.EMBEDDING_DIMENSIONS == 0 and full.EMBEDDING_DIM == 1536
+    assert get_embedding_cache(full) is not get_embedding_cache(reduced)
+    assert get_embedding_cache(reduced) is get_embedding_cache(base)
+    assert get_answer_cache(full) is not get_answer_cache(reduced)
+
+def test_load_settings_keeps_native_dim(monkeypatch):
+    for k, v in {"SEARCH_BACKEND": "local", "AZURE_OPENAI_ENDPOINT": "https://aoai.example.com",
+                 "AZURE_OPENAI_API_KEY": "key", "AZURE_OPENAI_DEPLOYMENT": "embed",
+                 "AZURE_OPENAI_CHAT_DEPLOYMENT": "chat", "EMBEDDING_DIM": "3072", "EMBEDDING_DIMENSIONS": "512"}.items():
+        monkeypatch.setenv(k, v)
+    settings = load_settings()
+    assert (settings.EMBEDDING_DIM, settings.EMBEDDING_DIMENSIONS, settings.vector_dim) == (3072, 512, 512)
@@ -0,0 +1,57 @@
+import asyncio
+from types import SimpleNamespace
+
+import numpy as np
+import pytest
+
+from app import local_search
+from app.local_search import LocalSearchIndex
+
+class FakeGraph:
+    """Stands in for hnswlib.Index: exact inner-product search honouring knn_query's `filter`."""
+    def __init__(self, vecs):
+        self.vecs = vecs
+        self.calls = []
+
+    def knn_query(self, q, k=1, filter=None):
+        self.calls.append(k)
+        rows = [r for r in range(len(self.vecs)) if filter is None or filter(r)]
+        rows.sort(key=lambda r: -float(self.vecs[r] @ q))
+        rows = rows[:k]
+        return np.array([rows]), np.array([[1.0 - float(self.vecs[r] @ q) for r in rows]])
+
+@pytest.fixture
+def index(tmp_path, monkeypatch):
+    # 60 "big" rows close to the query, 3 "small" rows far from it
+    rng = np.random.default_rng(0)
+    docs = []
+    for i in range(63):
+        service = "big" if i < 60 else "small"
+        vec = [1.0, 0.0, 0.0, 0.0] if service == "big" else [0.0, 1.0, 0.0, 0.0]
+        docs.append({"id": f"d{i}", "parentId": f"p{i}", "service": service, "title": f"runbook {i}",
+                     "content": "장애 대응", "contentVector": list(np.asarray(vec) + rng.normal(0, 0.01, 4))})
+    idx = LocalSearchIndex(str(tmp_path / "index"), hnsw_min_rows=10)
+    asyncio.run(idx.upload_documents(docs))
+    idx._ensure_loaded()
+    graph = FakeGraph(idx._dense(np.arange(idx.rows)))
+    monkeypatch.setattr(local_search, "hnswlib", SimpleNamespace())
+    monkeypatch.setattr(idx, "_hnsw_index", lambda: graph)
+    return idx, graph
+
+def _search(idx, filter):
+    async def run():
+        vq = SimpleNamespace(vector=[1.0, 0.0, 0.0, 0.0], k_nearest_neighbors=5)
+        return [d["service"] async for d in await idx.search(vector_queries=[vq], filter=filter, top=5)]
+    return asyncio.run(run())
+
+def test_small_filtered_service_still_gets_vector_hits(index):
+    idx, graph = index
+    # 3 rows selected (< hnsw_min_rows): exact search over the filtered rows, graph not used
+    assert _search(idx, "service eq 'small'") == ["small"] * 3
+    assert graph.calls == []
+
+def test_graph_search_applies_filter_during_search(index):
+    idx, graph = index
+    assert _search(idx, "service eq 'big'") == ["big"] * 5
+    assert _search(idx, None) == ["big"] * 5
+    assert graph.calls == [5, 5]
@@ -0,0 +1,30 @@
+import time
+
+import pytest
+
+from app.retry_policy import CircuitBreaker, CircuitOpenError
+
+def _allowed(breaker: CircuitBreaker) -> bool:
+    try:
+        breaker.check("test")
+        return True
+    except CircuitOpenError:
+        return False
+
+def test_half_open_lets_one_trial_through():
+    breaker = CircuitBreaker(failures=2, cooldown=0.05)
+    breaker.record_failure()
+    breaker.record_failure()
+    assert not _allowed(breaker)
+    time.sleep(0.06)
+    assert [_allowed(breaker) for _ in range(3)] == [True, False, False]
+    breaker.record_success()
+    assert _allowed(breaker) and _allowed(breaker)
+
+def test_failed_trial_reopens():
+    breaker = CircuitBreaker(failures=1, cooldown=0.05)
+    breaker.record_failure()
+    time.sleep(0.06)
+    assert _allowed(breaker)
+    breaker.record_failure()
+    assert not _allowed(breaker)
@@ -0,0 +1,81 @@
+import asyncio, json, os, sys
+
+import pytest
+
+from conftest import PROJECT_ROOT
+sys.path.insert(0, os.path.join(PROJECT_ROOT, "scripts"))
+import upload_runbooks
+from app.azure_clients import Settings
+from app.local_search import IndexingResult
+
+RUNBOOK = "# RUNBOOK {n}\n서비스: svc-{n}\n심각도: P2\n\n## 상황\n장애 {n} 상황.\n\n## 대응방안\n1) 롤백 {n}\n"
+
+class FakeIndex:
+    """Search client double: rejects the documents of `reject` (a parentId) like a 207 response."""
+    def __init__(self, reject=None):
+        self.reject = reject
+        self.docs = {}
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *exc):
+        return False
+
+    async def upload_documents(self, batch):
+        results = []
+        for d in batch:
+            ok = d["parentId"] != self.reject
+            if ok:
+                self.docs[d["id"]] = d
+            results.append(IndexingResult(d["id"], ok))
+        return results
+
+    async def delete_documents(self, docs):
+        for d in docs:
+            self.docs.pop(d["id"], None)
+        return [IndexingResult(d["id"], True) for d in docs]
+
+@pytest.fixture
+def cfg(tmp_path, monkeypatch):
+    data = tmp_path / "runbooks"
+    data.mkdir()
+    for n in (1, 2):
+        (data / f"runbook_{n}.md").write_text(RUNBOOK.format(n=n), encoding="utf-8")
+
+    async def fake_embed(client, texts, cfg):
+        return [[0.0] * 4 for _ in texts]
+
+    monkeypatch.setattr(upload_runbooks, "embed", fake_embed)
+    settings = Settings(AZURE_OPENAI_ENDPOINT="https://aoai.example.com", AZURE_OPENAI_API_KEY="key",
+                        AZURE_OPENAI_DEPLOYMENT="embed", AZURE_OPENAI_CHAT_DEPLOYMENT="chat", SEARCH_BACKEND="local")
+    return upload_runbooks.UploadConfig(settings=settings, index_name="test", dimensions=0, data_dir=str(data),
+                                        manifest_path=str(tmp_path / "manifest.json"), ingest_workers=1)
+
+def _run(cfg, index, monkeypatch):
+    monkeypatch.setattr(upload_runbooks, "target_client", lambda cfg: index)
+    asyncio.run(upload_runbooks.amain(cfg))
+
+def test_partial_failure_is_retried_on_next_run(cfg, monkeypatch):
+    from app.ingest import parent_id
+    index = FakeIndex(reject=parent_id("runbook_2.md"))
+    with pytest.raises(RuntimeError, match="1 files will be re-ingested"):
+        _run(cfg, index, monkeypatch)
+    with open(cfg.manifest_path, encoding="utf-8") as f:
+        assert list(json.load(f)) == ["runbook_1.md"]
+
+    # the index recovers: only the rejected file is embedded and uploaded again
+    index.reject = None
+    uploaded = []
+    upload = upload_runbooks.upload_batch
+
+    async def tracking_upload(sc, batch):
+        uploaded.extend(d["parentId"] for d in batch)
+        return await upload(sc, batch)
+
+    monkeypatch.setattr(upload_runbooks, "upload_batch", tracking_upload)
+    _run(cfg, index, monkeypatch)
+    assert set(uploaded) == {parent_id("runbook_2.md")}
+    with open(cfg.manifest_path, encoding="utf-8") as f:
+        assert sorted(json.load(f)) == ["runbook_1.md", "runbook_2.md"]
+    assert {d["parentId"] for d in index.docs.values()} == {parent_id("runbook_1.md"), parent_id("runbook_2.md")}